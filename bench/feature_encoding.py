@@ -0,0 +1,57 @@
+"""
+Times encoding transaction rows into model inputs, with flatten(onehot_encode(...)) per row as before
+and with OneHotEncoder over the whole batch, using the vocabularies in src/ml.
+
+Usage (from the repository root):
+  PYTHONPATH=src/ml python bench/feature_encoding.py --batch-sizes 1 64 1024 16384
+"""
+import argparse
+from input_vectorization import OneHotEncoder, flatten, onehot_encode
+import numpy as np
+import os
+from time import perf_counter
+import torch
+
+ML_DIR = os.path.join(os.path.dirname(__file__), '..', 'src', 'ml')
+
+def _read_lines(name: str) -> list[str]:
+  with open(os.path.join(ML_DIR, name)) as file:
+    return [line.strip() for line in file.readlines()]
+
+def _example_rows(n: int, merchants: list[str], categories: list[str], jobs: list[str]) -> list[list]:
+  rng = np.random.default_rng(0)
+  return [
+    [int(rng.integers(1, 29)), int(rng.integers(1, 13)), 2020, int(rng.integers(0, 7)), int(rng.integers(0, 24)), int(rng.integers(0, 60)),
+     merchants[rng.integers(len(merchants))], categories[rng.integers(len(categories))], float(rng.uniform(1, 1000)),
+     float(rng.uniform(25, 50)), float(rng.uniform(-125, -70)), jobs[rng.integers(len(jobs))],
+     float(rng.uniform(25, 50)), float(rng.uniform(-125, -70))]
+    for _ in range(n)
+  ]
+
+def _best_of(repeat: int, encode) -> float:
+  best = float('inf')
+  for _ in range(repeat):
+    start = perf_counter()
+    encode()
+    best = min(best, perf_counter() - start)
+  return best
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 64, 1024, 16384])
+  parser.add_argument('--repeat', type=int, default=5)
+  args = parser.parse_args()
+
+  merchants, categories, jobs = _read_lines('merchants.txt'), _read_lines('categories.txt'), _read_lines('jobs.txt')
+  encoder = OneHotEncoder(merchants, categories, jobs)
+  print(f'{"rows":>8} {"per row (ms)":>14} {"batched (ms)":>14} {"speedup":>8}')
+  for n in args.batch_sizes:
+    rows = _example_rows(n, merchants, categories, jobs)
+    per_row = lambda: torch.tensor([flatten(onehot_encode(list(row), merchants, categories, jobs)) for row in rows], dtype=torch.float)
+    batched = lambda: torch.from_numpy(encoder.encode(rows))
+    assert torch.equal(per_row(), batched())
+    per_row_seconds, batched_seconds = _best_of(args.repeat, per_row), _best_of(args.repeat, batched)
+    print(f'{n:>8} {per_row_seconds * 1000:>14.3f} {batched_seconds * 1000:>14.3f} {per_row_seconds / batched_seconds:>7.1f}x')
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,70 @@
+"""
+Checks the inference modes of the model in src/ml against the current model, the CreditCardFraudDetectionModel
+over standardized onehot vectors: how many predictions agree with it, the largest difference in fraud
+probability, and the throughput of the forward pass at several batch sizes. Transactions are generated
+from the vocabularies, unless a labeled CSV of the dataset is given, in which case the accuracy of every
+mode is reported too.
+
+Usage (from the repository root):
+  PYTHONPATH=src/ml:bench python bench/inference_export.py --rows 20000 --csv data-fallback/fraud_test.csv
+"""
+import argparse
+import csv
+from export import INFERENCE_MODES
+from feature_encoding import _example_rows
+from inference import load_artifacts, read_mean_and_std
+from input_vectorization import extract_row
+from ml_model import load_saved_model
+import os
+from time import perf_counter
+import torch
+
+ML_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'ml')
+
+def _read_csv(path: str, n: int) -> tuple[list[list], list[int]]:
+  with open(path) as data:
+    rows = [extract_row(row) for _, row in zip(range(n), csv.DictReader(data))]
+  return [row[:-1] for row in rows], [row[-1] for row in rows]
+
+def _rows_per_second(model, inputs: tuple[torch.Tensor, ...], batch_size: int, seconds: float = 1.0) -> float:
+  batch = tuple(tensor[:batch_size] for tensor in inputs)
+  rows, start = 0, perf_counter()
+  with torch.inference_mode():
+    while perf_counter() - start < seconds:
+      model(*batch)
+      rows += batch_size
+  return rows / (perf_counter() - start)
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--rows', type=int, default=20000)
+  parser.add_argument('--csv', default=None, help='A labeled CSV of the dataset to check the accuracy on')
+  parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 256, 4096])
+  args = parser.parse_args()
+
+  if args.csv: args.csv = os.path.abspath(args.csv)
+  os.chdir(ML_DIR)
+  models = {mode: load_artifacts('.', mode).model for mode in INFERENCE_MODES}
+  encoder = load_artifacts('.', 'eager').encoder
+  rows, labels = _read_csv(args.csv, args.rows) if args.csv else (_example_rows(args.rows, encoder.merchants, encoder.categories, encoder.jobs), None)
+
+  onehot_model = load_saved_model('binaryclassifierstate.pt').eval()
+  mean, std = read_mean_and_std('meanandstd.txt')
+  onehot_inputs = ((torch.from_numpy(encoder.encode(rows)) - mean) / (std + 1e-8),)
+  numerics, indices = encoder.encode_indices(rows)
+  inputs = (torch.from_numpy(numerics), torch.from_numpy(indices))
+
+  with torch.inference_mode():
+    expected = onehot_model(*onehot_inputs).squeeze(1)
+    results = {'onehot': expected} | {mode: model(*inputs).squeeze(1) for mode, model in models.items()}
+
+  header = f'{"model":>12} {"agreement":>10} {"max diff":>9}' + (f' {"accuracy":>9}' if labels else '')
+  print(header + ''.join(f' {f"rows/s @ {size}":>16}' for size in args.batch_sizes))
+  for name, probabilities in results.items():
+    model, model_inputs = (onehot_model, onehot_inputs) if name == 'onehot' else (models[name], inputs)
+    line = f'{name:>12} {(probabilities.round() == expected.round()).float().mean().item():>10.5f} {(probabilities - expected).abs().max().item():>9.2e}'
+    if labels: line += f' {(probabilities.round() == torch.tensor(labels, dtype=torch.float)).float().mean().item():>9.5f}'
+    print(line + ''.join(f' {_rows_per_second(model, model_inputs, size):>16,.0f}' for size in args.batch_sizes))
+
+if __name__ == '__main__':
+  main()
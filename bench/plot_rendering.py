@@ -0,0 +1,56 @@
+"""
+Renders graph_feature plots over and over and reports the resident set size of the process as it goes,
+to check that rendering doesn't leak figures or memory in a long-running worker.
+
+Usage (from the repository root):
+  PYTHONPATH=src python bench/plot_rendering.py --jobs 2000 --every 250
+"""
+import argparse
+import numpy as np
+import os
+import pandas as pd
+from plotting import render_feature_plot
+from services import PLOTTING_DATA_COLS
+from time import perf_counter
+
+def _rss_mb() -> float:
+  # The current (not peak) RSS, from /proc on Linux
+  with open('/proc/self/statm') as statm:
+    return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+
+def _example_tables() -> dict[str, pd.DataFrame]:
+  rng = np.random.default_rng(0)
+  values = {
+    'trans_month': [f'2020-{m:02}' for m in range(1, 13)],
+    'trans_dayOfWeek': ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'],
+    'gender': ['F', 'M'],
+    'category': ['entertainment', 'food_dining', 'gas_transport', 'grocery_net', 'grocery_pos', 'health_fitness', 'home',
+                 'kids_pets', 'misc_net', 'misc_pos', 'personal_care', 'shopping_net', 'shopping_pos', 'travel'],
+  }
+  return {
+    feature: pd.DataFrame({
+      'count_0': rng.integers(1000, 50000, len(index)),
+      'count_1': rng.integers(1, 300, len(index)),
+      'amt_0': rng.uniform(1e4, 1e6, len(index)),
+      'amt_1': rng.uniform(1e2, 1e5, len(index)),
+    }, index=index)
+    for feature, index in values.items()
+  }
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--jobs', type=int, default=2000, help='the number of plots to render')
+  parser.add_argument('--every', type=int, default=250, help='report every this many plots')
+  args = parser.parse_args()
+
+  tables = _example_tables()
+  start = perf_counter()
+  print(f'{"jobs":>6} {"rss_mb":>8} {"ms/plot":>8}')
+  for job in range(1, args.jobs + 1):
+    feature = PLOTTING_DATA_COLS[job % len(PLOTTING_DATA_COLS)]
+    render_feature_plot(feature, tables[feature])
+    if job % args.every == 0:
+      print(f'{job:>6} {_rss_mb():>8.1f} {(perf_counter() - start) / job * 1000:>8.1f}')
+
+if __name__ == '__main__':
+  main()
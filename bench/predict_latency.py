@@ -0,0 +1,63 @@
+"""
+Serves /predict with the model in src/ml on a local threaded server and measures the latency of
+concurrent clients each posting one transaction at a time. Redis isn't needed.
+
+Usage (from the repository root):
+  PYTHONPATH=src:src/ml python bench/predict_latency.py --clients 16 --requests 200
+"""
+import argparse
+import http.client
+import logging
+import numpy as np
+import orjson
+import os
+import threading
+from time import perf_counter
+from werkzeug.serving import make_server
+
+TRANSACTION = {
+  'trans_date_trans_time': '21/06/2020 12:14', 'merchant': 'fraud_Kirlin and Sons', 'category': 'personal_care', 'amt': 2.86,
+  'lat': 33.9659, 'long': -80.9355, 'job': 'Mechanical engineer', 'merch_lat': 33.986391, 'merch_long': -81.200714,
+}
+
+def _client(port: int, requests: int, latencies: list[float]):
+  connection = http.client.HTTPConnection('127.0.0.1', port)
+  body = orjson.dumps({'transactions': [TRANSACTION]})
+  for _ in range(requests):
+    start = perf_counter()
+    connection.request('POST', '/predict', body, {'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    response.read()
+    latencies.append(perf_counter() - start)
+    assert response.status == 200
+  connection.close()
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--clients', type=int, default=16)
+  parser.add_argument('--requests', type=int, default=200, help='Requests per client')
+  args = parser.parse_args()
+
+  # The model artifacts are loaded from the working directory, like in the containers
+  os.chdir(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'ml'))
+  import api
+  logging.getLogger('werkzeug').setLevel(logging.WARNING)
+  batcher = api.get_predict_batcher()
+  server = make_server('127.0.0.1', 0, api.app, threaded=True)
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+
+  _client(server.port, 20, []) # Warm up
+  latencies = []
+  clients = [threading.Thread(target=_client, args=(server.port, args.requests, latencies)) for _ in range(args.clients)]
+  start = perf_counter()
+  for client in clients: client.start()
+  for client in clients: client.join()
+  elapsed = perf_counter() - start
+  server.shutdown()
+
+  p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+  print(f'max batch size {batcher.max_batch_size}, max wait {batcher.max_wait * 1000:g} ms, {args.clients} clients')
+  print(f'{len(latencies)} requests in {elapsed:.2f}s ({len(latencies) / elapsed:.0f}/s), p50 {p50:.2f} ms, p99 {p99:.2f} ms')
+
+if __name__ == '__main__':
+  main()
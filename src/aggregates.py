@@ -0,0 +1,514 @@
+import math
+import numpy as np
+import pandas as pd
+from redis import Redis
+from services import TRANSACTION_DATE_TIME_FORMAT
+from typing import Any, Optional
+
+# Aggregates are maintained in Redis while the dataset is ingested, chunk by chunk, so analytics
+# that only need them never have to scan the dataset.
+#
+# For every dimension in AGGREGATE_DIMENSIONS and every value of it, the transaction count and the
+# summed amount are kept separately for legitimate (0) and fraudulent (1) transactions in the hashes
+# 'count:<dimension>:<is_fraud>' and 'amt:<dimension>:<is_fraud>', keyed on the dimension value.
+# Every chunk is added to the hashes it touches with one HMGET and one HSET of all of its values per hash,
+# rather than one command per value, which assumes a single writer, as holds during ingest.
+# For every column in MOMENT_COLUMNS, the streaming moments (count, mean, sum of squared deviations,
+# min, max) are kept in the hash 'moments:<column>' and merged chunk by chunk with Welford's method.
+#
+# For every column in SKETCH_COLUMNS, a quantile sketch is kept in the hash 'sketch:<column>'. The
+# sketch is a DDSketch: values are counted in logarithmic buckets whose bounds grow by a factor of
+# gamma = (1 + a) / (1 - a), with a = SKETCH_RELATIVE_ACCURACY. Any quantile read from it is within
+# a relative error of a of the exact value at that rank, whatever the distribution or the number of
+# values. Sketches are merged by adding bucket counts, so each chunk is merged with HINCRBY.
+# Bucket fields are 'p<index>' for positive values, 'n<index>' for negative ones and 'z' for zeros.
+
+AGGREGATE_DIMENSIONS = ['state', 'category', 'gender', 'trans_month', 'trans_dayOfWeek', 'trans_day', 'trans_hour']
+# The time bucket dimensions, which act as rollups of the dataset over time, and their period frequencies
+TIME_BUCKETS = {
+  'hour': ('trans_hour', 'h'),
+  'day': ('trans_day', 'D'),
+  'month': ('trans_month', 'M'),
+}
+# Hotspot dimensions bin the coordinates of a location into a fixed grid of square cells, resolution degrees
+# on a side, for every resolution. A cell is labelled with its id on the grid, see grid_cells.
+HOTSPOT_LOCATIONS = {'customer': ('lat', 'long'), 'merchant': ('merch_lat', 'merch_long')}
+HOTSPOT_RESOLUTIONS = [1.0, 0.5, 0.25]
+# Finer grids have nearly one cell per transaction, so only these are maintained at ingest by default
+COARSE_HOTSPOT_RESOLUTIONS = [1.0, 0.5]
+HOTSPOT_RANKINGS = ['frauds', 'fraud_rate']
+MOMENT_COLUMNS = ['amt']
+SKETCH_COLUMNS = ['amt']
+SKETCH_RELATIVE_ACCURACY = 0.01
+_SKETCH_GAMMA = (1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY)
+_SKETCH_ZERO_BUCKET = 'z'
+
+def derive_time_columns(df: pd.DataFrame) -> pd.DataFrame:
+  """
+  Adds the trans_month (e.g. 2020-06), trans_day (e.g. 2020-06-21) and trans_hour (e.g. 2020-06-21 12:00)
+  period columns and the trans_dayOfWeek (e.g. Monday) column derived from trans_date_trans_time
+  with a single vectorized date parse. Dates that are already parsed are not parsed again.
+
+  Args:
+    df (pd.DataFrame): Transactions with a trans_date_trans_time column.
+  Returns:
+    result (pd.DataFrame): A copy of df with the derived columns.
+  """
+  dates = pd.to_datetime(df['trans_date_trans_time'], format=TRANSACTION_DATE_TIME_FORMAT)
+  return df.assign(
+    trans_month=dates.dt.to_period('M'),
+    trans_day=dates.dt.to_period('D'),
+    trans_hour=dates.dt.to_period('h'),
+    trans_dayOfWeek=dates.dt.day_name())
+
+def hotspot_dimension(location: str, resolution: float) -> str:
+  """
+  Names the hotspot dimension of a location at a resolution, e.g. hotspot:merchant:0.5.
+
+  Args:
+    location (str): A key of HOTSPOT_LOCATIONS.
+    resolution (float): A resolution in HOTSPOT_RESOLUTIONS.
+  Returns:
+    result (str): The dimension.
+  """
+  return f'hotspot:{location}:{resolution:g}'
+
+def _grid_shape(resolution: float) -> tuple[int, int]:
+  return int(round(180 / resolution)), int(round(360 / resolution))
+
+def grid_cells(lat: np.ndarray, lon: np.ndarray, resolution: float) -> pd.arrays.IntegerArray:
+  """
+  Bins coordinates into the grid cells of a resolution. Cells are numbered row by row from the south west
+  corner of the globe, so cell ids are stable across chunks and ingests.
+
+  Args:
+    lat (np.ndarray): The latitudes.
+    lon (np.ndarray): The longitudes.
+    resolution (float): The size of a cell in degrees.
+  Returns:
+    result (pd.arrays.IntegerArray): The cell id of every coordinate, missing where a coordinate is.
+  """
+  rows, cols = _grid_shape(resolution)
+  row = np.clip(np.floor((np.asarray(lat, dtype=np.float64) + 90) / resolution), 0, rows - 1)
+  col = np.clip(np.floor((np.asarray(lon, dtype=np.float64) + 180) / resolution), 0, cols - 1)
+  return pd.array(row * cols + col, dtype='Int64')
+
+def cell_bounds(cell: int, resolution: float) -> tuple[float, float, float, float]:
+  """
+  Computes the bounds of a grid cell.
+
+  Args:
+    cell (int): A cell id, see grid_cells.
+    resolution (float): The size of a cell in degrees.
+  Returns:
+    result (tuple[float, float, float, float]): The south, west, north and east bounds of the cell.
+  """
+  row, col = divmod(cell, _grid_shape(resolution)[1])
+  south, west = row * resolution - 90, col * resolution - 180
+  return tuple(round(v, 6) for v in (south, west, south + resolution, west + resolution))
+
+def derive_hotspot_columns(df: pd.DataFrame, resolutions: list[float] = HOTSPOT_RESOLUTIONS) -> pd.DataFrame:
+  """
+  Adds the grid cell columns of every hotspot dimension whose coordinates are in df, see hotspot_dimension.
+
+  Args:
+    df (pd.DataFrame): Transactions.
+    resolutions (list[float]): Optional kwarg, the resolutions of the grids to add, all of HOTSPOT_RESOLUTIONS by default.
+  Returns:
+    result (pd.DataFrame): A copy of df with the derived columns.
+  """
+  return df.assign(**{
+    hotspot_dimension(location, resolution): grid_cells(df[lat].to_numpy(), df[lon].to_numpy(), resolution)
+    for location, (lat, lon) in HOTSPOT_LOCATIONS.items() if lat in df.columns and lon in df.columns
+    for resolution in resolutions
+  })
+
+def compute_aggregate_table(df: pd.DataFrame, dim: str) -> pd.DataFrame:
+  """
+  Computes the counts and summed amounts of transactions per value of a dimension, split by fraud label.
+  Rows missing the dimension are left out.
+
+  Args:
+    df (pd.DataFrame): Transactions with the dimension, amt and is_fraud columns.
+    dim (str): A dimension in AGGREGATE_DIMENSIONS or a hotspot dimension.
+  Returns:
+    result (pd.DataFrame): Indexed on the dimension value with the columns count_0, count_1, amt_0 and amt_1.
+  """
+  groups = df.groupby([dim, 'is_fraud'], observed=True)['amt'].agg(['size', 'sum']).unstack('is_fraud', fill_value=0)
+  table = pd.DataFrame({
+    f'{name}_{is_fraud}': groups[(agg, is_fraud)] if (agg, is_fraud) in groups.columns else 0
+    for name, agg in [('count', 'size'), ('amt', 'sum')] for is_fraud in [0, 1]
+  }, index=groups.index)
+  return table.astype({'count_0': int, 'count_1': int, 'amt_0': float, 'amt_1': float})
+
+def merge_moments(a: dict[str, float], b: dict[str, float]) -> dict[str, float]:
+  """
+  Merges two sets of streaming moments (Chan et al.'s parallel form of Welford's method),
+  so the result is the same as if the moments were computed over both sets of values at once.
+
+  Args:
+    a (dict[str, float]): Moments with the keys n, mean, m2, min and max.
+    b (dict[str, float]): Moments with the keys n, mean, m2, min and max.
+  Returns:
+    result (dict[str, float]): The merged moments.
+  """
+  if a['n'] == 0: return dict(b)
+  if b['n'] == 0: return dict(a)
+  n = a['n'] + b['n']
+  delta = b['mean'] - a['mean']
+  return {
+    'n': n,
+    'mean': a['mean'] + delta * b['n'] / n,
+    'm2': a['m2'] + b['m2'] + delta * delta * a['n'] * b['n'] / n,
+    'min': min(a['min'], b['min']),
+    'max': max(a['max'], b['max']),
+  }
+
+def compute_moments(values: np.ndarray) -> dict[str, float]:
+  """
+  Computes the moments of a chunk of values, ignoring missing values.
+
+  Args:
+    values (np.ndarray): The values.
+  Returns:
+    result (dict[str, float]): Moments with the keys n, mean, m2, min and max.
+  """
+  values = values[~np.isnan(values)]
+  if len(values) == 0:
+    return {'n': 0, 'mean': 0.0, 'm2': 0.0, 'min': math.inf, 'max': -math.inf}
+  mean = float(values.mean())
+  return {
+    'n': len(values),
+    'mean': mean,
+    'm2': float(((values - mean) ** 2).sum()),
+    'min': float(values.min()),
+    'max': float(values.max()),
+  }
+
+def compute_comoments(values: np.ndarray) -> dict[str, Any]:
+  """
+  Computes the co-moments of a chunk of rows of several columns, leaving out rows with any missing value.
+
+  Args:
+    values (np.ndarray): The values, one row per transaction and one column per field.
+  Returns:
+    result (dict[str, Any]): Co-moments with the keys n (the row count), mean (the column means) and
+    c (the matrix of the sums of products of deviations from the means).
+  """
+  values = values[~np.isnan(values).any(axis=1)]
+  if len(values) == 0:
+    return {'n': 0, 'mean': np.zeros(values.shape[1]), 'c': np.zeros((values.shape[1], values.shape[1]))}
+  mean = values.mean(axis=0)
+  centered = values - mean
+  return {'n': len(values), 'mean': mean, 'c': centered.T @ centered}
+
+def merge_comoments(a: dict[str, Any], b: dict[str, Any]) -> dict[str, Any]:
+  """
+  Merges two sets of co-moments (the multivariate form of merge_moments), so the result is the
+  same as if the co-moments were computed over both chunks at once.
+
+  Args:
+    a (dict[str, Any]): Co-moments with the keys n, mean and c.
+    b (dict[str, Any]): Co-moments of the same columns with the keys n, mean and c.
+  Returns:
+    result (dict[str, Any]): The merged co-moments.
+  """
+  if a['n'] == 0: return b
+  if b['n'] == 0: return a
+  n = a['n'] + b['n']
+  delta = b['mean'] - a['mean']
+  return {
+    'n': n,
+    'mean': a['mean'] + delta * b['n'] / n,
+    'c': a['c'] + b['c'] + np.outer(delta, delta) * a['n'] * b['n'] / n,
+  }
+
+def covariance_and_correlation(comoments: dict[str, Any]) -> tuple[np.ndarray, np.ndarray]:
+  """
+  Derives the sample covariance and the Pearson correlation matrices from co-moments, the same way
+  pd.DataFrame.cov and pd.DataFrame.corr do. Entries that are undefined, e.g. the correlation
+  with a constant column, are NaN.
+
+  Args:
+    comoments (dict[str, Any]): Co-moments with the keys n, mean and c.
+  Returns:
+    result (tuple[np.ndarray, np.ndarray]): The covariance and correlation matrices.
+  """
+  n, c = comoments['n'], comoments['c']
+  cov = c / (n - 1) if n > 1 else np.full(c.shape, np.nan)
+  with np.errstate(divide='ignore', invalid='ignore'):
+    scale = np.sqrt(np.diag(c))
+    corr = c / np.outer(scale, scale)
+  corr[np.diag_indices_from(corr)] = np.where(scale > 0, 1.0, np.nan)
+  return cov, np.clip(corr, -1.0, 1.0)
+
+def describe_moments(moments: dict[str, float]) -> dict[str, float]:
+  """
+  Summarizes moments the same way pd.Series.describe does (the std is the sample std).
+
+  Args:
+    moments (dict[str, float]): Moments with the keys n, mean, m2, min and max.
+  Returns:
+    result (dict[str, float]): The count, mean, std, min and max.
+  """
+  n = moments['n']
+  return {
+    'count': float(n),
+    'mean': moments['mean'],
+    'std': math.sqrt(moments['m2'] / (n - 1)) if n > 1 else math.nan,
+    'min': moments['min'],
+    'max': moments['max'],
+  }
+
+def compute_sketch(values: np.ndarray) -> dict[str, int]:
+  """
+  Counts a chunk of values into the buckets of a quantile sketch, ignoring missing values.
+
+  Args:
+    values (np.ndarray): The values.
+  Returns:
+    result (dict[str, int]): The count of values in every non-empty bucket.
+  """
+  values = values[~np.isnan(values)]
+  sketch = {}
+  for prefix, magnitudes in [('p', values[values > 0]), ('n', -values[values < 0])]:
+    indices, counts = np.unique(np.ceil(np.log(magnitudes) / math.log(_SKETCH_GAMMA)), return_counts=True)
+    sketch.update({f'{prefix}{int(i)}': int(c) for i, c in zip(indices, counts)})
+  zeros = int((values == 0).sum())
+  if zeros: sketch[_SKETCH_ZERO_BUCKET] = zeros
+  return sketch
+
+def merge_sketches(a: dict[str, int], b: dict[str, int]) -> dict[str, int]:
+  """
+  Merges two quantile sketches, so the result is the same as if the sketch was computed over both sets of values at once.
+
+  Args:
+    a (dict[str, int]): A sketch.
+    b (dict[str, int]): A sketch.
+  Returns:
+    result (dict[str, int]): The merged sketch.
+  """
+  return {bucket: a.get(bucket, 0) + b.get(bucket, 0) for bucket in a.keys() | b.keys()}
+
+def _bucket_value(bucket: str) -> float:
+  # The representative value of a bucket is within the relative accuracy of every value counted in it
+  if bucket == _SKETCH_ZERO_BUCKET: return 0.0
+  magnitude = 2 * _SKETCH_GAMMA ** int(bucket[1:]) / (_SKETCH_GAMMA + 1)
+  return magnitude if bucket[0] == 'p' else -magnitude
+
+def sketch_quantiles(sketch: dict[str, int], qs: list[float]) -> dict[float, float]:
+  """
+  Reads quantiles out of a sketch.
+  The quantile q is estimated from the value of rank floor(q * (n - 1)) in sorted order, and the
+  estimate is within a relative error of SKETCH_RELATIVE_ACCURACY of that value.
+
+  Args:
+    sketch (dict[str, int]): A non-empty sketch.
+    qs (list[float]): The quantiles to read, between 0 and 1.
+  Returns:
+    result (dict[float, float]): The estimated value of each quantile.
+  """
+  buckets = sorted(sketch, key=_bucket_value)
+  cumulative = np.cumsum([sketch[bucket] for bucket in buckets])
+  ranks = np.floor(np.array(qs) * (cumulative[-1] - 1))
+  positions = np.searchsorted(cumulative, ranks, side='right')
+  return {q: _bucket_value(buckets[p]) for q, p in zip(qs, positions)}
+
+def read_sketch(redisdb: Redis, col: str) -> Optional[dict[str, int]]:
+  """
+  Reads the quantile sketch maintained for a column.
+
+  Args:
+    redisdb (Redis): Redis, selected on the aggregate db.
+    col (str): A column in SKETCH_COLUMNS.
+  Returns:
+    result (Optional[dict[str, int]]): The sketch, or None if there is none.
+  """
+  stored = redisdb.hgetall(f'sketch:{col}')
+  if not stored: return None
+  return {k.decode(): int(v) for k, v in stored.items()}
+
+def has_aggregate_dimension(redisdb: Redis, dim: str) -> bool:
+  """
+  Checks whether a dimension, e.g. a hotspot dimension that is only maintained on request, was maintained while the current dataset was ingested.
+
+  Args:
+    redisdb (Redis): Redis, selected on the aggregate db.
+    dim (str): A dimension in AGGREGATE_DIMENSIONS or a hotspot dimension.
+  Returns:
+    result (bool): Whether the aggregates of the dimension are available.
+  """
+  return bool(redisdb.exists(f'count:{dim}:0', f'count:{dim}:1'))
+
+def has_aggregates(redisdb: Redis) -> bool:
+  """
+  Checks whether aggregates were maintained while the current dataset was ingested.
+
+  Args:
+    redisdb (Redis): Redis, selected on the aggregate db.
+  Returns:
+    result (bool): Whether the aggregates are available.
+  """
+  return bool(redisdb.exists(f'moments:{MOMENT_COLUMNS[0]}'))
+
+def read_moments(redisdb: Redis, col: str) -> Optional[dict[str, float]]:
+  """
+  Reads the moments maintained for a column.
+
+  Args:
+    redisdb (Redis): Redis, selected on the aggregate db.
+    col (str): A column in MOMENT_COLUMNS.
+  Returns:
+    result (Optional[dict[str, float]]): Moments with the keys n, mean, m2, min and max, or None if there are none.
+  """
+  stored = redisdb.hgetall(f'moments:{col}')
+  if not stored: return None
+  moments = {k.decode(): float(v) for k, v in stored.items()}
+  moments['n'] = int(moments['n'])
+  return moments
+
+def _add_to_hashes(redisdb: Redis, increments: dict[str, dict[str, int | float]]) -> dict[str, dict[str, int | float]]:
+  # Reads the fields to increment of every hash in one roundtrip, with one HMGET per hash, and adds the increments to them
+  keys = [key for key, fields in increments.items() if fields]
+  with redisdb.pipeline() as pipe:
+    for key in keys:
+      pipe.hmget(key, list(increments[key]))
+    stored = pipe.execute()
+  return {
+    key: {field: type(increment)(old or 0) + increment for (field, increment), old in zip(increments[key].items(), values)}
+    for key, values in zip(keys, stored)
+  }
+
+def update_aggregates(redisdb: Redis, chunk: pd.DataFrame, hotspot_resolutions: list[float] = COARSE_HOTSPOT_RESOLUTIONS):
+  """
+  Folds a chunk of ingested transactions into the aggregates, including the hotspot grids of the locations it has coordinates for.
+  Counts, sums and moments are read, merged and written back, which assumes a single writer, as holds during ingest.
+
+  Args:
+    redisdb (Redis): Redis, selected on the aggregate db.
+    chunk (pd.DataFrame): The ingested transactions.
+    hotspot_resolutions (list[float]): Optional kwarg, the resolutions of the hotspot grids to maintain, COARSE_HOTSPOT_RESOLUTIONS by default.
+  """
+  chunk = derive_hotspot_columns(derive_time_columns(chunk), hotspot_resolutions)
+  hotspot_dims = [col for col in chunk.columns if col.startswith('hotspot:')]
+  increments = {}
+  for dim in AGGREGATE_DIMENSIONS + hotspot_dims:
+    table = compute_aggregate_table(chunk, dim)
+    values = table.index.astype(str)
+    for is_fraud in [0, 1]:
+      counted = (table[f'count_{is_fraud}'] > 0).to_numpy()
+      increments[f'count:{dim}:{is_fraud}'] = dict(zip(values[counted], table[f'count_{is_fraud}'][counted].tolist()))
+      increments[f'amt:{dim}:{is_fraud}'] = dict(zip(values[counted], table[f'amt_{is_fraud}'][counted].tolist()))
+  for col in SKETCH_COLUMNS:
+    increments[f'sketch:{col}'] = compute_sketch(chunk[col].to_numpy(dtype=float))
+  merged_hashes = _add_to_hashes(redisdb, increments)
+  with redisdb.pipeline() as pipe:
+    for key, mapping in merged_hashes.items():
+      pipe.hset(key, mapping=mapping)
+    for col in MOMENT_COLUMNS:
+      merged = merge_moments(
+        read_moments(redisdb, col) or compute_moments(np.array([])),
+        compute_moments(chunk[col].to_numpy(dtype=float)))
+      pipe.hset(f'moments:{col}', mapping=merged)
+    pipe.execute()
+
+def read_counts(redisdb: Redis, dim: str, is_fraud: int) -> dict[str, int]:
+  """
+  Reads the transaction counts per value of a dimension.
+
+  Args:
+    redisdb (Redis): Redis, selected on the aggregate db.
+    dim (str): A dimension in AGGREGATE_DIMENSIONS.
+    is_fraud (int): 1 for fraudulent transactions, 0 for legitimate ones.
+  Returns:
+    result (dict[str, int]): The counts, keyed on the dimension value. Values with no transactions are omitted.
+  """
+  return {k.decode(): int(v) for k, v in redisdb.hgetall(f'count:{dim}:{is_fraud}').items()}
+
+def read_aggregate_table(redisdb: Redis, dim: str) -> pd.DataFrame:
+  """
+  Reads every aggregate of a dimension in a single roundtrip.
+
+  Args:
+    redisdb (Redis): Redis, selected on the aggregate db.
+    dim (str): A dimension in AGGREGATE_DIMENSIONS or a hotspot dimension.
+  Returns:
+    result (pd.DataFrame): Indexed on the dimension value with the columns count_0, count_1, amt_0 and amt_1.
+  """
+  names = ['count_0', 'count_1', 'amt_0', 'amt_1']
+  with redisdb.pipeline() as pipe:
+    for name in names:
+      kind, is_fraud = name.split('_')
+      pipe.hgetall(f'{kind}:{dim}:{is_fraud}')
+    tables = pipe.execute()
+  df = pd.DataFrame({
+    name: pd.Series({k.decode(): float(v) for k, v in table.items()}, dtype=float)
+    for name, table in zip(names, tables)
+  }).fillna(0)
+  return df.astype({'count_0': int, 'count_1': int})
+
+def summarize_time_buckets(table: pd.DataFrame, bucket: str, start: Optional[pd.Timestamp] = None,
+                           end: Optional[pd.Timestamp] = None) -> list[dict[str, str | int | float]]:
+  """
+  Turns the aggregate table of a time bucket dimension into a chronological series of fraud rates.
+  Only buckets starting in [start, end) are kept. Buckets without transactions are omitted.
+
+  Args:
+    table (pd.DataFrame): The aggregate table of the bucket's dimension, see compute_aggregate_table.
+    bucket (str): A key of TIME_BUCKETS.
+    start (Optional[pd.Timestamp]): Optional kwarg, the earliest bucket start to keep.
+    end (Optional[pd.Timestamp]): Optional kwarg, the bucket start to stop before.
+  Returns:
+    result (list[dict[str, str | int | float]]): For every bucket, its label, the number of transactions,
+    the number of frauds, the fraud rate and the total amount.
+  """
+  _, freq = TIME_BUCKETS[bucket]
+  table = table.set_axis(pd.PeriodIndex(table.index.astype(str), freq=freq)).sort_index()
+  starts = table.index.start_time
+  keep = np.ones(len(table), dtype=bool)
+  if start is not None: keep &= starts >= start
+  if end is not None: keep &= starts < end
+  table = table[keep]
+  transactions = table['count_0'] + table['count_1']
+  return [
+    {
+      'bucket': str(period),
+      'transactions': int(total),
+      'frauds': int(frauds),
+      'fraud_rate': frauds / total,
+      'amt': float(amt),
+    }
+    for period, total, frauds, amt in zip(table.index, transactions, table['count_1'], table['amt_0'] + table['amt_1'])
+  ]
+
+def summarize_hotspots(table: pd.DataFrame, resolution: float, top: int, rank_by: str = 'frauds',
+                       min_transactions: int = 1) -> list[dict[str, Any]]:
+  """
+  Ranks the grid cells of a hotspot dimension by their frauds or fraud rate, breaking ties on the number of transactions.
+
+  Args:
+    table (pd.DataFrame): The aggregate table of the hotspot dimension, see compute_aggregate_table.
+    resolution (float): The resolution of the hotspot dimension.
+    top (int): The number of cells to return.
+    rank_by (str): Optional kwarg, one of HOTSPOT_RANKINGS.
+    min_transactions (int): Optional kwarg, the minimum number of transactions of a ranked cell.
+  Returns:
+    result (list[dict[str, Any]]): For the top cells, their center as [lat, lon], their bounds as
+    [[south, west], [north, east]], the number of transactions, the number of frauds and the fraud rate.
+  """
+  summary = pd.DataFrame({'transactions': table['count_0'] + table['count_1'], 'frauds': table['count_1']})
+  summary['fraud_rate'] = summary['frauds'] / summary['transactions']
+  summary['cell'] = table.index.astype(np.int64)
+  summary = summary[summary['transactions'] >= min_transactions]
+  summary = summary.sort_values([rank_by, 'transactions', 'cell'], ascending=[False, False, True]).head(top)
+  hotspots = []
+  for cell, transactions, frauds, fraud_rate in zip(summary['cell'], summary['transactions'], summary['frauds'], summary['fraud_rate']):
+    south, west, north, east = cell_bounds(int(cell), resolution)
+    hotspots.append({
+      'center': [round((south + north) / 2, 6), round((west + east) / 2, 6)],
+      'bounds': [[south, west], [north, east]],
+      'transactions': int(transactions),
+      'frauds': int(frauds),
+      'fraud_rate': float(fraud_rate),
+    })
+  return hotspots
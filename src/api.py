@@ -1,23 +1,48 @@
-from flask import Flask, send_file, abort, request
+from aggregates import COARSE_HOTSPOT_RESOLUTIONS, HOTSPOT_LOCATIONS, HOTSPOT_RANKINGS, HOTSPOT_RESOLUTIONS, SKETCH_RELATIVE_ACCURACY, TIME_BUCKETS, compute_aggregate_table, compute_comoments, \
+    compute_moments, compute_sketch, covariance_and_correlation, derive_hotspot_columns, derive_time_columns, describe_moments, has_aggregate_dimension, has_aggregates, hotspot_dimension, \
+    merge_comoments, merge_moments, merge_sketches, read_aggregate_table, read_counts, read_moments, read_sketch, sketch_quantiles, summarize_hotspots, \
+    summarize_time_buckets, update_aggregates
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from columncache import ColumnCache
+from columnstore import append_columns, iter_column_segments, read_column_store_meta, read_columns
+from flask import Flask, Response, send_file, abort, request
+from functools import wraps
+from geocode import cache_location, fetch_location, local_zip_centroid, parse_location, read_cached_location
+from groupby import FILTER_OPS, GROUPABLE_COLUMNS, NUMERIC_COLUMNS, finalize, merge_partials, parse_filter, parse_metric, partial_aggregate, required_columns
 from hotqueue import HotQueue
+from indexes import EQUALITY_INDEX_FIELDS, RANGE_INDEX_FIELDS, index_chunk, query_row_ids
 from io import BytesIO
 import logging
+from microbatch import MicroBatcher
+import numpy as np
 import orjson
-from os import environ
+from os import environ, sysconf
 import pandas as pd
+from pandas.io.parsers import TextFileReader
 from redis import Redis
-import requests
-from services import OK_200, PLOTTING_DATA_COLS, REDIS_JOB_IDS_KEY, TRANSACTION_DATE_TIME_FORMAT, RedisDb, get_bing_api_key, get_log_level, init_backend_services, \
-      get_queue as generic_get_queue, get_redis as generic_get_redis, pipeline_data_out_of_redis, validate_transaction_list
+from services import OK_200, PLOTTING_DATA_COLS, REDIS_JOB_IDS_KEY, SCAN_BATCH_SIZE, TRANSACTION_DATE_TIME_FORMAT, RedisDb, apply_transaction_schema, are_fine_hotspot_grids_enabled, bump_dataset_version, get_bing_api_key, get_column_cache_budget, get_dataset_version, get_inference_mode, get_log_level, get_predict_max_batch_size, get_predict_max_wait, plot_cache_key, \
+      init_backend_services, is_columnar_store_enabled, get_queue as generic_get_queue, get_redis as generic_get_redis, get_warmup_queue as generic_get_warmup_queue, pipeline_data_out_of_redis, scan_dataframes_out_of_redis, scan_raw_data_out_of_redis, validate_transaction_list
 import socket
-from typing import Any, Optional
+import threading
+from time import perf_counter
+from typing import Any, Callable, Iterable, Iterator, Optional
 import urllib3
 from uuid import uuid4
 from werkzeug.exceptions import HTTPException
 import zipfile
+import zlib
 
 app = Flask(__name__)
 
+RESULT_CACHE_TTL_SECONDS = 24 * 60 * 60
+STREAM_BATCH_SIZE = 50000
+AMT_ANALYSIS_MODES = ['exact', 'approx']
+# Dbs holding data derived from the dataset at ingest, which are reset along with it
+DERIVED_DBS = [RedisDb.COLUMN_DB, RedisDb.AGGREGATE_DB, RedisDb.INDEX_DB]
+QUERY_FILTER_PARAMS = EQUALITY_INDEX_FIELDS + [f'{bound}_{field}' for field in RANGE_INDEX_FIELDS for bound in ['min', 'max']]
+QUARTILES = [.25, .5, .75]
+PREDICT_TIMEOUT_SECONDS = 10
+
 queue_none_handler = lambda: abort(500, 'Unable to interact with jobs - HotQueue not initialized.')
 redis_none_handler = lambda: abort(500, 'Unable to read/write interact with data - Redis not initialized.')
 
@@ -41,6 +66,16 @@ def get_queue() -> HotQueue:
     return generic_get_queue(none_handler=queue_none_handler)
 
 
+def get_warmup_queue() -> HotQueue:
+    """
+    Gets the low-priority warm-up HotQueue and raises a 500 error if it hasn't been initialized yet.
+
+    Returns:
+        queue (HotQueue): The HotQueue instance.
+    """
+    return generic_get_warmup_queue(none_handler=queue_none_handler)
+
+
 def get_redis(db: RedisDb) -> Redis:
     """
     Gets Redis and raises a 500 error if it hasn't been initialized yet.
@@ -51,20 +86,121 @@ def get_redis(db: RedisDb) -> Redis:
     return generic_get_redis(db, none_handler=redis_none_handler)
 
 
+_predict_batcher: Optional[MicroBatcher] = None
+_predict_batcher_lock = threading.Lock()
+
+def get_predict_batcher() -> MicroBatcher:
+    """
+    Gets the micro-batcher that /predict runs transactions through, loading the model
+    into this process the first time it is called.
+    Throws an Exception if the model can't be loaded.
+
+    Returns:
+        batcher (MicroBatcher): The micro-batcher.
+    """
+    global _predict_batcher
+    if _predict_batcher is None:
+        with _predict_batcher_lock:
+            if _predict_batcher is None:
+                from inference import InferenceEngine, extract_transaction_row # Here so that torch is only needed to serve /predict
+                engine = InferenceEngine(mode=get_inference_mode())
+                run_batch = lambda transactions: engine.predict([extract_transaction_row(t) for t in transactions])
+                _predict_batcher = MicroBatcher(run_batch, get_predict_max_batch_size(), get_predict_max_wait())
+    return _predict_batcher
+
+
+STREAM_MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+}
+
+
+def _stream_transaction_data(stream_format: str) -> Iterator[bytes]:
+    """
+    Yields the transaction data in Redis as it is scanned out in batches. The stored values are
+    already serialized JSON, so they are forwarded without being decoded and re-encoded.
+
+    Args:
+        stream_format (str): 'ndjson' for one JSON object per line, or 'json' for a single JSON array.
+    Returns:
+        result (Iterator[bytes]): The response body, one batch at a time.
+    """
+    batches = scan_raw_data_out_of_redis(get_redis(RedisDb.TRANSACTION_DB))
+    if stream_format == 'ndjson':
+        for batch in batches:
+            yield b'\n'.join(batch) + b'\n'
+        return
+    yield b'['
+    first = True
+    for batch in batches:
+        if not batch:
+            continue
+        yield (b'' if first else b',') + b','.join(batch)
+        first = False
+    yield b']'
+
+
+def _gzip_stream(body: Iterator[bytes]) -> Iterator[bytes]:
+    """
+    Gzips a streamed response body. Every chunk is sync-flushed so clients can decompress
+    and consume each batch as soon as it arrives.
+
+    Args:
+        body (Iterator[bytes]): The uncompressed response body.
+    Returns:
+        result (Iterator[bytes]): The gzipped response body.
+    """
+    compressor = zlib.compressobj(wbits=31) # 31 selects the gzip container
+    for chunk in body:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
 # curl localhost:5173/transaction_data
+# curl "localhost:5173/transaction_data?stream=ndjson"
+# curl --compressed "localhost:5173/transaction_data?stream=json"
 @app.route('/transaction_data')
-def get_transaction_data_from_redis() -> list[dict[str, Any]]:
+def get_transaction_data_from_redis() -> list[dict[str, Any]] | Response:
     """
     Returns all the data currently stored in Redis.
     This will be an empty list if there is no data in Redis.
 
+    The optional query param 'stream' switches to a streamed response that is emitted batch by
+    batch as the data is read out of Redis, so clients can start consuming it immediately and the
+    API's memory use is bounded. It must be either 'ndjson' (one JSON object per line) or 'json'
+    (a single JSON array), otherwise a 400 Bad request is returned. Streamed responses are gzipped
+    when the client sends 'Accept-Encoding: gzip'.
+
     Returns:
-        result (list[dict[str, Any]]): The data stored in Redis.
+        result (list[dict[str, Any]] | Response): The data stored in Redis.
     """
-    return pipeline_data_out_of_redis(get_redis(RedisDb.TRANSACTION_DB))
+    stream_format = request.args.get('stream')
+    if stream_format is None:
+        return pipeline_data_out_of_redis(get_redis(RedisDb.TRANSACTION_DB))
+    if stream_format not in STREAM_MIMETYPES:
+        abort(400, f'Optional stream parameter must be one of {list(STREAM_MIMETYPES)}.')
+    body = _stream_transaction_data(stream_format)
+    headers = {'Vary': 'Accept-Encoding'}
+    if 'gzip' in request.accept_encodings:
+        body = _gzip_stream(body)
+        headers['Content-Encoding'] = 'gzip'
+    return Response(body, mimetype=STREAM_MIMETYPES[stream_format], headers=headers)
+
+
+def _is_dataset_col(col: str) -> bool:
+    """
+    Column filter passed to pd.read_csv so that the CSV's unnamed index column is never parsed.
+    This lets chunked reads skip the column without having to drop it from every chunk.
 
+    Args:
+        col (str): The name of a column in the CSV header.
+    Returns:
+        result (bool): Whether the column belongs in the dataset.
+    """
+    return col != 'Unnamed: 0'
 
-def _attempt_fetch_transaction_data_from_kaggle() -> Optional[pd.DataFrame]:
+
+def _attempt_fetch_transaction_data_from_kaggle(chunksize: Optional[int] = None) -> Optional[pd.DataFrame | TextFileReader]:
     """
     Tries to fetch the data from Kaggle. The following environment variables are required.
     KAGGLE_USERNAME, KAGGLE_KEY, KAGGLE_OWNER, KAGGLE_DATASET, KAGGLE_FILENAME. If a var
@@ -72,9 +208,14 @@ def _attempt_fetch_transaction_data_from_kaggle() -> Optional[pd.DataFrame]:
     downloading or processing the data into a dataframe, the exception will be logged
     appropriately and None will be returned. If the data is loaded successfully, the
     resulting pd.DataFrame will be returned.
-    
+
+    If chunksize is provided, the CSV is decompressed lazily out of the downloaded zip and
+    an iterator of pd.DataFrames with at most chunksize rows each is returned instead.
+
+    Args:
+        chunksize (Optional[int]): Optional number of rows per chunk for a streamed read.
     Returns:
-        result (Optional[pd.DataFrame]): A pd.DataFrame if successful, otherwise None.
+        result (Optional[pd.DataFrame | TextFileReader]): A pd.DataFrame (or chunk iterator) if successful, otherwise None.
     """
     try:
         # Delaying this import because __init__ tries to authenticate and will throw an error
@@ -92,6 +233,14 @@ def _attempt_fetch_transaction_data_from_kaggle() -> Optional[pd.DataFrame]:
         assert result.status == 200
         logging.debug('Response received from Kaggle, downloading and unzipping...')
         buffer = BytesIO(result.data)
+        if chunksize is not None:
+            # The zip stays open for as long as the returned reader is being consumed
+            zip_file = zipfile.ZipFile(buffer, 'r')
+            if kaggle_vars[2] not in zip_file.namelist():
+                logging.error('File not found in Kaggle download result.')
+                return None
+            logging.debug('Streaming CSV data out of the Kaggle download.')
+            return pd.read_csv(zip_file.open(kaggle_vars[2]), sep=',', usecols=_is_dataset_col, chunksize=chunksize)
         with zipfile.ZipFile(buffer, 'r') as zip_file:
             extracted_files = {name: zip_file.read(name) for name in zip_file.namelist()}
         logging.debug('Unzipped Kaggle data.')
@@ -108,15 +257,20 @@ def _attempt_fetch_transaction_data_from_kaggle() -> Optional[pd.DataFrame]:
         return None
 
 
-def _attempt_read_transaction_data_from_disk() -> Optional[pd.DataFrame]:
+def _attempt_read_transaction_data_from_disk(chunksize: Optional[int] = None) -> Optional[pd.DataFrame | TextFileReader]:
     """
     Tries to read the data from disk at the path specified by the FALLBACK_DATASET_PATH
     environment variable. If the environment variable isn't present or is invalid,
     or if the data at the path is invalid, the appropriate error logging will take place
     and None will be returned. Otherwise, the processed pd.DataFrame will be returned.
 
+    If chunksize is provided, an iterator of pd.DataFrames with at most chunksize rows
+    each is returned instead so the file is never fully loaded into memory.
+
+    Args:
+        chunksize (Optional[int]): Optional number of rows per chunk for a streamed read.
     Returns:
-        result (Optional[pd.DataFrame]): A pd.DataFrame if successful, otherwise None.
+        result (Optional[pd.DataFrame | TextFileReader]): A pd.DataFrame (or chunk iterator) if successful, otherwise None.
     """
     try:
         dataset_path = environ.get('FALLBACK_DATASET_PATH')
@@ -124,6 +278,8 @@ def _attempt_read_transaction_data_from_disk() -> Optional[pd.DataFrame]:
             logging.error('No valid path to the dataset specified by env var FALLBACK_DATASET_PATH')
             return None
         logging.debug('Dataset fallback path identified, attempting to read in the data...')
+        if chunksize is not None:
+            return pd.read_csv(dataset_path, sep=',', usecols=_is_dataset_col, chunksize=chunksize)
         df = pd.read_csv(dataset_path, sep=',').drop('Unnamed: 0', axis=1)
         logging.debug('Pandas DataFrame generated.')
         return df
@@ -132,9 +288,102 @@ def _attempt_read_transaction_data_from_disk() -> Optional[pd.DataFrame]:
         return None
 
 
+def _write_chunk_into_redis(chunk: pd.DataFrame, start_idx: int):
+    """
+    Serializes a chunk of the dataset and writes it into Redis with its own pipeline,
+    so Redis is only ever blocked for the duration of a single bounded chunk.
+
+    Args:
+        chunk (pd.DataFrame): The rows to write.
+        start_idx (int): The transaction id of the first row in the chunk.
+    """
+    with get_redis(RedisDb.TRANSACTION_DB).pipeline() as pipe:
+        for idx, record in enumerate(chunk.to_dict(orient='records'), start=start_idx):
+            pipe.set(idx, orjson.dumps(record))
+        pipe.execute()
+
+
+def _current_rss_mb() -> Optional[float]:
+    """
+    Reads the current resident memory of the process, unlike ru_maxrss which is the peak over its whole lifetime.
+
+    Returns:
+        result (Optional[float]): The resident memory in MB, or None where /proc isn't available.
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except OSError:
+        return None
+
+
+def _ingest_transaction_chunks(chunks: Iterable[pd.DataFrame]) -> dict[str, Optional[float]]:
+    """
+    Replaces the transactions in Redis with every chunk, in order, and measures the ingest.
+    Only one chunk is held in memory at a time when chunks is a lazy reader.
+    If the columnar store is enabled, every chunk is also appended to it.
+    Every chunk is folded into the incrementally maintained aggregates and secondary indexes. Only the
+    coarse hotspot grids are maintained, unless the fine ones are enabled as well.
+    The dataset version is bumped both before and after the chunks are written.
+
+    Args:
+        chunks (Iterable[pd.DataFrame]): The dataset, split into chunks.
+    Returns:
+        result (dict[str, Optional[float]]): The number of rows written, the elapsed seconds, the rows/sec
+        throughput, the resident memory of the process in MB before and after the ingest, and how far the
+        resident memory sampled after every chunk grew past the one before the ingest. The memory stats are
+        None where the resident memory can't be read.
+    """
+    start = perf_counter()
+    rss_before = max_rss = _current_rss_mb()
+    rows = 0
+    # Results cached for the old dataset are invalidated before it starts being overwritten
+    bump_dataset_version(get_redis(RedisDb.CACHE_DB))
+    # The old transactions and the data derived from them are reset, so rows left over from a larger dataset are never read
+    for db in [RedisDb.TRANSACTION_DB, *DERIVED_DBS]:
+        get_redis(db).flushdb()
+    columnar = is_columnar_store_enabled()
+    hotspot_resolutions = HOTSPOT_RESOLUTIONS if are_fine_hotspot_grids_enabled() else COARSE_HOTSPOT_RESOLUTIONS
+    for chunk in chunks:
+        _write_chunk_into_redis(chunk, rows)
+        if columnar:
+            append_columns(get_redis(RedisDb.COLUMN_DB), chunk)
+        update_aggregates(get_redis(RedisDb.AGGREGATE_DB), chunk, hotspot_resolutions=hotspot_resolutions)
+        index_chunk(get_redis(RedisDb.INDEX_DB), chunk, rows)
+        rows += len(chunk)
+        if max_rss is not None:
+            max_rss = max(max_rss, _current_rss_mb())
+        logging.debug(f'Ingested {rows} rows...')
+    # Results computed from the partially written dataset are invalidated as well
+    bump_dataset_version(get_redis(RedisDb.CACHE_DB))
+    seconds = perf_counter() - start
+    rss_after = _current_rss_mb()
+    return {
+        'rows': rows,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(rows / seconds, 1) if seconds > 0 else float(rows),
+        'rss_before_mb': round(rss_before, 1) if rss_before is not None else None,
+        'rss_after_mb': round(rss_after, 1) if rss_after is not None else None,
+        'rss_growth_mb': round(max_rss - rss_before, 1) if max_rss is not None else None,
+    }
+
+
+def _enqueue_plot_warmup():
+    """
+    Queues low-priority warm-up work that renders the plot of every feature in PLOTTING_DATA_COLS
+    against the current dataset version and stores it in the plot cache, one feature per message so
+    that jobs queued in the meantime still go first.
+    """
+    dataset_version = get_dataset_version(get_redis(RedisDb.CACHE_DB))
+    get_warmup_queue().put(*[{'graph_feature': feature, 'dataset_version': dataset_version} for feature in PLOTTING_DATA_COLS])
+    logging.info(f'Queued plot warm-up for dataset version {dataset_version}.')
+
+
 # curl -X POST localhost:5173/transaction_data
+# curl -X POST "localhost:5173/transaction_data?chunk_size=50000"
+# curl -X POST "localhost:5173/transaction_data?warm_plots=true"
 @app.route('/transaction_data', methods=['POST'])
-def load_transaction_data_into_redis() -> tuple[str, int]:
+def load_transaction_data_into_redis() -> tuple[str, int] | dict[str, float]:
     """
     Fetches the data from Kaggle or from disk as specified by the environment variable.
     If environment vars KAGGLE_USERNAME, KAGGLE_KEY, KAGGLE_OWNER, KAGGLE_DATASET,
@@ -148,23 +397,40 @@ def load_transaction_data_into_redis() -> tuple[str, int]:
     (FALLBACK_DATASET_PATH)
     MUST be provided.
 
+    The optional query param 'chunk_size' enables streaming ingest: the CSV is read and
+    written into Redis chunk_size rows at a time, each chunk with its own pipeline, so
+    memory use stays flat regardless of the size of the dataset. If provided, it must be a
+    valid positive integer, otherwise a 400 Bad request is returned.
+
+    The optional query param 'warm_plots', true or false (the default), queues low-priority work
+    for the workers to render every feature plot against the new dataset once it is loaded, so the
+    first graph_feature job of each feature is served from the plot cache.
+
     If the data cannot be loaded via either method, a 500 error is returned.
 
     Returns:
-        HTTP Result (tuple[str, int]): A 200 OK or a 500 and corresponding error message / explanation.
+        HTTP Result (tuple[str, int] | dict[str, float]): A 200 OK (or the ingest statistics when
+        streaming) or a 500 and corresponding error message / explanation.
     """
-    df = _attempt_fetch_transaction_data_from_kaggle()
+    chunk_size = request.args.get('chunk_size')
+    if chunk_size is not None:
+        if not chunk_size.isnumeric() or int(chunk_size) == 0:
+            abort(400, 'Optional chunk_size parameter must be a valid positive integer.')
+        chunk_size = int(chunk_size)
+    warm_plots = request.args.get('warm_plots', 'false')
+    if warm_plots not in ['true', 'false']:
+        abort(400, 'Optional warm_plots parameter must be true or false.')
+    df = _attempt_fetch_transaction_data_from_kaggle(chunksize=chunk_size)
     if df is None:
-        df = _attempt_read_transaction_data_from_disk()
+        df = _attempt_read_transaction_data_from_disk(chunksize=chunk_size)
     if df is None:
         abort(500, 'Unable to fetch data from Kaggle or from disk.')
-    data = df.to_dict(orient='records')
-
-    with get_redis(RedisDb.TRANSACTION_DB).pipeline() as pipe:
-        for idx, record in enumerate(data):
-            pipe.set(idx, orjson.dumps(record))
-        pipe.execute()
-    logging.info('Data POSTED into Redis Database.')
+    stats = _ingest_transaction_chunks(df if chunk_size is not None else [df])
+    logging.info(f'Data POSTED into Redis Database. {stats}')
+    if warm_plots == 'true':
+        _enqueue_plot_warmup()
+    if chunk_size is not None:
+        return stats
     return OK_200
 
 
@@ -178,52 +444,281 @@ def clear_transaction_data() -> tuple[str, int]:
         str: Confirmation about API task executed
         List: List of dictionaries for each data observation
     """
-    if get_redis(RedisDb.TRANSACTION_DB).flushdb():
+    if all(get_redis(db).flushdb() for db in [RedisDb.TRANSACTION_DB, *DERIVED_DBS]):
+        bump_dataset_version(get_redis(RedisDb.CACHE_DB))
         logging.info('Data DELETED from Redis Database.')
         return OK_200
     abort(500, 'Error clearing data from Redis.')
 
 
+def _encode_view_cursor(offset: int) -> str:
+    """
+    Encodes the offset of the next page of /transaction_data_view into an opaque cursor.
+
+    Args:
+        offset (int): The transaction id the next page starts at.
+    Returns:
+        result (str): The cursor.
+    """
+    return urlsafe_b64encode(orjson.dumps({'offset': offset})).decode()
+
+
+def _decode_view_cursor(cursor: str) -> Optional[int]:
+    """
+    Decodes a cursor produced by _encode_view_cursor.
+
+    Args:
+        cursor (str): The cursor.
+    Returns:
+        result (Optional[int]): The offset the cursor points to, or None if the cursor is invalid.
+    """
+    try:
+        offset = orjson.loads(urlsafe_b64decode(cursor.encode()))['offset']
+        assert isinstance(offset, int) and offset >= 0
+        return offset
+    except Exception:
+        return None
+
+
 # curl "localhost:5173/transaction_data_view?limit=2&offset=7"
+# curl "localhost:5173/transaction_data_view?limit=100&fields=amt,state,is_fraud"
+# curl "localhost:5173/transaction_data_view?limit=100&cursor=eyJvZmZzZXQiOjEwMH0="
 # curl localhost:5173/transaction_data_view
 @app.route('/transaction_data_view')
-def get_transaction_data_view() -> list[dict[str, Any]]:
+def get_transaction_data_view() -> Response:
     """
     Returns a slice of the data in redis.
-    Optional query params are 'limit' and 'offset'
-    If provided, must be valid positive integers
+    Optional query params are 'limit', 'offset', 'cursor' and 'fields'
+    Limit and offset, if provided, must be valid positive integers
     Offset defaults to zero
-    Limit defaults to the entire set
+    Limit defaults to 5
+    Cursor continues from where a previous page ended. If there is more data after a page,
+    the cursor for the next page is returned in the X-Next-Cursor response header.
+    A cursor cannot be combined with an offset.
+    Fields is a comma separated list of the fields to include in each entry. Defaults to all fields.
+    The whole page is fetched from Redis with a single MGET.
     Invalid parameters result in a 400 Bad request.
     Error fetching or processing data results in a 500 Internal server error.
 
     Returns:
-        result (list[dict[str, Any]]): [the data entries as a list of dictionaries / JSON objects]
+        result (Response): [the data entries as a list of dictionaries / JSON objects]
     """
     limit = request.args.get('limit')
     offset = request.args.get('offset')
+    cursor = request.args.get('cursor')
+    fields = request.args.get('fields')
     if limit is not None and not limit.isnumeric():
         abort(400, 'Optional limit parameter must be a valid positive integer.')
     if offset is not None and not offset.isnumeric():
         abort(400, 'Optional offset parameter must be a valid nonnegative integer.')
-    if offset is None:
+    if cursor is not None:
+        if offset is not None:
+            abort(400, 'Optional cursor parameter cannot be combined with the offset parameter.')
+        offset = _decode_view_cursor(cursor)
+        if offset is None:
+            abort(400, 'Optional cursor parameter is invalid.')
+    elif offset is None:
         offset = 0
     else:
         offset = int(offset)
-    if offset >= get_redis(RedisDb.TRANSACTION_DB).dbsize():
-        abort(400, 'Optional offset parameter must be less than the length of the dataset.')
     if limit is None:
         limit = 5
     else:
         limit = int(limit)
     if limit == 0:
         abort(400, 'Optional limit parameter must be greater than zero.')
-    return [orjson.loads(get_redis(RedisDb.TRANSACTION_DB).get(trans_id)) for trans_id in range(offset, offset + limit)]
+    if fields is not None:
+        fields = [f for f in fields.split(',') if f]
+        if not fields:
+            abort(400, 'Optional fields parameter must be a comma separated list of field names.')
+    # One extra entry is fetched to find out whether there is a next page
+    data = get_redis(RedisDb.TRANSACTION_DB).mget(range(offset, offset + limit + 1))
+    if data[0] is None:
+        abort(400, 'Optional offset parameter must be less than the length of the dataset.')
+    headers = {}
+    if data[-1] is not None:
+        headers['X-Next-Cursor'] = _encode_view_cursor(offset + limit)
+    page = [d for d in data[:-1] if d is not None]
+    if fields is None:
+        # Stored entries are already serialized, so they are forwarded as is
+        body = b'[' + b','.join(page) + b']'
+    else:
+        body = orjson.dumps([{f: r[f] for f in fields if f in r} for r in map(orjson.loads, page)])
+    return Response(body, mimetype='application/json', headers=headers)
+
+
+def _parse_bound(param: str) -> Optional[float]:
+    """
+    Parses an optional numeric query param, aborting with a 400 if it isn't a number.
+
+    Args:
+        param (str): The name of the query param.
+    Returns:
+        result (Optional[float]): The value of the param, or None if it wasn't provided.
+    """
+    value = request.args.get(param)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        abort(400, f'Optional {param} parameter must be a valid number.')
+
+
+# curl "localhost:5173/transaction_query?state=TX&category=grocery_pos&is_fraud=1"
+# curl "localhost:5173/transaction_query?state=TX,CA&min_amt=500&limit=20&offset=20"
+@app.route('/transaction_query')
+def query_transaction_data() -> Response:
+    """
+    Returns the transactions matching every given filter, found by intersecting the secondary
+    indexes maintained at ingest, so only the matching rows are read out of Redis.
+    Optional query params are the equality filters 'state', 'category', 'is_fraud' and 'gender',
+    each a comma separated list of accepted values, the inclusive range filters 'min_amt',
+    'max_amt', 'min_unix_time' and 'max_unix_time', and 'limit' and 'offset' to page through
+    the matches in ascending transaction id order. At least one filter is required.
+    Limit defaults to 100 and offset to zero.
+    Invalid parameters result in a 400 Bad request.
+
+    Returns:
+        result (Response): {"count": the number of matches, "transactions": [the page of matching transactions]}
+    """
+    limit = request.args.get('limit', '100')
+    offset = request.args.get('offset', '0')
+    if not limit.isnumeric() or int(limit) == 0:
+        abort(400, 'Optional limit parameter must be a valid positive integer.')
+    if not offset.isnumeric():
+        abort(400, 'Optional offset parameter must be a valid nonnegative integer.')
+    equals = {}
+    for field in EQUALITY_INDEX_FIELDS:
+        values = request.args.get(field)
+        if values is not None:
+            equals[field] = [v for v in values.split(',') if v]
+            if not equals[field]:
+                abort(400, f'Optional {field} parameter must be a comma separated list of values.')
+    ranges = {}
+    for field in RANGE_INDEX_FIELDS:
+        bounds = (_parse_bound(f'min_{field}'), _parse_bound(f'max_{field}'))
+        if bounds != (None, None):
+            ranges[field] = bounds
+    if not equals and not ranges:
+        abort(400, f'At least one filter parameter must be provided: {QUERY_FILTER_PARAMS}.')
+    count, ids = query_row_ids(get_redis(RedisDb.INDEX_DB), equals, ranges, int(offset), int(limit))
+    rows = [d for d in get_redis(RedisDb.TRANSACTION_DB).mget(ids) if d is not None] if ids else []
+    # Stored entries are already serialized, so they are forwarded as is
+    body = b'{"count":' + str(count).encode() + b',"transactions":[' + b','.join(rows) + b']}'
+    return Response(body, mimetype='application/json')
+
+
+def _result_cache_key(version: int) -> str:
+    """
+    Builds the result cache key of the current request from its path, its query params
+    (in sorted order, so equivalent requests share a key) and the dataset version.
+
+    Args:
+        version (int): The dataset version the result is computed from.
+    Returns:
+        result (str): The cache key.
+    """
+    params = orjson.dumps(sorted(request.args.items(multi=True))).decode()
+    return f'result:{version}:{request.path}:{params}'
+
+
+def cached_result(route: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Decorates an analytics route so its JSON result is cached in Redis, where it is shared by
+    every API replica. Results are keyed on the route, its params and the dataset version, so a
+    result is never served once the dataset has changed; old entries simply expire.
+    Errors raised with abort are never cached.
+
+    Args:
+        route (Callable[..., Any]): The route function. Its result must be JSON serializable.
+    Returns:
+        result (Callable[..., Any]): The caching route function.
+    """
+    @wraps(route)
+    def caching_route(*args, **kwargs):
+        # The version is read before computing, so a result that races an ingest is cached under the old version
+        key = _result_cache_key(get_dataset_version(get_redis(RedisDb.CACHE_DB)))
+        cached = get_redis(RedisDb.CACHE_DB).get(key)
+        if cached is not None:
+            return orjson.loads(cached)
+        result = route(*args, **kwargs)
+        get_redis(RedisDb.CACHE_DB).set(key, orjson.dumps(result, option=orjson.OPT_SERIALIZE_NUMPY), ex=RESULT_CACHE_TTL_SECONDS)
+        return result
+    return caching_route
+
+
+def _scan_transaction_data(cols: list[str], batch_size: int = SCAN_BATCH_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Yields the transaction data in Redis in batches, keeping only the requested columns.
+
+    Args:
+        cols (list[str]): The columns to keep.
+        batch_size (int): Optional kwarg hinting how many rows are read per batch.
+    Returns:
+        result (Iterator[pd.DataFrame]): The transaction data, in batches.
+    """
+    return scan_dataframes_out_of_redis(get_redis(RedisDb.TRANSACTION_DB), cols=cols, batch_size=batch_size)
+
+
+def _stream_columns(cols: list[str]) -> Iterator[pd.DataFrame]:
+    """
+    Yields the requested columns of the dataset one chunk at a time, converted to their compact dtypes.
+    Chunks are segments of the columnar store when it is enabled and populated, otherwise scanned batches of rows.
+    Fails with abort if the data hasn't been loaded into Redis yet or if a column is missing from it.
+
+    Args:
+        cols (list[str]): The columns to read.
+    Returns:
+        result (Iterator[pd.DataFrame]): The columns, in chunks.
+    """
+    chunks = None
+    if is_columnar_store_enabled():
+        meta = read_column_store_meta(get_redis(RedisDb.COLUMN_DB))
+        if meta is not None:
+            chunks = iter_column_segments(get_redis(RedisDb.COLUMN_DB), [col for col in cols if col in meta['columns']], meta=meta)
+    if chunks is None:
+        chunks = _scan_transaction_data(cols, batch_size=STREAM_BATCH_SIZE)
+    empty = True
+    for chunk in chunks:
+        for col in cols:
+            if col not in chunk.columns:
+                logging.error(f'Required column {col} is missing from the dataset.')
+                abort(500, f'Required column {col} is missing from the dataset.')
+        empty = False
+        yield apply_transaction_schema(chunk)
+    if empty:
+        abort(400, 'Data must be loaded into Redis before analysis can be performed.')
+
+
+_column_cache: Optional[ColumnCache] = None
+_column_cache_lock = threading.Lock()
+
+def get_column_cache() -> ColumnCache:
+    """
+    Gets the process-local column cache of AnalysisManager, creating it with the budget from the environment the first time it is called.
+    Throws an Exception if the budget is invalid.
+
+    Returns:
+        cache (ColumnCache): The column cache.
+    """
+    global _column_cache
+    if _column_cache is None:
+        with _column_cache_lock:
+            if _column_cache is None:
+                _column_cache = ColumnCache(get_column_cache_budget())
+    return _column_cache
 
 
 class AnalysisManager:
     """
     This class provides streamlining for loading and assembling required DataFrames for data analysis.
+    Required columns are served from the process-local column cache when they were already read for the
+    current dataset version, so back-to-back analyses on the same columns don't touch Redis for the data.
+    Only the columns missing from the cache are loaded, out of the columnar store when it is enabled and populated.
+    Both the columnar store and the transactions are read in row order, so columns loaded separately from the
+    same dataset version line up row by row. Columns are only cached if the dataset didn't change while they
+    were loaded, and if the loaded columns don't have as many rows as the cached ones, all of them are reloaded.
     It may call the Flask abort function and is expected to be used within Flask context.
     """
     def __init__(self, required_cols: list[str]):
@@ -233,17 +728,69 @@ class AnalysisManager:
         """
         self.required_cols = required_cols
 
-    def __enter__(self):
-        data = get_transaction_data_from_redis()
-        if not data:
+    def _read_column_store(self, cols: list[str]) -> Optional[pd.DataFrame]:
+        """
+        Reads only the given columns out of the columnar store.
+
+        Args:
+            cols (list[str]): The columns to read.
+        Returns:
+            result (Optional[pd.DataFrame]): The columns, or None if the columnar store is disabled or empty.
+        """
+        if not is_columnar_store_enabled():
+            return None
+        meta = read_column_store_meta(get_redis(RedisDb.COLUMN_DB))
+        if meta is None:
+            return None
+        for col in cols:
+            if col not in meta['columns']:
+                logging.error(f'Required column {col} is missing from the column store.')
+                abort(500, f'Required column {col} is missing from the dataset.')
+        return read_columns(get_redis(RedisDb.COLUMN_DB), cols, meta=meta)
+
+    def _load(self, cols: list[str]) -> pd.DataFrame:
+        """
+        Loads the given columns out of Redis, converted to their compact dtypes.
+
+        Args:
+            cols (list[str]): The columns to load.
+        Returns:
+            result (pd.DataFrame): A DataFrame with exactly the given columns.
+        """
+        df = self._read_column_store(cols)
+        if df is not None:
+            return apply_transaction_schema(df)
+        frames = list(_scan_transaction_data(cols))
+        if not frames:
             abort(400, 'Data must be loaded into Redis before analysis can be performed.')
-        df = pd.DataFrame(data)
-        df = df.drop(columns=df.columns.difference(self.required_cols), axis=1)
-        for col in self.required_cols:
+        df = pd.concat(frames, ignore_index=True)
+        df = df.drop(columns=df.columns.difference(cols), axis=1)
+        for col in cols:
             if col not in df.columns:
                 logging.error(f'Required column {col} is missing from the DataFrame.')
                 abort(500, f'Required column {col} is missing from the dataset.')
-        return df
+        return apply_transaction_schema(df)
+
+    def __enter__(self):
+        column_cache = get_column_cache()
+        if not column_cache.enabled:
+            return self._load(self.required_cols)
+        version = get_dataset_version(get_redis(RedisDb.CACHE_DB))
+        columns = column_cache.get(version, self.required_cols)
+        missing_cols = [col for col in self.required_cols if col not in columns]
+        if missing_cols:
+            df = self._load(missing_cols)
+            if columns and len(df) != len(next(iter(columns.values()))):
+                logging.warning('Cached columns do not line up with the loaded ones, reloading all of them.')
+                missing_cols = self.required_cols
+                df = self._load(missing_cols)
+            cacheable = get_dataset_version(get_redis(RedisDb.CACHE_DB)) == version
+            for col in missing_cols:
+                columns[col] = df[col]
+                if cacheable:
+                    column_cache.put(version, col, df[col])
+        # The DataFrame gets its own copy of the columns, so callers can't modify the cached ones
+        return pd.DataFrame({col: columns[col] for col in self.required_cols})
 
     def __exit__(self, exception_type, exception_value, _):
         if exception_type is HTTPException:
@@ -254,24 +801,66 @@ class AnalysisManager:
         return True
 
 
+def _stream_amt_moments_and_sketch() -> tuple[dict[str, float], dict[str, int]]:
+    """
+    Returns the moments and quantile sketch of the transaction amounts, reading the ones maintained
+    at ingest if they exist and otherwise building them in a single streaming pass over the dataset.
+    Fails with abort if the data hasn't been loaded into Redis yet.
+
+    Returns:
+        result (tuple[dict[str, float], dict[str, int]]): The moments and the sketch of 'amt'.
+    """
+    if has_aggregates(get_redis(RedisDb.AGGREGATE_DB)):
+        return read_moments(get_redis(RedisDb.AGGREGATE_DB), 'amt'), read_sketch(get_redis(RedisDb.AGGREGATE_DB), 'amt')
+    moments, sketch = compute_moments(np.array([])), {}
+    for df in _scan_transaction_data(['amt']):
+        values = df['amt'].to_numpy(dtype=float)
+        moments = merge_moments(moments, compute_moments(values))
+        sketch = merge_sketches(sketch, compute_sketch(values))
+    if moments['n'] == 0:
+        abort(400, 'Data must be loaded into Redis before analysis can be performed.')
+    return moments, sketch
+
+
 # curl localhost:5173/amt_analysis
+# curl "localhost:5173/amt_analysis?mode=approx"
 @app.route('/amt_analysis')
+@cached_result
 def amt_analysis() -> dict[str, float]:
     """
     Computes and returns statistical descriptions of the transaction amounts in the dataset.
     Returns this as a dict. Fails with abort and appropriate error code and message if the
     data hasn't been loaded into Redis yet or if there's an error computing the statistics.
 
+    The optional mode parameter selects how the 25%, 50% and 75% quantiles are computed. 'exact'
+    (the default) reads the whole 'amt' column. 'approx' reads them from a quantile sketch without
+    holding the column in memory; each is within a relative error of SKETCH_RELATIVE_ACCURACY
+    of the exact value at its rank. The other statistics are exact in both modes.
+
     Returns:
         result (dict[str, float]): A dict containing statistical summaries of the 'amt' field
         in the dataset, including count, mean, std, min, 25%, 50%, 75%, and max.
     """
+    mode = request.args.get('mode', 'exact')
+    if mode not in AMT_ANALYSIS_MODES:
+        abort(400, f'Optional mode parameter must be one of {AMT_ANALYSIS_MODES}.')
+    if mode == 'approx':
+        moments, sketch = _stream_amt_moments_and_sketch()
+        quantiles = sketch_quantiles(sketch, QUARTILES)
+        return {**describe_moments(moments), **{f'{q:.0%}': quantiles[q] for q in QUARTILES}}
+    if has_aggregates(get_redis(RedisDb.AGGREGATE_DB)):
+        # count, mean, std, min and max are maintained at ingest, only the quantiles need the data
+        summary = describe_moments(read_moments(get_redis(RedisDb.AGGREGATE_DB), 'amt'))
+        with AnalysisManager(['amt']) as df:
+            quantiles = df['amt'].quantile(QUARTILES)
+        return {**summary, **{f'{q:.0%}': quantiles[q] for q in QUARTILES}}
     with AnalysisManager(['amt']) as df:
         return df['amt'].describe().to_dict()
 
 
 # curl localhost:5173/amt_fraud_correlation
 @app.route('/amt_fraud_correlation')
+@cached_result
 def compute_correlation() -> dict[str, dict[str, float]]:
     """
     Computes the correlation between transaction amount ('amt') and fraud status ('is_fraud') in the dataset.
@@ -279,52 +868,111 @@ def compute_correlation() -> dict[str, dict[str, float]]:
     Returns:
         result (dict[str, dict[str, float]]) A dict containing the correlation matrix between 'amt' and 'is_fraud'.
     """
-    with AnalysisManager(['amt', 'is_fraud']) as df:
-        return df.corr().to_dict()
+    return _stream_covariance_and_correlation(['amt', 'is_fraud'])['correlation']
 
 
-# curl localhost:5173/fraudulent_zipcode_info
-@app.route('/fraudulent_zipcode_info')
-def fraudulent_zipcode_info() -> dict[str, str | float]:
+def _matrix_to_dict(matrix: np.ndarray, cols: list[str]) -> dict[str, dict[str, Optional[float]]]:
+    # Shaped like pd.DataFrame.to_dict, with None instead of NaN so that the result serializes to valid JSON
+    return {col: {row: None if np.isnan(v) else float(v) for row, v in zip(cols, matrix[:, j])} for j, col in enumerate(cols)}
+
+
+def _stream_covariance_and_correlation(cols: list[str]) -> dict[str, Any]:
     """
-    Identifies the zipcode with the highest number of fraudulent transactions, and retrieves its geographic location.
+    Computes the covariance and correlation matrices of numeric columns in a single streaming pass,
+    merging the co-moments of every chunk, so only one chunk is ever held in memory.
+    Rows with a missing value in any of the columns are left out.
 
+    Args:
+        cols (list[str]): The numeric columns.
     Returns:
-        result (dict[str, str|float]): A dict containing the most fraudulent zipcode, the number of frauds, and a Google Maps link to the location.
+        result (dict[str, Any]): The number of rows used and the covariance and correlation matrices.
+    """
+    comoments = compute_comoments(np.empty((0, len(cols))))
+    for chunk in _stream_columns(cols):
+        comoments = merge_comoments(comoments, compute_comoments(chunk[cols].to_numpy(dtype=np.float64)))
+    cov, corr = covariance_and_correlation(comoments)
+    return {'n': comoments['n'], 'covariance': _matrix_to_dict(cov, cols), 'correlation': _matrix_to_dict(corr, cols)}
+
+
+# curl localhost:5173/correlation
+# curl "localhost:5173/correlation?columns=amt,city_pop,is_fraud"
+@app.route('/correlation')
+@cached_result
+def compute_correlation_matrix() -> dict[str, Any]:
+    """
+    Computes the covariance and Pearson correlation matrices of any set of numeric columns in a single streaming
+    pass over the dataset with mergeable co-moments, so it scales to datasets larger than the API's memory.
+    The optional columns query param is a comma separated list of numeric columns, defaulting to all of them.
+    Rows with a missing value in any of the columns are left out. Undefined entries are null.
+
+    Returns:
+        result (dict[str, Any]): The number of rows used and the covariance and correlation matrices.
     """
+    cols = [col for col in request.args.get('columns', ','.join(NUMERIC_COLUMNS)).split(',') if col]
+    if not cols or any(col not in NUMERIC_COLUMNS for col in cols):
+        abort(400, f'Optional columns parameter must be a comma separated list of columns in {NUMERIC_COLUMNS}.')
+    return _stream_covariance_and_correlation(list(dict.fromkeys(cols)))
+
+
+def _geocode_zipcode(zipcode: str) -> tuple[float, float]:
+    """
+    Looks the location of a zipcode up in the geocode cache, or with the Bing Locations API on a cache miss,
+    caching its answer. It may call the Flask abort function and is expected to be used within Flask context.
+
+    Args:
+        zipcode (str): The zipcode.
+    Returns:
+        result (tuple[float, float]): The (lat, lon) of the zipcode.
+    """
+    location = read_cached_location(get_redis(RedisDb.CACHE_DB), zipcode)
+    if location is not None:
+        return location
+
     try:
         bing_api_key = get_bing_api_key()
     except Exception as e:
         logging.error(f'Error fetching bing api key: {e}')
         abort(500, 'Error fetching bing api key.')
 
-    with AnalysisManager(['is_fraud', 'zip']) as df:
-        fraud_transactions = df[df['is_fraud'] == 1]
-        fraudulent_zipcode_counts = fraud_transactions['zip'].astype(str).value_counts()
-        most_fraudulent_zipcode = fraudulent_zipcode_counts.idxmax()
-        max_fraud_count = fraudulent_zipcode_counts.max()
-
     try:
-        response = requests.get(
-            f'http://dev.virtualearth.net/REST/v1/Locations/US/{most_fraudulent_zipcode}',
-            params={'key': bing_api_key}
-        )
+        response = fetch_location(zipcode, bing_api_key)
     except Exception as e:
         logging.error(f'Error fetching location: {e}')
         abort(500, 'Error fetching location.')
 
     try:
-        assert response.status_code == 200
-        assert response.json() is not None
-        lat, lon = response.json()['resourceSets'][0]['resources'][0]['point']['coordinates']
-        assert isinstance(lat, float)
-        assert isinstance(lon, float)
-        assert -90 <= lat <= 90
-        assert -180 <= lon <= 180
+        location = parse_location(response)
     except Exception as e:
         logging.error(f'Unable to parse virtualearth response {e}')
         abort(500, 'Error parsing virtualearth response.')
 
+    cache_location(get_redis(RedisDb.CACHE_DB), zipcode, location)
+    return location
+
+
+# curl localhost:5173/fraudulent_zipcode_info
+@app.route('/fraudulent_zipcode_info')
+@cached_result
+def fraudulent_zipcode_info() -> dict[str, str | float]:
+    """
+    Identifies the zipcode with the highest number of fraudulent transactions, and retrieves its geographic location.
+    The location is the centroid of the zipcode's coordinates in the dataset, falling back to the geocode cache
+    and the Bing Locations API only if the dataset has none.
+
+    Returns:
+        result (dict[str, str|float]): A dict containing the most fraudulent zipcode, the number of frauds, and a Google Maps link to the location.
+    """
+    with AnalysisManager(['is_fraud', 'zip', 'lat', 'long']) as df:
+        fraud_transactions = df[df['is_fraud'] == 1]
+        fraudulent_zipcode_counts = fraud_transactions['zip'].astype(str).value_counts()
+        most_fraudulent_zipcode = fraudulent_zipcode_counts.idxmax()
+        max_fraud_count = fraudulent_zipcode_counts.max()
+        location = local_zip_centroid(df, most_fraudulent_zipcode)
+
+    if location is None:
+        location = _geocode_zipcode(most_fraudulent_zipcode)
+    lat, lon = location
+
     return {
         'most_fraudulent_zipcode': most_fraudulent_zipcode,
         'fraud_count': int(max_fraud_count), # This is an int64 from numpy and we have to make it an int for JSON
@@ -336,6 +984,7 @@ def fraudulent_zipcode_info() -> dict[str, str | float]:
 
 # curl localhost:5173/fraud_by_state
 @app.route('/fraud_by_state')
+@cached_result
 def fraud_by_state() -> dict[str, int]:
     """
     Returns the number of fraudulent transactions per state.
@@ -343,8 +992,140 @@ def fraud_by_state() -> dict[str, int]:
     Returns:
         result (dict[str, int]): A dict containing the count of fraudulent transactions by state.
     """
+    if has_aggregates(get_redis(RedisDb.AGGREGATE_DB)):
+        return read_counts(get_redis(RedisDb.AGGREGATE_DB), 'state', 1)
     with AnalysisManager(['state', 'is_fraud']) as df:
-        return df[df['is_fraud'] == 1]['state'].value_counts().to_dict()
+        counts = df[df['is_fraud'] == 1]['state'].value_counts()
+        # Categorical states without frauds are still counted, with 0
+        return counts[counts > 0].to_dict()
+
+
+def _parse_timestamp(param: str) -> Optional[pd.Timestamp]:
+    """
+    Parses an optional ISO 8601 date or date time query param, aborting with a 400 if it isn't one.
+    A date time with a timezone is converted to UTC, and the timezone dropped to compare with the naive bucket starts.
+
+    Args:
+        param (str): The name of the query param.
+    Returns:
+        result (Optional[pd.Timestamp]): The value of the param, or None if it wasn't provided.
+    """
+    value = request.args.get(param)
+    if value is None:
+        return None
+    try:
+        timestamp = pd.Timestamp(value)
+    except ValueError:
+        timestamp = None
+    # An empty value parses to NaT
+    if timestamp is None or pd.isna(timestamp):
+        abort(400, f'Optional {param} parameter must be an ISO 8601 date or date time, e.g. 2020-06-21 or 2020-06-21T12:00.')
+    return timestamp.tz_convert(None) if timestamp.tzinfo is not None else timestamp
+
+
+# curl "localhost:5173/fraud_rate?bucket=month"
+# curl "localhost:5173/fraud_rate?bucket=hour&start=2020-06-21&end=2020-06-22"
+@app.route('/fraud_rate')
+@cached_result
+def fraud_rate() -> list[dict[str, str | int | float]]:
+    """
+    Returns the fraud rate over time, as a chronological series of time buckets.
+    The bucket query param selects the bucket size, one of hour, day or month (defaults to day).
+    The optional start and end query params (ISO 8601) keep only the buckets starting in [start, end).
+    Buckets are served from the rollups maintained at ingest, without touching the transactions.
+    Buckets without transactions are omitted.
+
+    Returns:
+        result (list[dict[str, str | int | float]]): For every bucket, its label, the number of transactions,
+        the number of frauds, the fraud rate and the total amount.
+    """
+    bucket = request.args.get('bucket', 'day')
+    if bucket not in TIME_BUCKETS:
+        abort(400, f'Optional bucket parameter must be one of {list(TIME_BUCKETS)}.')
+    start = _parse_timestamp('start')
+    end = _parse_timestamp('end')
+    dim, _ = TIME_BUCKETS[bucket]
+    if has_aggregates(get_redis(RedisDb.AGGREGATE_DB)):
+        table = read_aggregate_table(get_redis(RedisDb.AGGREGATE_DB), dim)
+    else:
+        with AnalysisManager(['trans_date_trans_time', 'amt', 'is_fraud']) as df:
+            table = compute_aggregate_table(derive_time_columns(df), dim)
+    return summarize_time_buckets(table, bucket, start=start, end=end)
+
+
+# curl localhost:5173/fraud_hotspots
+# curl "localhost:5173/fraud_hotspots?location=merchant&resolution=0.25&top=5&rank_by=fraud_rate&min_transactions=100"
+@app.route('/fraud_hotspots')
+@cached_result
+def fraud_hotspots() -> list[dict[str, Any]]:
+    """
+    Returns the top grid cells by fraud, binning the customer (lat/long) or merchant (merch_lat/merch_long)
+    coordinates of transactions into a grid of square cells. Optional query params are 'location', customer
+    (the default) or merchant, 'resolution', the size of a cell in degrees (0.5 by default), 'top', the number
+    of cells (10 by default), 'rank_by', frauds (the default) or fraud_rate, and 'min_transactions', the minimum
+    number of transactions of a ranked cell (1 by default). The coarse grids (and the fine ones if enabled) are
+    maintained at ingest, so the transactions are not read. Other grids are binned from the coordinates on request.
+    Invalid parameters result in a 400 Bad request.
+
+    Returns:
+        result (list[dict[str, Any]]): For the top cells, their center as [lat, lon], their bounds as
+        [[south, west], [north, east]], the number of transactions, the number of frauds and the fraud rate.
+    """
+    location = request.args.get('location', 'customer')
+    if location not in HOTSPOT_LOCATIONS:
+        abort(400, f'Optional location parameter must be one of {list(HOTSPOT_LOCATIONS)}.')
+    resolution = _parse_bound('resolution')
+    resolution = 0.5 if resolution is None else resolution
+    if resolution not in HOTSPOT_RESOLUTIONS:
+        abort(400, f'Optional resolution parameter must be one of {HOTSPOT_RESOLUTIONS}.')
+    top = request.args.get('top', '10')
+    if not top.isnumeric() or int(top) == 0:
+        abort(400, 'Optional top parameter must be a valid positive integer.')
+    rank_by = request.args.get('rank_by', 'frauds')
+    if rank_by not in HOTSPOT_RANKINGS:
+        abort(400, f'Optional rank_by parameter must be one of {HOTSPOT_RANKINGS}.')
+    min_transactions = request.args.get('min_transactions', '1')
+    if not min_transactions.isnumeric():
+        abort(400, 'Optional min_transactions parameter must be a valid nonnegative integer.')
+    dim = hotspot_dimension(location, resolution)
+    if has_aggregates(get_redis(RedisDb.AGGREGATE_DB)) and has_aggregate_dimension(get_redis(RedisDb.AGGREGATE_DB), dim):
+        table = read_aggregate_table(get_redis(RedisDb.AGGREGATE_DB), dim)
+    else:
+        with AnalysisManager([*HOTSPOT_LOCATIONS[location], 'amt', 'is_fraud']) as df:
+            table = compute_aggregate_table(derive_hotspot_columns(df, [resolution]), dim)
+    return summarize_hotspots(table, resolution, int(top), rank_by=rank_by, min_transactions=int(min_transactions))
+
+
+# curl "localhost:5173/aggregate?group_by=category&metrics=count,fraud_rate,mean:amt"
+# curl "localhost:5173/aggregate?group_by=state,trans_month&metrics=sum:amt&filter=is_fraud:eq:1&filter=amt:ge:100"
+@app.route('/aggregate')
+@cached_result
+def aggregate() -> list[dict[str, Any]]:
+    """
+    Answers a group-by question over the whole dataset, streaming it in column chunks and merging
+    the partial aggregates of every chunk, so the dataset is never loaded at once.
+    Optional query params are 'group_by', a comma separated list of columns (no grouping by default),
+    'metrics', a comma separated list of count, fraud_rate, sum:<column> and mean:<column> (count by default),
+    and 'filter', repeatable, each <column>:<op>:<value> with op one of eq, ne, in, lt, le, gt, ge
+    (in takes values separated by |). Rows must match every filter.
+    Invalid parameters result in a 400 Bad request.
+
+    Returns:
+        result (list[dict[str, Any]]): One object per group with its group column values and metrics, in group order.
+    """
+    group_by = [col for col in request.args.get('group_by', '').split(',') if col]
+    for col in group_by:
+        if col not in GROUPABLE_COLUMNS:
+            abort(400, f'Optional group_by parameter must be a comma separated list of columns in {GROUPABLE_COLUMNS}.')
+    metrics = [parse_metric(spec) for spec in request.args.get('metrics', 'count').split(',')]
+    filters = [parse_filter(spec) for spec in request.args.getlist('filter')]
+    for parsed in metrics + filters:
+        if isinstance(parsed, str):
+            abort(400, parsed)
+    partial = None
+    for chunk in _stream_columns(required_columns(group_by, metrics, filters)):
+        partial = merge_partials(partial, partial_aggregate(chunk, group_by, metrics, filters))
+    return finalize(partial, group_by, metrics)
 
 
 # curl localhost:5173/jobs
@@ -382,7 +1163,8 @@ def post_job() -> dict[str, str]:
     """
     Ensures that valid JSON params were sent with the JOB POST request.
     Then creates a unique job id, saves the job information, queues the job,
-    and returns the job id.
+    and returns the job id. graph_feature jobs whose plot is already in the plot cache
+    are completed immediately instead of being queued.
     If the request is invalid an error message with code 400 will be returned.
 
     Returns:
@@ -395,12 +1177,18 @@ def post_job() -> dict[str, str]:
             if 'graph_feature' in client_submitted_data:
                 if client_submitted_data['graph_feature'] in PLOTTING_DATA_COLS:
                     job_id = str(uuid4())
+                    # A plot of the same feature and dataset version completes the job without a worker
+                    cache_key = plot_cache_key(client_submitted_data['graph_feature'], get_dataset_version(get_redis(RedisDb.CACHE_DB)))
+                    image = get_redis(RedisDb.CACHE_DB).get(cache_key)
+                    if image is not None:
+                        get_redis(RedisDb.JOB_RESULTS_DB).set(job_id, image)
                     get_redis(RedisDb.JOB_DB).set(job_id, orjson.dumps({
-                        'status': 'queued',
+                        'status': 'queued' if image is None else 'completed',
                         'graph_feature': client_submitted_data['graph_feature'],
                     }))
                     get_redis(RedisDb.JOB_DB).rpush(REDIS_JOB_IDS_KEY, job_id)
-                    get_queue().put(job_id)
+                    if image is None:
+                        get_queue().put(job_id)
                     return {'job_id': job_id}
                 abort(400, f'JSON param "graph_feature" must be included in {PLOTTING_DATA_COLS}')
             elif 'transactions' in client_submitted_data:
@@ -466,6 +1254,33 @@ def get_job_result(id: str) -> Any:
     abort(500, 'Malformed job.')
 
 
+# curl -X POST localhost:5173/predict -d '{"transactions": [...]}' -H "Content-Type: application/json"
+@app.route('/predict', methods=['POST'])
+def predict() -> list[float]:
+    """
+    Classifies transactions synchronously with the model loaded in the API process.
+    Concurrent requests are coalesced into micro-batches of up to PREDICT_MAX_BATCH_SIZE transactions,
+    waiting at most PREDICT_MAX_WAIT_MS for more requests, and run through the model at once.
+    If the request is invalid an error message with code 400 will be returned,
+    and if the model can't be run one with code 503.
+
+    Returns:
+        result (list[float]): The classification of each transaction, 0.0 for legitimate and 1.0 for fraudulent.
+    """
+    client_submitted_data = request.get_json(silent=True)
+    if not isinstance(client_submitted_data, dict) or list(client_submitted_data) != ['transactions']:
+        abort(400, 'JSON data params must be an object with a single key: "transactions".')
+    if not isinstance(client_submitted_data['transactions'], list) or not client_submitted_data['transactions']:
+        abort(400, 'JSON param "transactions" must be a non-empty list of transactions.')
+    err = validate_transaction_list(client_submitted_data)
+    if err is not None: abort(400, err)
+    try:
+        return get_predict_batcher().run(client_submitted_data['transactions'], timeout=PREDICT_TIMEOUT_SECONDS)
+    except Exception as e:
+        logging.error(f'Failed to predict transactions: {e}')
+    abort(503, 'Model inference is currently unavailable.')
+
+
 # curl http://127.0.0.1:5173/help
 @app.route('/help')
 def get_help():
@@ -480,10 +1295,22 @@ def get_help():
             'description': 'Returns all transaction data currently stored in Redis.',
             'example_curl': 'curl http://127.0.0.1:5173/transaction_data'
         },
+        '/transaction_data?stream=<ndjson|json> (GET)': {
+            'description': 'Streams all transaction data out of Redis in batches as NDJSON or a JSON array, gzipped if the client accepts it.',
+            'example_curl': 'curl "localhost:5173/transaction_data?stream=ndjson"'
+        },
         '/transaction_data (POST)': {
             'description': 'Fetches transaction data from Kaggle or disk and stores it in Redis.',
             'example_curl': 'curl -X POST localhost:5173/transaction_data'
         },
+        '/transaction_data?chunk_size=<int> (POST)': {
+            'description': 'Streams transaction data into Redis chunk_size rows at a time and returns the ingest statistics.',
+            'example_curl': 'curl -X POST "localhost:5173/transaction_data?chunk_size=50000"'
+        },
+        '/transaction_data?warm_plots=<true|false> (POST)': {
+            'description': 'Loads transaction data into Redis, then has the workers pre-render every feature plot in the background.',
+            'example_curl': 'curl -X POST "localhost:5173/transaction_data?warm_plots=true"'
+        },
         '/transaction_data (DELETE)': {
             'description': 'Deletes all transaction data stored in Redis.',
             'example_curl': 'curl -X DELETE localhost:5173/transaction_data'
@@ -496,14 +1323,39 @@ def get_help():
             'description': 'Returns a slice of the transaction data stored in Redis.',
             'example_curl': 'curl "localhost:5173/transaction_data_view?limit=2&offset=7"'
         },
+        '/transaction_data_view?limit=<int>&cursor=<str>&fields=<str,...> (GET)': {
+            'description': 'Returns the next page after the X-Next-Cursor header of a previous page, with only the listed fields.',
+            'example_curl': 'curl -i "localhost:5173/transaction_data_view?limit=100&fields=amt,state,is_fraud"'
+        },
+        '/transaction_query?<filters>&limit=<int>&offset=<int> (GET)': {
+            'description': 'Returns the transactions matching every filter, found through secondary indexes maintained at ingest.',
+            'filter Parameters': QUERY_FILTER_PARAMS,
+            'example_curl': 'curl "localhost:5173/transaction_query?state=TX&category=grocery_pos&is_fraud=1"'
+        },
         '/amt_analysis (GET)': {
             'description': 'Returns statistical descriptions of the transaction amounts in the dataset.',
             'example_curl': 'curl "localhost:5173/amt_analysis"'
         },
+        '/amt_analysis?mode=<exact|approx> (GET)': {
+            'description': f'Returns the same statistics with quartiles read from a quantile sketch, each within a relative error of {SKETCH_RELATIVE_ACCURACY:.0%} of the exact value.',
+            'example_curl': 'curl "localhost:5173/amt_analysis?mode=approx"'
+        },
         '/amt_fraud_correlation (GET)':{
             'description': 'Returns the correlation between transaction amount and fraud status in the dataset.',
             'example_curl': 'curl "localhost:5173/amt_fraud_correlation"'
         }, 
+        '/correlation?columns=<str,...> (GET)': {
+            'description': 'Returns the covariance and correlation matrices of numeric columns, computed in a single streaming pass.',
+            'columns Parameters': NUMERIC_COLUMNS,
+            'example_curl': 'curl "localhost:5173/correlation?columns=amt,city_pop,is_fraud"'
+        },
+        '/fraud_hotspots?location=<str>&resolution=<float>&top=<int>&rank_by=<str>&min_transactions=<int> (GET)': {
+            'description': 'Returns the top cells of a grid of customer or merchant coordinates by frauds or fraud rate, precomputed at ingest for the coarse grids.',
+            'location Parameters': list(HOTSPOT_LOCATIONS),
+            'resolution Parameters': HOTSPOT_RESOLUTIONS,
+            'rank_by Parameters': HOTSPOT_RANKINGS,
+            'example_curl': 'curl "localhost:5173/fraud_hotspots?location=merchant&resolution=0.25&top=5"'
+        },
         '/fraudulent_zipcode_info (GET)':{
             'description': 'Returns the zipcode with the highest number of fraudulent transactions, and retrieves its geographic location.',
             'example_curl': 'curl "localhost:5173/fraudulent_zipcode_info"'
@@ -512,6 +1364,16 @@ def get_help():
             'description': ' Returns the number of fraudulent transactions per state.',
             'example_curl': 'curl "localhost:5173/fraud_by_state"'
         }, 
+        '/fraud_rate?bucket=<hour|day|month>&start=<date>&end=<date> (GET)': {
+            'description': 'Returns the number of transactions, frauds, fraud rate and total amount per time bucket, served from rollups maintained at ingest.',
+            'example_curl': 'curl "localhost:5173/fraud_rate?bucket=hour&start=2020-06-21&end=2020-06-22"'
+        },
+        '/aggregate?group_by=<str,...>&metrics=<str,...>&filter=<column:op:value> (GET)': {
+            'description': 'Returns count, sum, mean and fraud rate metrics per group of the dataset, aggregated one chunk at a time.',
+            'metrics Parameters': ['count', 'fraud_rate', 'sum:<column>', 'mean:<column>'],
+            'filter ops': FILTER_OPS,
+            'example_curl': 'curl "localhost:5173/aggregate?group_by=category&metrics=count,fraud_rate,mean:amt&filter=amt:ge:100"'
+        },
         '/jobs (GET)':{
             'description': 'Returns all job ids in the database.',
             'example_curl': 'curl "localhost:5173/jobs"'
@@ -526,6 +1388,11 @@ def get_help():
             'transactions (list of objects) Parameters': [f'trans_date_trans_time ({TRANSACTION_DATE_TIME_FORMAT})', 'merchant (str)', 'category (str)', 'amt (float)', 'lat (float)', 'long (float)', 'job (str)', 'merch_lat (float)', 'merch_long (float)'],
             'example_curl': 'curl -X POST localhost:5173/jobs -d "{\"graph_feature\": \"gender\"}" -H "Content-Type: application/json"'
         },
+        '/predict (POST)': {
+            'description': 'Synchronously classifies transactions as legitimate (0.0) or fraudulent (1.0), batching concurrent requests through a model loaded in the API.',
+            'transactions (list of objects) Parameters': [f'trans_date_trans_time ({TRANSACTION_DATE_TIME_FORMAT})', 'merchant (str)', 'category (str)', 'amt (float)', 'lat (float)', 'long (float)', 'job (str)', 'merch_lat (float)', 'merch_long (float)'],
+            'example_curl': 'curl -X POST localhost:5173/predict -d "{\"transactions\": [{\"trans_date_trans_time\": \"21/06/2020 12:14\", \"merchant\": \"fraud_Kirlin and Sons\", \"category\": \"personal_care\", \"amt\": 2.86, \"lat\": 33.9659, \"long\": -80.9355, \"job\": \"Mechanical engineer\", \"merch_lat\": 33.986391, \"merch_long\": -81.200714}]}" -H "Content-Type: application/json"'
+        },
         '/jobs/<id> (GET)': {
             'description': 'Returns information about the specified job id.',
             'example_curl': 'curl "localhost:5173/jobs/99e6820f-0e4f-4b55-8052-7845ea390a44"'
@@ -551,6 +1418,19 @@ def main():
     """
     logging.info('Credit Card Fraud Transaction API service started')
     init_backend_services()
+    try:
+        get_column_cache()
+    except Exception as e:
+        logging.error(f'Invalid column cache configuration: {e}')
+        raise
+    # The debug reloader runs main again in a child process that serves the requests, so the model
+    # is only preloaded there. Otherwise it is loaded by the first /predict.
+    if environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        try:
+            get_predict_batcher()
+            logging.info('Model loaded for /predict.')
+        except Exception as e:
+            logging.warning(f'/predict is unavailable, the model could not be loaded: {e}')
     logging.info('Redis and HotQueue instances attached, serving clients...')
     app.run(debug=True, host='0.0.0.0', port=5173)
 
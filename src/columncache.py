@@ -0,0 +1,82 @@
+from collections import OrderedDict
+import pandas as pd
+from threading import Lock
+
+class ColumnCache:
+  """
+  A process-local LRU cache of dataset columns, keyed on the dataset version and the column name.
+  Once the columns held exceed the memory budget, the least recently used ones are evicted.
+  Columns of older dataset versions are dropped as soon as a newer version is stored, as they can never be read again.
+  The cache is safe to share between the threads of a process.
+  """
+  def __init__(self, budget_bytes: int):
+    """
+    Args:
+      budget_bytes (int): The maximum total size of the cached columns. A budget of 0 disables the cache.
+    """
+    self.budget_bytes = budget_bytes
+    self.nbytes = 0
+    self._version = None
+    self._columns: OrderedDict[str, tuple[pd.Series, int]] = OrderedDict()
+    self._lock = Lock()
+
+  @property
+  def enabled(self) -> bool:
+    return self.budget_bytes > 0
+
+  def get(self, version: int, cols: list[str]) -> dict[str, pd.Series]:
+    """
+    Returns the cached columns of the given dataset version, marking them as recently used.
+
+    Args:
+      version (int): The dataset version.
+      cols (list[str]): The columns to look up.
+    Returns:
+      result (dict[str, pd.Series]): The cached columns among cols. Columns that aren't cached are omitted.
+    """
+    with self._lock:
+      if version != self._version:
+        return {}
+      hits = {}
+      for col in cols:
+        if col in self._columns:
+          self._columns.move_to_end(col)
+          hits[col] = self._columns[col][0]
+      return hits
+
+  def put(self, version: int, col: str, values: pd.Series):
+    """
+    Caches a column of the given dataset version, evicting least recently used columns to stay within the budget.
+    Columns larger than the whole budget are not cached.
+
+    Args:
+      version (int): The dataset version the column was read from.
+      col (str): The column name.
+      values (pd.Series): The column.
+    """
+    size = int(values.memory_usage(index=False, deep=True))
+    with self._lock:
+      if self._version is None or version > self._version:
+        self._clear()
+        self._version = version
+      elif version < self._version:
+        return
+      if size > self.budget_bytes:
+        return
+      if col in self._columns:
+        self.nbytes -= self._columns.pop(col)[1]
+      while self.nbytes + size > self.budget_bytes:
+        self.nbytes -= self._columns.popitem(last=False)[1][1]
+      self._columns[col] = (values, size)
+      self.nbytes += size
+
+  def clear(self):
+    """
+    Drops every cached column.
+    """
+    with self._lock:
+      self._clear()
+
+  def _clear(self):
+    self._columns.clear()
+    self.nbytes = 0
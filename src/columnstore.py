@@ -0,0 +1,135 @@
+import numpy as np
+from orjson import dumps, loads
+import pandas as pd
+from redis import Redis
+import struct
+from typing import Any, Iterator, Optional
+
+# The columnar layout stores every column of the dataset as a sequence of packed, self-describing
+# segments under the keys '<column>:<segment number>'. Numeric columns are stored as raw numpy
+# buffers and string columns are dictionary encoded (a small vocab plus int32 codes), so reading
+# one column never requires fetching or decoding any of the others.
+#
+# Each segment is laid out as <uint32 header length><orjson header><payload bytes> where the header
+# is {"dtype": "<numpy dtype str>"} for numeric segments or {"dtype": "dict", "vocab": [...]} for
+# dictionary encoded ones. The meta key records the column names and the row count of each segment.
+
+COLUMN_STORE_META_KEY = 'meta'
+COLUMN_SEGMENT_ROWS = 65536
+_DICT_DTYPE = 'dict'
+_HEADER_LEN = struct.Struct('<I')
+
+def _segment_key(col: str, segment: int) -> str:
+  return f'{col}:{segment}'
+
+def encode_segment(values: pd.Series) -> bytes:
+  """
+  Packs a column segment into bytes.
+  Numeric and boolean columns are stored as their raw little-endian numpy buffer.
+  Everything else is dictionary encoded; missing values are stored with the code -1.
+
+  Args:
+    values (pd.Series): The values of one column for the rows in the segment.
+  Returns:
+    result (bytes): The packed segment.
+  """
+  if values.dtype.kind in 'biuf':
+    array = np.ascontiguousarray(values.to_numpy())
+    array = array.astype(array.dtype.newbyteorder('<'), copy=False)
+    header = dumps({'dtype': array.dtype.str})
+    return _HEADER_LEN.pack(len(header)) + header + array.tobytes()
+  codes, vocab = pd.factorize(values, use_na_sentinel=True)
+  header = dumps({'dtype': _DICT_DTYPE, 'vocab': vocab.tolist()})
+  return _HEADER_LEN.pack(len(header)) + header + codes.astype('<i4').tobytes()
+
+def decode_segment(data: bytes) -> np.ndarray:
+  """
+  Unpacks a segment produced by encode_segment.
+
+  Args:
+    data (bytes): The packed segment.
+  Returns:
+    result (np.ndarray): The values of the segment. Dictionary encoded segments are returned as object arrays.
+  """
+  (header_len,) = _HEADER_LEN.unpack_from(data)
+  header = loads(data[_HEADER_LEN.size:_HEADER_LEN.size + header_len])
+  payload = data[_HEADER_LEN.size + header_len:]
+  if header['dtype'] != _DICT_DTYPE:
+    return np.frombuffer(payload, dtype=np.dtype(header['dtype']))
+  codes = np.frombuffer(payload, dtype='<i4')
+  # Code -1 marks a missing value, which indexes the trailing None
+  vocab = np.empty(len(header['vocab']) + 1, dtype=object)
+  vocab[:-1] = header['vocab']
+  return vocab[codes]
+
+def read_column_store_meta(redisdb: Redis) -> Optional[dict[str, Any]]:
+  """
+  Returns the metadata of the columnar store, or None if nothing has been written to it.
+
+  Args:
+    redisdb (Redis): Redis, selected on the column db.
+  Returns:
+    result (Optional[dict[str, Any]]): {"columns": [...], "segment_rows": [...]} or None.
+  """
+  meta = redisdb.get(COLUMN_STORE_META_KEY)
+  return None if meta is None else loads(meta)
+
+def append_columns(redisdb: Redis, chunk: pd.DataFrame):
+  """
+  Appends the rows of a chunk to the columnar store, splitting it into segments of at most
+  COLUMN_SEGMENT_ROWS rows. All segments of a chunk are written with a single pipeline.
+  This assumes a single writer, which holds as the store is only written during ingest.
+
+  Args:
+    redisdb (Redis): Redis, selected on the column db.
+    chunk (pd.DataFrame): The rows to append.
+  """
+  meta = read_column_store_meta(redisdb) or {'columns': chunk.columns.tolist(), 'segment_rows': []}
+  with redisdb.pipeline() as pipe:
+    for start in range(0, len(chunk), COLUMN_SEGMENT_ROWS):
+      segment_df = chunk.iloc[start:start + COLUMN_SEGMENT_ROWS]
+      segment = len(meta['segment_rows'])
+      for col in meta['columns']:
+        pipe.set(_segment_key(col, segment), encode_segment(segment_df[col]))
+      meta['segment_rows'].append(len(segment_df))
+    pipe.set(COLUMN_STORE_META_KEY, dumps(meta))
+    pipe.execute()
+
+def iter_column_segments(redisdb: Redis, cols: list[str], meta: Optional[dict[str, Any]] = None) -> Iterator[pd.DataFrame]:
+  """
+  Yields the requested columns one segment at a time, fetching each segment with a single MGET.
+  Only the requested columns are transferred out of Redis and decoded.
+
+  Args:
+    redisdb (Redis): Redis, selected on the column db.
+    cols (list[str]): The columns to read. Each must be present in the store.
+    meta (Optional[dict[str, Any]]): The store metadata, if the caller already fetched it.
+  Returns:
+    result (Iterator[pd.DataFrame]): One DataFrame per segment with exactly the requested columns.
+  """
+  meta = meta if meta is not None else read_column_store_meta(redisdb)
+  if meta is None: return
+  for segment in range(len(meta['segment_rows'])):
+    data = redisdb.mget([_segment_key(col, segment) for col in cols])
+    yield pd.DataFrame({col: decode_segment(d) for col, d in zip(cols, data)})
+
+def read_columns(redisdb: Redis, cols: list[str], meta: Optional[dict[str, Any]] = None) -> pd.DataFrame:
+  """
+  Reads the requested columns for every row in the store with a single MGET.
+
+  Args:
+    redisdb (Redis): Redis, selected on the column db.
+    cols (list[str]): The columns to read. Each must be present in the store.
+    meta (Optional[dict[str, Any]]): The store metadata, if the caller already fetched it.
+  Returns:
+    result (pd.DataFrame): A DataFrame with exactly the requested columns, empty if the store is empty.
+  """
+  meta = meta if meta is not None else read_column_store_meta(redisdb)
+  if meta is None or not meta['segment_rows']:
+    return pd.DataFrame(columns=cols)
+  num_segments = len(meta['segment_rows'])
+  data = redisdb.mget([_segment_key(col, segment) for col in cols for segment in range(num_segments)])
+  return pd.DataFrame({
+    col: np.concatenate([decode_segment(d) for d in data[i * num_segments:(i + 1) * num_segments]])
+    for i, col in enumerate(cols)
+  })
@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+from redis import Redis
+import requests
+from requests.adapters import HTTPAdapter
+from typing import Any, Optional
+from urllib3.util.retry import Retry
+
+# Zipcodes are geocoded locally whenever possible, so the API rarely waits on an external service.
+#
+# The dataset carries the lat/long of every transaction's zipcode, so the centroid of those is the
+# primary source. Only zipcodes without coordinates in the dataset are looked up with the Bing
+# Locations API, through a pooled session with timeouts, and its answers are cached in Redis with a TTL.
+
+GEOCODE_CACHE_TTL_SECONDS = 30 * 24 * 60 * 60
+GEOCODE_TIMEOUT_SECONDS = (3.05, 10) # (connect, read)
+GEOCODE_POOL_SIZE = 10
+LOCATIONS_URL = 'http://dev.virtualearth.net/REST/v1/Locations/US/{}'
+
+_session: Optional[requests.Session] = None
+
+def _cache_key(zipcode: str) -> str:
+  return f'geocode:{zipcode}'
+
+def local_zip_centroid(df: pd.DataFrame, zipcode: str) -> Optional[tuple[float, float]]:
+  """
+  Computes the centroid of the coordinates the dataset has for a zipcode.
+
+  Args:
+    df (pd.DataFrame): Transactions with the zip, lat and long columns.
+    zipcode (str): The zipcode.
+  Returns:
+    result (Optional[tuple[float, float]]): The (lat, lon) of the zipcode, or None if the dataset has no coordinates for it.
+  """
+  coords = df.loc[df['zip'].astype(str) == zipcode, ['lat', 'long']].dropna()
+  if coords.empty: return None
+  # Coordinates are float32, which is only precise to ~4 decimals (~10m) at these magnitudes
+  lat, lon = np.round(coords.to_numpy(dtype=np.float64).mean(axis=0), 4)
+  return float(lat), float(lon)
+
+def read_cached_location(redisdb: Redis, zipcode: str) -> Optional[tuple[float, float]]:
+  """
+  Reads the cached location of a zipcode.
+
+  Args:
+    redisdb (Redis): Redis, selected on the cache db.
+    zipcode (str): The zipcode.
+  Returns:
+    result (Optional[tuple[float, float]]): The (lat, lon) of the zipcode, or None if it isn't cached.
+  """
+  cached = redisdb.get(_cache_key(zipcode))
+  if cached is None: return None
+  lat, lon = cached.decode().split(',')
+  return float(lat), float(lon)
+
+def cache_location(redisdb: Redis, zipcode: str, location: tuple[float, float], ttl: int = GEOCODE_CACHE_TTL_SECONDS):
+  """
+  Caches the location of a zipcode for ttl seconds.
+
+  Args:
+    redisdb (Redis): Redis, selected on the cache db.
+    zipcode (str): The zipcode.
+    location (tuple[float, float]): The (lat, lon) of the zipcode.
+    ttl (int): The number of seconds to keep it for.
+  """
+  redisdb.set(_cache_key(zipcode), f'{location[0]},{location[1]}', ex=ttl)
+
+def get_session() -> requests.Session:
+  """
+  Returns the HTTP session shared by geocoding requests, so connections to the Locations API are reused.
+  Transient failures are retried with a backoff.
+
+  Returns:
+    session (requests.Session): The session.
+  """
+  global _session
+  if _session is None:
+    session = requests.Session()
+    retries = Retry(total=2, backoff_factor=0.5, status_forcelist=[429, 502, 503, 504], allowed_methods=['GET'])
+    session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=GEOCODE_POOL_SIZE, max_retries=retries))
+    _session = session
+  return _session
+
+def fetch_location(zipcode: str, api_key: str) -> requests.Response:
+  """
+  Looks a zipcode up with the Bing Locations API.
+  Throws an Exception if the request fails or times out.
+
+  Args:
+    zipcode (str): The zipcode.
+    api_key (str): The Bing API key.
+  Returns:
+    response (requests.Response): The response of the Locations API.
+  """
+  return get_session().get(LOCATIONS_URL.format(zipcode), params={'key': api_key}, timeout=GEOCODE_TIMEOUT_SECONDS)
+
+def parse_location(response: Any) -> tuple[float, float]:
+  """
+  Parses and validates the coordinates of a Locations API response.
+  Throws an Exception if the response isn't a successful one with valid coordinates.
+
+  Args:
+    response (Any): The response of the Locations API.
+  Returns:
+    result (tuple[float, float]): The (lat, lon) of the zipcode.
+  """
+  assert response.status_code == 200
+  assert response.json() is not None
+  lat, lon = response.json()['resourceSets'][0]['resources'][0]['point']['coordinates']
+  assert isinstance(lat, float)
+  assert isinstance(lon, float)
+  assert -90 <= lat <= 90
+  assert -180 <= lon <= 180
+  return lat, lon
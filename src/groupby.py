@@ -0,0 +1,172 @@
+from aggregates import derive_time_columns
+import numpy as np
+import pandas as pd
+from services import TRANSACTION_SCHEMA
+from typing import Any, Optional
+
+# A small vectorized group-by engine that aggregates the dataset one chunk at a time.
+#
+# Every chunk is filtered and reduced to a partial aggregate: per group, the number of rows, the
+# frauds, and the sum and non-missing count of every column a metric needs. Partials are merged by
+# adding them up, so the result is the same however the dataset is chunked, and only one chunk and
+# one row per group are ever held in memory. Metrics are only derived from the merged partial.
+
+METRICS = ['count', 'sum', 'mean', 'fraud_rate']
+FILTER_OPS = ['eq', 'ne', 'in', 'lt', 'le', 'gt', 'ge']
+DERIVED_COLUMNS = ['trans_month', 'trans_day', 'trans_hour', 'trans_dayOfWeek']
+NUMERIC_COLUMNS = [col for col, dtype in TRANSACTION_SCHEMA.items() if dtype.startswith(('int', 'float'))]
+GROUPABLE_COLUMNS = [col for col, dtype in TRANSACTION_SCHEMA.items() if not dtype.startswith(('float', 'datetime'))] + DERIVED_COLUMNS
+_ORDERING_OPS = ['lt', 'le', 'gt', 'ge']
+_COUNT = '_count'
+_FRAUDS = '_frauds'
+
+def parse_metric(spec: str) -> tuple[str, Optional[str]] | str:
+  """
+  Parses a metric spec: 'count', 'fraud_rate', 'sum:<column>' or 'mean:<column>'.
+
+  Args:
+    spec (str): The metric spec.
+  Returns:
+    result (tuple[str, Optional[str]] | str): The metric and its column (None for count and fraud_rate),
+    or an error message if the spec is invalid.
+  """
+  metric, _, col = spec.partition(':')
+  if metric not in METRICS:
+    return f'Metric {spec} must be one of {METRICS}, e.g. count, fraud_rate, sum:amt or mean:amt.'
+  if metric in ['count', 'fraud_rate']:
+    return f'Metric {metric} does not take a column.' if col else (metric, None)
+  if col not in NUMERIC_COLUMNS:
+    return f'Metric {metric} requires a numeric column, one of {NUMERIC_COLUMNS}.'
+  return metric, col
+
+def parse_filter(spec: str) -> tuple[str, str, Any] | str:
+  """
+  Parses a filter spec '<column>:<op>:<value>'. The in op takes values separated by '|'.
+  Values of numeric columns are parsed as numbers and values of trans_date_trans_time as dates. Dates with
+  a timezone are converted to UTC, and the timezone dropped to compare them with the naive dates of the dataset.
+
+  Args:
+    spec (str): The filter spec.
+  Returns:
+    result (tuple[str, str, Any] | str): The column, op and parsed value, or an error message if the spec is invalid.
+  """
+  col, _, rest = spec.partition(':')
+  op, _, value = rest.partition(':')
+  if col not in list(TRANSACTION_SCHEMA) + DERIVED_COLUMNS:
+    return f'Filter {spec} must be on a dataset column.'
+  if op not in FILTER_OPS:
+    return f'Filter {spec} must use an op in {FILTER_OPS}.'
+  values = value.split('|') if op == 'in' else [value]
+  try:
+    if col in NUMERIC_COLUMNS:
+      values = [float(v) for v in values]
+    elif col == 'trans_date_trans_time':
+      values = [pd.Timestamp(v) for v in values]
+      # An empty value parses to NaT
+      if any(pd.isna(v) for v in values): raise ValueError(value)
+      values = [v.tz_convert(None) if v.tzinfo is not None else v for v in values]
+    elif op in _ORDERING_OPS:
+      return f'Filter {spec} can only compare a numeric or date column with {op}.'
+  except ValueError:
+    return f'Filter {spec} has a value of the wrong type for {col}.'
+  return col, op, values if op == 'in' else values[0]
+
+def required_columns(group_by: list[str], metrics: list[tuple[str, Optional[str]]], filters: list[tuple[str, str, Any]]) -> list[str]:
+  """
+  Lists the dataset columns needed to run a query, deriving columns from trans_date_trans_time.
+
+  Args:
+    group_by (list[str]): The columns to group by.
+    metrics (list[tuple[str, Optional[str]]]): The parsed metrics.
+    filters (list[tuple[str, str, Any]]): The parsed filters.
+  Returns:
+    result (list[str]): The columns to load.
+  """
+  cols = group_by + [col for _, col in metrics if col] + [col for col, _, _ in filters] + ['is_fraud']
+  cols = ['trans_date_trans_time' if col in DERIVED_COLUMNS else col for col in cols]
+  return list(dict.fromkeys(cols))
+
+def _filter_mask(chunk: pd.DataFrame, col: str, op: str, value: Any) -> np.ndarray:
+  values = chunk[col]
+  if col in DERIVED_COLUMNS:
+    values = values.astype(str)
+  if op == 'in': return values.isin(value).to_numpy()
+  if op == 'ne': return (values != value).to_numpy()
+  return getattr(values, op)(value).to_numpy()
+
+def partial_aggregate(chunk: pd.DataFrame, group_by: list[str], metrics: list[tuple[str, Optional[str]]],
+                      filters: list[tuple[str, str, Any]]) -> pd.DataFrame:
+  """
+  Filters a chunk and reduces it to its partial aggregate.
+
+  Args:
+    chunk (pd.DataFrame): A chunk of the dataset with the required columns.
+    group_by (list[str]): The columns to group by.
+    metrics (list[tuple[str, Optional[str]]]): The parsed metrics.
+    filters (list[tuple[str, str, Any]]): The parsed filters.
+  Returns:
+    result (pd.DataFrame): The partial aggregate, indexed on the groups.
+  """
+  if any(col in DERIVED_COLUMNS for col in group_by + [col for col, _, _ in filters]):
+    chunk = derive_time_columns(chunk)
+  mask = np.ones(len(chunk), dtype=bool)
+  for col, op, value in filters:
+    mask &= _filter_mask(chunk, col, op, value)
+  chunk = chunk[mask]
+  sums = {_COUNT: np.ones(len(chunk), dtype=np.int64), _FRAUDS: chunk['is_fraud'].to_numpy(dtype=np.int64)}
+  for col in dict.fromkeys(col for _, col in metrics if col):
+    values = chunk[col].to_numpy(dtype=float)
+    sums[f'sum:{col}'] = np.nan_to_num(values)
+    sums[f'n:{col}'] = (~np.isnan(values)).astype(np.int64)
+  sums = pd.DataFrame(sums, index=chunk.index)
+  if not group_by:
+    return sums.sum().to_frame().T.astype(sums.dtypes.to_dict())
+  # Categories differ from chunk to chunk, so group labels are plain values that partials can be aligned on
+  keys = [
+    chunk[col].astype(str) if col in DERIVED_COLUMNS or isinstance(chunk[col].dtype, pd.CategoricalDtype) else chunk[col]
+    for col in group_by
+  ]
+  return sums.groupby(keys, observed=True).sum()
+
+def merge_partials(a: Optional[pd.DataFrame], b: pd.DataFrame) -> pd.DataFrame:
+  """
+  Merges two partial aggregates, so the result is the same as if they were computed over both chunks at once.
+
+  Args:
+    a (Optional[pd.DataFrame]): A partial aggregate, or None for an empty one.
+    b (pd.DataFrame): A partial aggregate.
+  Returns:
+    result (pd.DataFrame): The merged partial aggregate.
+  """
+  if a is None: return b
+  return a.add(b, fill_value=0).astype(a.dtypes.to_dict())
+
+def finalize(partial: Optional[pd.DataFrame], group_by: list[str], metrics: list[tuple[str, Optional[str]]]) -> list[dict[str, Any]]:
+  """
+  Computes the metrics of every group out of a merged partial aggregate.
+
+  Args:
+    partial (Optional[pd.DataFrame]): The merged partial aggregate, or None if there was no data.
+    group_by (list[str]): The columns grouped by.
+    metrics (list[tuple[str, Optional[str]]]): The parsed metrics.
+  Returns:
+    result (list[dict[str, Any]]): One object per group, with the group column values and
+    the metrics, named e.g. count, fraud_rate, sum_amt and mean_amt, in group order.
+  """
+  if partial is None: return []
+  partial = partial[partial[_COUNT] > 0]
+  result = partial.index.to_frame(index=False) if group_by else pd.DataFrame(index=range(len(partial)))
+  for metric, col in metrics:
+    if metric == 'count':
+      values = partial[_COUNT]
+    elif metric == 'fraud_rate':
+      values = partial[_FRAUDS] / partial[_COUNT]
+    elif metric == 'sum':
+      values = partial[f'sum:{col}']
+    else:
+      values = partial[f'sum:{col}'] / partial[f'n:{col}'].replace(0, np.nan)
+    result[metric if col is None else f'{metric}_{col}'] = values.to_numpy()
+  if group_by:
+    result = result.sort_values(group_by, ignore_index=True)
+  # None instead of NaN, so that the result serializes to valid JSON
+  return result.astype(object).where(result.notna(), None).to_dict(orient='records')
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+from redis import Redis
+from typing import Optional
+from uuid import uuid4
+
+# Secondary indexes are maintained in Redis while the dataset is ingested, so filtered queries only
+# ever touch the rows that match them.
+#
+# For every field in EQUALITY_INDEX_FIELDS and every value of it, the set 'idx:<field>:<value>' holds
+# the ids of the transactions with that value. For every field in RANGE_INDEX_FIELDS, the sorted set
+# 'idx:<field>' holds the ids of all transactions, scored by their value of the field.
+# Queries intersect these on the Redis side, so only the matching ids are ever transferred.
+
+EQUALITY_INDEX_FIELDS = ['state', 'category', 'is_fraud', 'gender']
+RANGE_INDEX_FIELDS = ['amt', 'unix_time']
+
+def _equality_key(field: str, value: str) -> str:
+  return f'idx:{field}:{value}'
+
+def _range_key(field: str) -> str:
+  return f'idx:{field}'
+
+def index_chunk(redisdb: Redis, chunk: pd.DataFrame, start_idx: int):
+  """
+  Adds the rows of an ingested chunk to the secondary indexes with a single pipeline.
+  Fields missing from the chunk are not indexed.
+
+  Args:
+    redisdb (Redis): Redis, selected on the index db.
+    chunk (pd.DataFrame): The ingested transactions.
+    start_idx (int): The transaction id of the first row in the chunk.
+  """
+  ids = pd.Series(np.arange(start_idx, start_idx + len(chunk)))
+  with redisdb.pipeline() as pipe:
+    for field in EQUALITY_INDEX_FIELDS:
+      if field not in chunk.columns: continue
+      for value, group in ids.groupby(chunk[field].to_numpy()):
+        pipe.sadd(_equality_key(field, value), *group.tolist())
+    for field in RANGE_INDEX_FIELDS:
+      if field not in chunk.columns: continue
+      pipe.zadd(_range_key(field), dict(zip(ids.tolist(), chunk[field].tolist())))
+    pipe.execute()
+
+def query_row_ids(redisdb: Redis, equals: dict[str, list[str]], ranges: dict[str, tuple[Optional[float], Optional[float]]],
+                  offset: int, limit: int) -> tuple[int, list[int]]:
+  """
+  Finds the ids of the transactions matching every filter, in a single transaction on the Redis side.
+  A field filtered on several values matches any of them. Range bounds are inclusive and None is unbounded.
+  At least one filter is required.
+
+  Args:
+    redisdb (Redis): Redis, selected on the index db.
+    equals (dict[str, list[str]]): The accepted values of fields in EQUALITY_INDEX_FIELDS.
+    ranges (dict[str, tuple[Optional[float], Optional[float]]]): The (min, max) bounds of fields in RANGE_INDEX_FIELDS.
+    offset (int): The number of matching ids to skip.
+    limit (int): The maximum number of ids to return.
+  Returns:
+    result (tuple[int, list[int]]): The number of matching transactions and a page of their ids in ascending order.
+  """
+  result_key = f'tmp:{uuid4()}'
+  keys = []
+  temp_keys = [result_key]
+  with redisdb.pipeline(transaction=True) as pipe:
+    for field, values in equals.items():
+      if len(values) == 1:
+        keys.append(_equality_key(field, values[0]))
+        continue
+      key = f'{result_key}:{field}'
+      pipe.sunionstore(key, [_equality_key(field, value) for value in values])
+      keys.append(key)
+      temp_keys.append(key)
+    for field, (low, high) in ranges.items():
+      key = f'{result_key}:{field}'
+      pipe.zrangestore(key, _range_key(field), '-inf' if low is None else low, '+inf' if high is None else high, byscore=True)
+      keys.append(key)
+      temp_keys.append(key)
+    # Sets and sorted sets can be intersected together; Redis iterates the smallest one
+    pipe.zinterstore(result_key, keys)
+    pipe.sort(result_key, start=offset, num=limit)
+    pipe.delete(*temp_keys)
+    results = pipe.execute()
+  count, ids = results[-3], results[-2]
+  return count, [int(i) for i in ids]
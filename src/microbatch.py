@@ -0,0 +1,104 @@
+from concurrent.futures import Future
+import logging
+from queue import Empty, SimpleQueue
+import threading
+from time import monotonic
+from typing import Any, Callable, Optional
+
+# Coalesces concurrent requests into micro-batches, so a model runs once per batch instead of once per request.
+#
+# Requests are queued with the items to run and a Future for their results. A single background thread
+# takes the first waiting request, then keeps taking requests until the batch holds max_batch_size items
+# or max_wait seconds have passed since it took the first one, runs all of their items at once and hands
+# every request its slice of the results. A request is never split, so one larger than max_batch_size
+# runs as a batch of its own.
+
+_STOP = None
+
+class MicroBatcher:
+  """
+  Runs the items of concurrent requests through run_batch in micro-batches, on a single background thread.
+  A batch runs as soon as it holds max_batch_size items, or max_wait seconds after its first request was
+  taken, whichever comes first. submit and run can be called from any number of threads at once: each call
+  gets exactly the results of its own items, in order. run_batch is only ever called from the batching
+  thread, one batch at a time, so it doesn't need to be thread-safe.
+  """
+  def __init__(self, run_batch: Callable[[list[Any]], list[Any]], max_batch_size: int, max_wait: float):
+    """
+    Starts the batching thread.
+
+    Args:
+      run_batch (Callable[[list[Any]], list[Any]]): Runs a batch of items, returning one result per item.
+      max_batch_size (int): The most items to batch together.
+      max_wait (float): The most seconds to wait for more requests to batch with the first one.
+    """
+    self.run_batch = run_batch
+    self.max_batch_size = max_batch_size
+    self.max_wait = max_wait
+    self._requests: SimpleQueue[Optional[tuple[list[Any], Future]]] = SimpleQueue()
+    self._thread = threading.Thread(target=self._run, name='microbatcher', daemon=True)
+    self._thread.start()
+
+  def submit(self, items: list[Any]) -> Future:
+    """
+    Queues items to run in the next batch.
+
+    Args:
+      items (list[Any]): The items.
+    Returns:
+      result (Future): The future of the list of results of the items, in order.
+    """
+    future = Future()
+    self._requests.put((items, future))
+    return future
+
+  def run(self, items: list[Any], timeout: Optional[float] = None) -> list[Any]:
+    """
+    Runs items in the next batch and waits for their results.
+    Throws the Exception of the batch if it fails, or a TimeoutError if it doesn't finish in time.
+
+    Args:
+      items (list[Any]): The items.
+      timeout (Optional[float]): The most seconds to wait, or None to wait for as long as it takes.
+    Returns:
+      result (list[Any]): The results of the items, in order.
+    """
+    return self.submit(items).result(timeout)
+
+  def close(self):
+    """
+    Stops the batching thread once the requests queued before it have run.
+    """
+    self._requests.put(_STOP)
+    self._thread.join()
+
+  def _next_batch(self) -> tuple[list[tuple[list[Any], Future]], bool]:
+    request = self._requests.get()
+    if request is _STOP: return [], True
+    batch, size = [request], len(request[0])
+    deadline = monotonic() + self.max_wait
+    while size < self.max_batch_size:
+      try:
+        request = self._requests.get(timeout=max(deadline - monotonic(), 0)) if self.max_wait else self._requests.get_nowait()
+      except Empty:
+        break
+      if request is _STOP: return batch, True
+      batch.append(request)
+      size += len(request[0])
+    return batch, False
+
+  def _run(self):
+    stopped = False
+    while not stopped:
+      batch, stopped = self._next_batch()
+      if not batch: continue
+      try:
+        results = self.run_batch([item for items, _ in batch for item in items])
+      except Exception as e:
+        logging.error(f'Micro-batch of {len(batch)} requests failed: {e}')
+        for _, future in batch: future.set_exception(e)
+        continue
+      start = 0
+      for items, future in batch:
+        future.set_result(results[start:start + len(items)])
+        start += len(items)
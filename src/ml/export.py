@@ -0,0 +1,108 @@
+import argparse
+from inference_modes import INFERENCE_MODES
+from input_vectorization import NUMERIC_SIZE
+import logging
+from ml_model import EmbeddingFraudDetectionModel
+import torch
+import torch.nn as nn
+import warnings
+
+# Exports the fraud classifier for CPU inference.
+#
+# The standardization of the inputs and the eval-mode batchnorm layers are affine, so they are folded
+# into the weights of the layers before them, leaving three Linear layers and an embedding lookup.
+# The folded model is optionally quantized to int8 and compiled to TorchScript. The mode is chosen per
+# worker with the INFERENCE_MODE environment variable (see services.get_inference_mode):
+#   eager: The EmbeddingFraudDetectionModel as is.
+#   torchscript: The folded model, compiled to TorchScript. Predictions match eager to float precision.
+#   int8: The folded model with fc2 and fc3 dynamically quantized to int8, compiled to TorchScript.
+
+class FoldedFraudDetectionModel(nn.Module):
+  """
+  An EmbeddingFraudDetectionModel for inference only, with its standardization and batchnorm layers folded
+  into numeric_fc1, the embeddings and fc2. The embeddings of all three vocabularies are rows of a single
+  EmbeddingBag that sums them. Numeric values are still centered with a subtraction before numeric_fc1:
+  a column that was constant in the training data (the year) has a std of 0, and folding its mean into the
+  bias would lose all float32 precision.
+  """
+  def __init__(self, num_embeddings: list[int]):
+    super(FoldedFraudDetectionModel, self).__init__()
+    self.register_buffer('mean', torch.zeros(NUMERIC_SIZE))
+    self.register_buffer('offsets', torch.tensor([sum(num_embeddings[:i]) for i in range(len(num_embeddings))]))
+    self.numeric_fc1 = nn.Linear(NUMERIC_SIZE, 64)
+    self.embeddings = nn.EmbeddingBag(sum(num_embeddings), 64, mode='sum')
+    self.fc2 = nn.Linear(64, 32)
+    self.fc3 = nn.Linear(32, 1)
+
+  def forward(self, numerics: torch.Tensor, indices: torch.Tensor) -> torch.Tensor:
+    x = torch.relu(self.numeric_fc1(numerics - self.mean) + self.embeddings(indices + self.offsets))
+    x = torch.relu(self.fc2(x))
+    return torch.sigmoid(self.fc3(x))
+
+def _batchnorm_scale_and_shift(bn: nn.BatchNorm1d) -> tuple[torch.Tensor, torch.Tensor]:
+  scale = bn.weight / torch.sqrt(bn.running_var + bn.eps)
+  return scale, bn.bias - bn.running_mean * scale
+
+def fold_model(model: EmbeddingFraudDetectionModel) -> FoldedFraudDetectionModel:
+  """
+  Folds the standardization and the eval-mode batchnorm layers of a model into its other layers.
+
+  Args:
+    model (EmbeddingFraudDetectionModel): The model.
+  Returns:
+    result (FoldedFraudDetectionModel): The folded model, in eval mode.
+  """
+  folded = FoldedFraudDetectionModel([embedding.num_embeddings for embedding in model.embeddings])
+  with torch.no_grad():
+    scale, shift = _batchnorm_scale_and_shift(model.bn1)
+    folded.mean.copy_(model.mean)
+    folded.numeric_fc1.weight.copy_(model.numeric_fc1.weight / model.std * scale[:, None])
+    folded.numeric_fc1.bias.copy_(model.numeric_fc1.bias * scale + shift)
+    folded.embeddings.weight.copy_(torch.cat([embedding.weight for embedding in model.embeddings]) * scale)
+    scale, shift = _batchnorm_scale_and_shift(model.bn2)
+    folded.fc2.weight.copy_(model.fc2.weight * scale[:, None])
+    folded.fc2.bias.copy_(model.fc2.bias * scale + shift)
+    folded.fc3.load_state_dict(model.fc3.state_dict())
+  return folded.eval()
+
+def export_model(model: EmbeddingFraudDetectionModel, mode: str) -> nn.Module:
+  """
+  Exports a model for inference in one of the INFERENCE_MODES.
+  Throws a ValueError if the mode isn't one of them.
+
+  Args:
+    model (EmbeddingFraudDetectionModel): The model, in eval mode.
+    mode (str): The inference mode.
+  Returns:
+    result (nn.Module): The exported model, which takes the same inputs as the model.
+  """
+  if mode not in INFERENCE_MODES:
+    raise ValueError(f'Inference mode {mode} must be one of {INFERENCE_MODES}.')
+  if mode == 'eager': return model
+  folded = fold_model(model)
+  # Recent torch releases deprecate quantize_dynamic and torch.jit, which still work
+  with warnings.catch_warnings():
+    warnings.simplefilter('ignore', (DeprecationWarning, FutureWarning, UserWarning))
+    if mode == 'int8':
+      # numeric_fc1 stays float: next to the huge weight of the year, per-tensor int8 would round
+      # its other weights to 0, and it only has 11 inputs anyway
+      folded = torch.ao.quantization.quantize_dynamic(folded, {'fc2', 'fc3'}, dtype=torch.qint8)
+    # Traced rather than scripted, since scripting reads the source code, which the PyInstaller worker doesn't ship
+    example_inputs = (torch.zeros(2, NUMERIC_SIZE), torch.zeros(2, len(folded.offsets), dtype=torch.long))
+    return torch.jit.freeze(torch.jit.trace(folded, example_inputs))
+
+def main():
+  parser = argparse.ArgumentParser(description='Exports binaryclassifierstate.pt in the working directory to a TorchScript file.')
+  parser.add_argument('--mode', choices=INFERENCE_MODES[1:], default='torchscript')
+  parser.add_argument('--out', default=None, help='Defaults to binaryclassifier.<mode>.pt')
+  args = parser.parse_args()
+
+  from inference import load_artifacts # Here since inference imports this module
+  model = load_artifacts('.', 'eager').model
+  out = args.out or f'binaryclassifier.{args.mode}.pt'
+  torch.jit.save(export_model(model, args.mode), out)
+  logging.info(f'Exported the model to {out}.')
+
+if __name__ == '__main__':
+  logging.basicConfig(level=logging.INFO)
+  main()
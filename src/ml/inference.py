@@ -0,0 +1,152 @@
+from datetime import datetime
+from export import export_model
+from input_vectorization import OneHotEncoder
+import logging
+from ml_model import CreditCardFraudDetectionModel, convert_to_embedding_model
+import os
+import threading
+import torch
+import torch.nn as nn
+from typing import Any, NamedTuple, Optional
+
+# The model and everything needed to prepare its inputs are loaded once per process into an
+# InferenceEngine, so a prediction only costs encoding and a forward pass. The saved model, which
+# takes standardized onehot vectors, is converted to an EmbeddingFraudDetectionModel at load time,
+# so rows are encoded to their numeric values and vocabulary indices instead of 1196 columns,
+# and then exported in the inference mode of the engine (see export.py).
+#
+# The engine keeps the (mtime, size) of every artifact file it loaded. Before each prediction it
+# stats them again, and if any changed (e.g. a retrained model was copied over) it reloads all of
+# them together. If the new artifacts can't be loaded, it keeps serving the ones it has.
+
+MODEL_FILE = 'binaryclassifierstate.pt'
+MEAN_AND_STD_FILE = 'meanandstd.txt'
+MERCHANTS_FILE = 'merchants.txt'
+CATEGORIES_FILE = 'categories.txt'
+JOBS_FILE = 'jobs.txt'
+ARTIFACT_FILES = [MODEL_FILE, MEAN_AND_STD_FILE, MERCHANTS_FILE, CATEGORIES_FILE, JOBS_FILE]
+
+def extract_transaction_row(t: dict[str, Any]) -> list[str|float|int]:
+  """
+  Converts a transaction dictionary, as submitted to the API, to a row of values.
+  This is the first step in preparing a tensor for model inference.
+  The date is broken into more meaningful numeric components.
+
+  Args:
+    t (dict[str, Any]): The transaction dictionary.
+  Returns:
+    result (list[str|float|int]): The transaction dictionary as a list of values.
+  """
+  date = datetime.strptime(t['trans_date_trans_time'], '%d/%m/%Y %H:%M')
+  return [date.day, date.month, date.year, date.weekday(), date.hour, date.minute, t['merchant'], t['category'], t['amt'], t['lat'], t['long'], t['job'], t['merch_lat'], t['merch_long']]
+
+class Artifacts(NamedTuple):
+  model: nn.Module
+  encoder: OneHotEncoder
+
+def _read_lines(path: str) -> list[str]:
+  with open(path, 'r') as file:
+    return [line.strip() for line in file.readlines()]
+
+def read_mean_and_std(path: str) -> tuple[torch.Tensor, torch.Tensor]:
+  """
+  Reads the mean and standard deviation tensors (obtained from training data) from a file with
+  the mean tensor values on its first line and the std tensor values on its second, e.g.
+  1.0, 2.0, 3.0
+  0.1, 0.2, 0.3
+
+  Args:
+    path (str): The path of the file.
+  Returns:
+    result (tuple[torch.Tensor, torch.Tensor]): The mean and std tensors.
+  """
+  lines = [line.split(', ') for line in _read_lines(path)[:2]]
+  mean = torch.tensor([float(m) for m in lines[0]], dtype=torch.float)
+  std = torch.tensor([float(s) for s in lines[1]], dtype=torch.float)
+  return mean, std
+
+def load_artifacts(artifact_dir: str, mode: str = 'eager') -> Artifacts:
+  """
+  Loads the model, converted to an EmbeddingFraudDetectionModel in eval mode and exported in an
+  inference mode, and the encoder of its inputs.
+
+  Args:
+    artifact_dir (str): The directory with the ARTIFACT_FILES.
+    mode (str): The inference mode, one of inference_modes.INFERENCE_MODES.
+  Returns:
+    result (Artifacts): The loaded artifacts.
+  """
+  path = lambda name: os.path.join(artifact_dir, name)
+  model = CreditCardFraudDetectionModel()
+  model.load_state_dict(torch.load(path(MODEL_FILE), map_location='cpu'))
+  model.eval()
+  mean, std = read_mean_and_std(path(MEAN_AND_STD_FILE))
+  encoder = OneHotEncoder(_read_lines(path(MERCHANTS_FILE)), _read_lines(path(CATEGORIES_FILE)), _read_lines(path(JOBS_FILE)))
+  return Artifacts(export_model(convert_to_embedding_model(model, mean, std, encoder), mode), encoder)
+
+class InferenceEngine:
+  def __init__(self, artifact_dir: str = '.', mode: str = 'eager'):
+    """
+    Loads the artifacts in artifact_dir. Throws an Exception if they can't be loaded.
+
+    Args:
+      artifact_dir (str): The directory with the ARTIFACT_FILES.
+      mode (str): The inference mode, one of inference_modes.INFERENCE_MODES.
+    """
+    self.artifact_dir = artifact_dir
+    self.mode = mode
+    self._lock = threading.Lock()
+    self._signature = self._stat_artifacts()
+    self._artifacts = load_artifacts(artifact_dir, mode)
+
+  def _stat_artifacts(self) -> tuple[Optional[tuple[int, int]], ...]:
+    signature = []
+    for name in ARTIFACT_FILES:
+      try:
+        stat = os.stat(os.path.join(self.artifact_dir, name))
+        signature.append((stat.st_mtime_ns, stat.st_size))
+      except OSError:
+        signature.append(None)
+    return tuple(signature)
+
+  def _reload_if_changed(self) -> Artifacts:
+    signature = self._stat_artifacts()
+    if signature == self._signature: return self._artifacts
+    with self._lock:
+      if signature != self._signature:
+        try:
+          self._artifacts = load_artifacts(self.artifact_dir, self.mode)
+          logging.info(f'Reloaded inference artifacts from {self.artifact_dir}.')
+        except Exception as e:
+          logging.error(f'Failed to reload inference artifacts, keeping the loaded ones: {e}')
+        # Either way, only retry once the files change again
+        self._signature = signature
+      return self._artifacts
+
+  def encode(self, rows: list[list[Any]], artifacts: Optional[Artifacts] = None) -> tuple[torch.Tensor, torch.Tensor]:
+    """
+    Encodes transaction rows into model inputs.
+
+    Args:
+      rows (list[list[Any]]): The transaction rows (see extract_transaction_row).
+      artifacts (Optional[Artifacts]): The artifacts to encode with, by default the loaded ones.
+    Returns:
+      result (tuple[torch.Tensor, torch.Tensor]): The numeric values and the merchant, category and job indices, one row per transaction.
+    """
+    artifacts = artifacts or self._artifacts
+    numerics, indices = artifacts.encoder.encode_indices(rows)
+    return torch.from_numpy(numerics), torch.from_numpy(indices)
+
+  def predict(self, rows: list[list[Any]]) -> list[float]:
+    """
+    Classifies transaction rows, reloading the artifacts first if they changed on disk.
+
+    Args:
+      rows (list[list[Any]]): The transaction rows (see extract_transaction_row).
+    Returns:
+      result (list[float]): The classification of each transaction, 0.0 for legitimate and 1.0 for fraudulent.
+    """
+    artifacts = self._reload_if_changed()
+    numerics, indices = self.encode(rows, artifacts)
+    with torch.inference_mode():
+      return artifacts.model(numerics, indices).round().squeeze(1).tolist()
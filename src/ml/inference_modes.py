@@ -0,0 +1,4 @@
+# The ways the fraud classifier can be run for inference, see export.py.
+# Kept free of torch so the services can validate the INFERENCE_MODE of a worker without importing it.
+
+INFERENCE_MODES = ['eager', 'torchscript', 'int8']
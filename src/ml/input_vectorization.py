@@ -1,9 +1,8 @@
 import csv
 from datetime import datetime
-from functools import partial
 import logging
-from multiprocessing import Pool, cpu_count
-import random
+import numpy as np
+from operator import itemgetter
 from typing import Any, Optional
 
 # Columns are all strings in the following order
@@ -52,6 +51,100 @@ def flatten(lst: list[Any]) -> list[Any]:
       flattened.append(item)
   return flattened
 
+# Positions of the categorical values in a row, which are onehot encoded in place
+MERCHANT_POSITION = 6
+CATEGORY_POSITION = 7
+JOB_POSITION = 11
+ROW_LENGTH = 14 # Without the is_fraud label
+NUMERIC_SIZE = ROW_LENGTH - 3
+
+class OneHotEncoder():
+  """
+  Encodes a whole batch of rows at once into the same vectors as flatten(onehot_encode(row, ...)).
+  Categorical values are mapped to their vocabulary index with a dict lookup and scattered into a
+  preallocated array, instead of comparing each value against the whole vocabulary. Values that
+  aren't in the vocabulary are encoded as all zeros, like onehot_encode does.
+  """
+  def __init__(self, merchants: list[str], categories: list[str], jobs: list[str]):
+    self.merchants = merchants
+    self.categories = categories
+    self.jobs = jobs
+    self._vocabularies = {
+      MERCHANT_POSITION: (merchants, {m: i for i, m in enumerate(merchants)}),
+      CATEGORY_POSITION: (categories, {c: i for i, c in enumerate(categories)}),
+      JOB_POSITION: (jobs, {j: i for i, j in enumerate(jobs)}),
+    }
+
+  def layout(self, row_length: int = ROW_LENGTH) -> tuple[list[int], list[int], int]:
+    """
+    Lays the values of a row out in its encoded vector.
+
+    Args:
+      row_length (int): The length of the rows.
+    Returns:
+      result (tuple[list[int], list[int], int]): The columns of the numeric values, the first column of the
+      merchants, categories and jobs, and the length of the encoded vectors.
+    """
+    numeric_columns, offsets = [], []
+    column = 0
+    for position in range(row_length):
+      if position in self._vocabularies:
+        offsets.append(column)
+        column += len(self._vocabularies[position][0])
+      else:
+        numeric_columns.append(column)
+        column += 1
+    return numeric_columns, offsets, column
+
+  def encode_indices(self, rows: list[list[Any]], dtype: np.dtype = np.float32) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Splits rows into their numeric values and the vocabulary indices of their merchant, category and job.
+    Values that aren't in a vocabulary get the index one past its end.
+
+    Args:
+      rows (list[list[Any]]): The rows, all of the same length (see extract_row).
+      dtype (np.dtype): The dtype of the numeric values.
+    Returns:
+      result (tuple[np.ndarray, np.ndarray]): The numeric values and the indices, one row per row.
+    """
+    row_length = len(rows[0]) if rows else ROW_LENGTH
+    get_numerics = itemgetter(*[position for position in range(row_length) if position not in self._vocabularies])
+    numerics = np.array([get_numerics(row) for row in rows], dtype=dtype).reshape(len(rows), row_length - len(self._vocabularies))
+    indices = np.empty((len(rows), len(self._vocabularies)), dtype=np.int64)
+    for i, (position, (values, vocabulary)) in enumerate(self._vocabularies.items()):
+      indices[:, i] = np.fromiter((vocabulary.get(row[position], len(values)) for row in rows), dtype=np.int64, count=len(rows))
+    return numerics, indices
+
+  def encode(self, rows: list[list[Any]], dtype: np.dtype = np.float32) -> np.ndarray:
+    """
+    Onehot encodes and flattens rows, which may carry trailing numeric values (e.g. the is_fraud label).
+
+    Args:
+      rows (list[list[Any]]): The rows, all of the same length (see extract_row).
+      dtype (np.dtype): The dtype of the result.
+    Returns:
+      result (np.ndarray): The encoded rows, one per row of the result.
+    """
+    return self.encode_onehot(*self.encode_indices(rows, dtype))
+
+  def encode_onehot(self, numerics: np.ndarray, indices: np.ndarray) -> np.ndarray:
+    """
+    Onehot encodes and flattens rows already split by encode_indices.
+
+    Args:
+      numerics (np.ndarray): The numeric values of the rows.
+      indices (np.ndarray): The vocabulary indices of the rows.
+    Returns:
+      result (np.ndarray): The encoded rows, one per row of the result, of the dtype of the numeric values.
+    """
+    numeric_columns, offsets, width = self.layout(numerics.shape[1] + len(self._vocabularies))
+    encoded = np.zeros((len(numerics), width), dtype=numerics.dtype)
+    encoded[:, numeric_columns] = numerics
+    for i, (values, _) in enumerate(self._vocabularies.values()):
+      known = np.flatnonzero(indices[:, i] < len(values))
+      encoded[known, offsets[i] + indices[known, i]] = 1
+    return encoded
+
 class TestValidateTrainSplit():
   def __init__(self, filename: str, train_pct: float = 0.75, validation_pct: float = 0.15, test_pct: float = 0.1):
     # Valid inputs
@@ -69,10 +162,10 @@ class TestValidateTrainSplit():
     logging.info('Reading data...')
     with open(filename, 'r') as data:
       reader = csv.DictReader(data)
-      self.rows = [extract_row(row) for row in reader] # Randomize order for statistically good test/train/validation split later
+      rows = [extract_row(row) for row in reader] # Randomize order for statistically good test/train/validation split later
     logging.info('Reading categorical data')
     # One-hot encode our word-based inputs
-    for row in self.rows:
+    for row in rows:
       merchants.add(row[6])
       categories.add(row[7])
       jobs.add(row[11])
@@ -85,38 +178,42 @@ class TestValidateTrainSplit():
       for c in categories: file.write(f'{c}\n')
     with open('jobs.txt', 'w') as file:
       for j in jobs: file.write(f'{j}\n')
-    encoder = partial(onehot_encode, merchants=merchants, categories=categories, jobs=jobs)
     logging.info('Transforming data')
-    with Pool(processes=cpu_count()) as pool:
-      self.rows = pool.map(encoder, self.rows)
-      self.rows = pool.map(flatten, self.rows)
+    # Rows are kept as numeric values (with the label last) and vocabulary indices, and only onehot encoded on request
+    self.encoder = OneHotEncoder(merchants, categories, jobs)
+    numerics, indices = self.encoder.encode_indices(rows)
     logging.info('Shuffling data')
-    random.shuffle(self.rows)
+    order = np.random.default_rng().permutation(len(numerics))
+    self.numerics = numerics[order]
+    self.indices = indices[order]
     logging.info('Done preparing data')
 
-  def get_train_inputs(self) -> list[Any]:
-    train_end = round(self.train_pct * len(self.rows))
-    return [row[:-1] for row in self.rows[0:train_end]]
+  def get_train_index_inputs(self) -> tuple[np.ndarray, np.ndarray]:
+    train_end = round(self.train_pct * len(self.numerics))
+    return self.numerics[0:train_end, :-1], self.indices[0:train_end]
+
+  def get_train_inputs(self) -> np.ndarray:
+    return self.encoder.encode_onehot(*self.get_train_index_inputs())
 
-  def get_train_labels(self) -> list[int]:
-    train_end = round(self.train_pct * len(self.rows))
-    return [row[-1] for row in self.rows[0:train_end]]
-  def get_validation_inputs(self) -> Optional[list[Any]]:
+  def get_train_labels(self) -> np.ndarray:
+    train_end = round(self.train_pct * len(self.numerics))
+    return self.numerics[0:train_end, -1]
+  def get_validation_inputs(self) -> Optional[np.ndarray]:
     if self.validation_pct == 0: return None
-    validation_start = round(self.train_pct * len(self.rows))
-    validation_end = round((self.train_pct + self.validation_pct) * len(self.rows))
-    return [row[:-1] for row in self.rows[validation_start:validation_end]]
+    validation_start = round(self.train_pct * len(self.numerics))
+    validation_end = round((self.train_pct + self.validation_pct) * len(self.numerics))
+    return self.encoder.encode_onehot(self.numerics[validation_start:validation_end, :-1], self.indices[validation_start:validation_end])
 
-  def get_validation_labels(self) -> Optional[list[int]]:
+  def get_validation_labels(self) -> Optional[np.ndarray]:
     if self.validation_pct == 0: return None
-    validation_start = round(self.train_pct * len(self.rows))
-    validation_end = round((self.train_pct + self.validation_pct) * len(self.rows))
-    return [row[-1] for row in self.rows[validation_start:validation_end]]
+    validation_start = round(self.train_pct * len(self.numerics))
+    validation_end = round((self.train_pct + self.validation_pct) * len(self.numerics))
+    return self.numerics[validation_start:validation_end, -1]
 
-  def get_test_inputs(self) -> list[Any]:
-    test_start = round((self.train_pct + self.validation_pct) * len(self.rows))
-    return [row[:-1] for row in self.rows[test_start:]]
+  def get_test_inputs(self) -> np.ndarray:
+    test_start = round((self.train_pct + self.validation_pct) * len(self.numerics))
+    return self.encoder.encode_onehot(self.numerics[test_start:, :-1], self.indices[test_start:])
 
-  def get_test_labels(self) -> list[int]:
-    test_start = round((self.train_pct + self.validation_pct) * len(self.rows))
-    return [row[-1] for row in self.rows[test_start:]]
+  def get_test_labels(self) -> np.ndarray:
+    test_start = round((self.train_pct + self.validation_pct) * len(self.numerics))
+    return self.numerics[test_start:, -1]
@@ -4,7 +4,7 @@ import torch.nn as nn
 from torch.optim import Adam
 from torch.utils.data import DataLoader, TensorDataset
 
-from input_vectorization import TestValidateTrainSplit, INPUT_SIZE
+from input_vectorization import TestValidateTrainSplit, INPUT_SIZE, NUMERIC_SIZE, OneHotEncoder
 
 class CreditCardFraudDetectionModel(nn.Module):
   def __init__(self):
@@ -23,6 +23,124 @@ class CreditCardFraudDetectionModel(nn.Module):
     x = self.sigmoid(self.fc3(x))
     return x
 
+class EmbeddingFraudDetectionModel(nn.Module):
+  """
+  The equivalent of CreditCardFraudDetectionModel over the numeric values and the merchant, category and job
+  indices of rows (see OneHotEncoder.encode_indices) instead of onehot vectors, so its cost scales with
+  the fields of a row rather than the size of the vocabularies.
+
+  fc1 over a onehot vector is a Linear layer over the numeric values plus, for every categorical value,
+  the column of fc1 that its onehot value selects, which is looked up in an embedding. The last embedding
+  of every vocabulary is all zeros, for values that aren't in it. Numeric values are standardized with
+  the mean and std buffers.
+  """
+  def __init__(self, num_merchants: int, num_categories: int, num_jobs: int):
+    super(EmbeddingFraudDetectionModel, self).__init__()
+    self.register_buffer('mean', torch.zeros(NUMERIC_SIZE))
+    self.register_buffer('std', torch.ones(NUMERIC_SIZE))
+    self.numeric_fc1 = nn.Linear(NUMERIC_SIZE, 64)
+    self.embeddings = nn.ModuleList([nn.Embedding(n + 1, 64, padding_idx=n) for n in [num_merchants, num_categories, num_jobs]])
+    self.fc2 = nn.Linear(64, 32)
+    self.fc3 = nn.Linear(32, 1)
+    self.bn1 = nn.BatchNorm1d(64)
+    self.bn2 = nn.BatchNorm1d(32)
+    self.relu = nn.ReLU()
+    self.sigmoid = nn.Sigmoid()
+
+  def forward(self, numerics, indices):
+    x = self.numeric_fc1((numerics - self.mean) / self.std)
+    for i, embedding in enumerate(self.embeddings):
+      x = x + embedding(indices[:, i])
+    x = self.relu(self.bn1(x))
+    x = self.relu(self.bn2(self.fc2(x)))
+    x = self.sigmoid(self.fc3(x))
+    return x
+
+def convert_to_embedding_model(model: CreditCardFraudDetectionModel, mean: torch.Tensor, std: torch.Tensor,
+                               encoder: OneHotEncoder) -> EmbeddingFraudDetectionModel:
+  """
+  Converts a model over standardized onehot vectors to an EmbeddingFraudDetectionModel that makes the same predictions.
+  The standardization of the onehot columns is folded into the embeddings and the bias of numeric_fc1.
+
+  Args:
+    model (CreditCardFraudDetectionModel): The model.
+    mean (torch.Tensor): The mean the inputs of the model are standardized with.
+    std (torch.Tensor): The std the inputs of the model are standardized with.
+    encoder (OneHotEncoder): The encoder of the inputs of the model.
+  Returns:
+    result (EmbeddingFraudDetectionModel): The converted model, in the same train/eval mode.
+  """
+  numeric_columns, offsets, _ = encoder.layout()
+  onehot_columns = [column for column in range(INPUT_SIZE) if column not in numeric_columns]
+  std = std + 1e-8
+  with torch.no_grad():
+    weight = model.fc1.weight / std
+    converted = EmbeddingFraudDetectionModel(len(encoder.merchants), len(encoder.categories), len(encoder.jobs))
+    converted.mean.copy_(mean[numeric_columns])
+    converted.std.copy_(std[numeric_columns])
+    converted.numeric_fc1.weight.copy_(model.fc1.weight[:, numeric_columns])
+    # A onehot column that is 0 still contributes -mean / std once standardized
+    converted.numeric_fc1.bias.copy_(model.fc1.bias - weight[:, onehot_columns] @ mean[onehot_columns])
+    for embedding, offset in zip(converted.embeddings, offsets):
+      size = embedding.num_embeddings - 1
+      embedding.weight[:size] = weight[:, offset:offset + size].T
+      embedding.weight[size] = 0
+  for name in ['fc2', 'fc3', 'bn1', 'bn2']:
+    getattr(converted, name).load_state_dict(getattr(model, name).state_dict())
+  return converted.train(model.training)
+
+def convert_to_onehot_model(model: EmbeddingFraudDetectionModel, mean: torch.Tensor, std: torch.Tensor,
+                            encoder: OneHotEncoder) -> CreditCardFraudDetectionModel:
+  """
+  Converts an EmbeddingFraudDetectionModel to a model over onehot vectors standardized with mean and std that
+  makes the same predictions, so it can be saved in the format of binaryclassifierstate.pt.
+  This is the inverse of convert_to_embedding_model.
+
+  Args:
+    model (EmbeddingFraudDetectionModel): The model.
+    mean (torch.Tensor): The mean to standardize the inputs of the converted model with. Its numeric values must be the mean buffer of the model.
+    std (torch.Tensor): The std to standardize the inputs of the converted model with. Its numeric values plus 1e-8 must be the std buffer of the model.
+    encoder (OneHotEncoder): The encoder of the inputs of the converted model.
+  Returns:
+    result (CreditCardFraudDetectionModel): The converted model, in the same train/eval mode.
+  """
+  numeric_columns, offsets, _ = encoder.layout()
+  onehot_columns = [column for column in range(INPUT_SIZE) if column not in numeric_columns]
+  std = std + 1e-8
+  converted = CreditCardFraudDetectionModel()
+  with torch.no_grad():
+    converted.fc1.weight[:, numeric_columns] = model.numeric_fc1.weight
+    for embedding, offset in zip(model.embeddings, offsets):
+      size = embedding.num_embeddings - 1
+      converted.fc1.weight[:, offset:offset + size] = embedding.weight[:size].T * std[offset:offset + size]
+    converted.fc1.bias.copy_(model.numeric_fc1.bias + (converted.fc1.weight[:, onehot_columns] / std[onehot_columns]) @ mean[onehot_columns])
+  for name in ['fc2', 'fc3', 'bn1', 'bn2']:
+    getattr(converted, name).load_state_dict(getattr(model, name).state_dict())
+  return converted.train(model.training)
+
+def onehot_mean_and_std(numerics: torch.Tensor, indices: torch.Tensor, encoder: OneHotEncoder) -> tuple[torch.Tensor, torch.Tensor]:
+  """
+  Computes the mean and std of the onehot vectors of rows from their numeric values and vocabulary indices,
+  without encoding them.
+
+  Args:
+    numerics (torch.Tensor): The numeric values of the rows.
+    indices (torch.Tensor): The vocabulary indices of the rows.
+    encoder (OneHotEncoder): The encoder of the rows.
+  Returns:
+    result (tuple[torch.Tensor, torch.Tensor]): The mean and std of every column of the onehot vectors.
+  """
+  numeric_columns, offsets, width = encoder.layout()
+  n = len(numerics)
+  mean, std = torch.zeros(width), torch.zeros(width)
+  mean[numeric_columns], std[numeric_columns] = torch.mean(numerics, dim=0), torch.std(numerics, dim=0)
+  for i, (offset, values) in enumerate(zip(offsets, [encoder.merchants, encoder.categories, encoder.jobs])):
+    frequencies = torch.bincount(indices[:, i], minlength=len(values) + 1)[:len(values)].float() / n
+    mean[offset:offset + len(values)] = frequencies
+    # The unbiased std of a column of 0s and 1s, like torch.std
+    std[offset:offset + len(values)] = torch.sqrt(frequencies * (1 - frequencies) * n / (n - 1))
+  return mean, std
+
 def standardize_tensor(tensor: torch.Tensor) -> torch.Tensor:
   mean = torch.mean(tensor, dim=0)
   std = torch.std(tensor, dim=0)
@@ -30,28 +148,36 @@ def standardize_tensor(tensor: torch.Tensor) -> torch.Tensor:
 
 
 def train_and_save(datasource: TestValidateTrainSplit, save_path: str) -> CreditCardFraudDetectionModel:
-  model = CreditCardFraudDetectionModel()
+  # Trains an EmbeddingFraudDetectionModel over the raw fields instead of the onehot vectors, and saves it
+  # converted to a CreditCardFraudDetectionModel over onehot vectors standardized with the training data
+  encoder = datasource.encoder
+  model = EmbeddingFraudDetectionModel(len(encoder.merchants), len(encoder.categories), len(encoder.jobs))
   loss_func = nn.BCELoss()
   optimizer = Adam(model.parameters(), lr=0.001)
   logging.info('Model, loss function, optimizer initialized')
 
-  training_inputs = standardize_tensor(torch.tensor(datasource.get_train_inputs(), dtype=torch.float))
+  training_numerics, training_indices = [torch.from_numpy(inputs) for inputs in datasource.get_train_index_inputs()]
   training_labels = torch.tensor(datasource.get_train_labels(), dtype=torch.float)
+  mean, std = onehot_mean_and_std(training_numerics, training_indices, encoder)
+  numeric_columns, _, _ = encoder.layout()
+  model.mean.copy_(mean[numeric_columns])
+  model.std.copy_(std[numeric_columns] + 1e-8)
   logging.info('Training tensors generated')
-  training_dataset = TensorDataset(training_inputs, training_labels)
+  training_dataset = TensorDataset(training_numerics, training_indices, training_labels)
   training_data_loader = DataLoader(training_dataset, batch_size=64, shuffle=True)
 
   epochs = 45
   for epoch in range(epochs):
     model.train()
     logging.info(f'Begin epoch {epoch + 1}')
-    for inputs, labels in training_data_loader:
+    for numerics, indices, labels in training_data_loader:
       optimizer.zero_grad()
-      outputs = model(inputs)
+      outputs = model(numerics, indices)
       loss = loss_func(outputs.squeeze(), labels)
       loss.backward()
       optimizer.step()
     logging.info(f'Epoch [{epoch + 1}/{epochs}], Loss: {loss.item()}')
+  model = convert_to_onehot_model(model, mean, std, encoder)
   torch.save(model.state_dict(), save_path)
   return model
 
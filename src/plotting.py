@@ -0,0 +1,91 @@
+from io import BytesIO
+from matplotlib.axes import Axes
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import pandas as pd
+import seaborn as sns
+from services import PLOT_RENDER_OPTIONS, PLOTTING_DATA_COLS, PLOTTING_DATA_COLS_NAMES
+from typing import Callable
+
+# Plots are drawn on Figure objects attached to their own Agg canvas rather than through pyplot,
+# so no global figure state is kept between renders and several threads can render at once.
+# Every feature in PLOTTING_DATA_COLS has a render function, which draws the aggregates of the
+# transactions of one fraud label onto an Axes.
+
+DAYS_OF_WEEK = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+FRAUD_LABELS = ['Legitimate', 'Fraudulent']
+
+def _render_trans_month(ax: Axes, counts: pd.Series, amts: pd.Series, label: str):
+  ax = amts.plot(kind='bar', ax=ax, label='Count')
+  ax.set_xticklabels(ax.get_xticklabels(), rotation=45)
+  ax.set_ylabel('Count')
+  ax.legend(loc='upper left')
+
+  ax1 = ax.twinx()
+  ax1 = counts.plot(kind='line', color='orange', label='Amount', ax=ax1)
+  ax1.set_xticklabels(ax.get_xticklabels(), rotation=45)
+  ax1.set_ylabel('Amount ($)')
+  ax1.set_title(label)
+  ax1.legend(loc='upper right')
+
+def _render_gender(ax: Axes, counts: pd.Series, amts: pd.Series, label: str):
+  ax.pie(counts, labels=[{'F': 'Female', 'M': 'Male'}.get(g, g) for g in counts.index], autopct='%1.1f%%')
+  ax.set_title(label)
+
+def _render_trans_day_of_week(ax: Axes, counts: pd.Series, amts: pd.Series, label: str):
+  ax = sns.barplot(data=counts.rename('count').reset_index(), x=counts.index.name, y='count', label='Count',
+                   color='#a1c9f4', order=DAYS_OF_WEEK, ax=ax)
+  ax.set_ylabel('Count')
+  ax.set_xticks(range(len(DAYS_OF_WEEK)), DAYS_OF_WEEK, rotation=45)
+  ax.legend(loc='upper left')
+
+  ax1 = ax.twinx()
+  ax1 = sns.lineplot(data=amts.reindex(DAYS_OF_WEEK).rename('amt').rename_axis(counts.index.name).reset_index(),
+                     x=counts.index.name, y='amt', label='Amount', color='orange', ax=ax1)
+  ax1.set_ylabel('Amount ($)')
+  ax1.set_title(label)
+  ax1.legend(loc='upper right')
+
+def _render_category(ax: Axes, counts: pd.Series, amts: pd.Series, label: str):
+  cats = counts.index.tolist()
+  ax = sns.barplot(data=counts.rename('count').reset_index(), x=counts.index.name, y='count', label='Count',
+                   color='#a1c9f4', order=cats, ax=ax)
+  ax.set_ylabel('Count')
+  ax.set_xticks(range(len(cats)), cats, rotation=90)
+  ax.legend(loc='upper left')
+  ax.set_title(label)
+
+RENDERERS: dict[str, Callable[[Axes, pd.Series, pd.Series, str], None]] = {
+  'trans_month': _render_trans_month,
+  'trans_dayOfWeek': _render_trans_day_of_week,
+  'gender': _render_gender,
+  'category': _render_category,
+}
+
+def render_feature_plot(feature: str, table: pd.DataFrame) -> bytes:
+  """
+  Renders the distribution of transactions by a feature, side by side for legitimate and fraudulent
+  transactions, as a PNG with PLOT_RENDER_OPTIONS. The figure is released as soon as it is saved.
+
+  Args:
+    feature (str): A feature in PLOTTING_DATA_COLS.
+    table (pd.DataFrame): The aggregates of the feature, indexed on its values with the columns count_0,
+    count_1, amt_0 and amt_1 (see aggregates.compute_aggregate_table).
+  Returns:
+    result (bytes): The PNG image.
+  """
+  render = RENDERERS[feature]
+  table = table.sort_index()
+  fig = Figure(figsize=PLOT_RENDER_OPTIONS['figsize'])
+  FigureCanvasAgg(fig)
+  try:
+    fig.suptitle(f'Distribution of Transaction by {PLOTTING_DATA_COLS_NAMES[PLOTTING_DATA_COLS.index(feature)]}', fontsize=20, fontweight='bold')
+    for is_fraud, ax in enumerate(fig.subplots(1, 2)):
+      # Only the feature values that occur with this label, as they would in a groupby of its transactions
+      counts = table[f'count_{is_fraud}'][table[f'count_{is_fraud}'] > 0].rename_axis(feature)
+      render(ax, counts, table[f'amt_{is_fraud}'][counts.index], FRAUD_LABELS[is_fraud])
+    img_buffer = BytesIO()
+    fig.savefig(img_buffer, format=PLOT_RENDER_OPTIONS['format'])
+    return img_buffer.getvalue()
+  finally:
+    fig.clear()
@@ -1,21 +1,39 @@
 from datetime import datetime
 from enum import Enum
+from hashlib import sha256
 from hotqueue import HotQueue
+from inference_modes import INFERENCE_MODES
 import logging
-from orjson import loads
+from orjson import OPT_SORT_KEYS, dumps, loads
 from os import environ
+import pandas as pd
 from redis import Redis
 from time import sleep
-from typing import Any, Callable, Optional
+from typing import Any, Callable, Iterator, Optional
 
 _redis: Optional[Redis] = None
 _queue: Optional[HotQueue] = None
+_warmup_queue: Optional[HotQueue] = None
 
 BING_API_KEY_VAR = 'BING_API_KEY'
+COLUMN_CACHE_MB_VAR = 'COLUMN_CACHE_MB'
+COLUMNAR_STORE_VAR = 'COLUMNAR_STORE'
+DATASET_VERSION_KEY = 'dataset_version'
+DEFAULT_COLUMN_CACHE_MB = 256
+DEFAULT_PREDICT_MAX_BATCH_SIZE = 256
+DEFAULT_PREDICT_MAX_WAIT_MS = 2
+DEFAULT_INFERENCE_MODE = 'torchscript'
+FINE_HOTSPOT_GRIDS_VAR = 'FINE_HOTSPOT_GRIDS'
+PLOT_CACHE_TTL_SECONDS = 24 * 60 * 60
+INFERENCE_MODE_VAR = 'INFERENCE_MODE'
 LOG_LVL_VAR = 'LOG_LEVEL'
+PREDICT_MAX_BATCH_SIZE_VAR = 'PREDICT_MAX_BATCH_SIZE'
+PREDICT_MAX_WAIT_MS_VAR = 'PREDICT_MAX_WAIT_MS'
 REDIS_IP_VAR = 'REDIS_IP'
 REDIS_JOB_QUEUE_KEY = 'job_queue'
+REDIS_WARMUP_QUEUE_KEY = 'warmup_queue'
 REDIS_JOB_IDS_KEY = 'job_ids'
+SCAN_BATCH_SIZE = 1000
 TRANSACTION_DATE_TIME_FORMAT = '%d/%m/%Y %H:%M'
 
 OK_200 = ('OK\n', 200)
@@ -25,19 +43,49 @@ class RedisDb(Enum):
   QUEUE_DB = 1
   JOB_DB = 2
   JOB_RESULTS_DB = 3
+  COLUMN_DB = 4
+  CACHE_DB = 5
+  AGGREGATE_DB = 6
+  INDEX_DB = 7
+
+# The compact dtype of every dataset column that analysis DataFrames are loaded with.
+# Low-cardinality strings are categorical, coordinates float32 and the fraud label int8.
+# Amounts stay float64 so that statistics returned by the API are not rounded to float32.
+TRANSACTION_SCHEMA = {
+  'trans_date_trans_time': 'datetime64[ns]',
+  'merchant': 'category',
+  'category': 'category',
+  'amt': 'float64',
+  'gender': 'category',
+  'city': 'category',
+  'state': 'category',
+  'zip': 'int32',
+  'lat': 'float32',
+  'long': 'float32',
+  'city_pop': 'int32',
+  'job': 'category',
+  'unix_time': 'int64',
+  'merch_lat': 'float32',
+  'merch_long': 'float32',
+  'is_fraud': 'int8',
+}
 
 PLOTTING_DATA_COLS =  ['trans_month','trans_dayOfWeek','gender','category']
 PLOTTING_DATA_COLS_NAMES = ['Month','Day of Week','Gender','Transaction Category']
+# Everything besides the feature and the data that determines a rendered plot. Changing these
+# (or bumping renderer after changing how plots are drawn) invalidates every cached plot.
+PLOT_RENDER_OPTIONS = {'renderer': 1, 'format': 'png', 'figsize': [10, 6]}
 
 def init_backend_services():
   """
-  Initializes the Redis and HotQueue instances so that get_redis and get_queue function correctly.
+  Initializes the Redis and HotQueue instances so that get_redis, get_queue and get_warmup_queue function correctly.
   """
   redis_addr = environ.get(REDIS_IP_VAR)
   if redis_addr is None:
     raise Exception('No IP found for Redis. Fix by setting the environment variable REDIS_IP.')
   global _redis
   global _queue
+  global _warmup_queue
   _redis = Redis(host=redis_addr)
   waits = 0
   while True:
@@ -50,6 +98,7 @@ def init_backend_services():
     sleep(0.1)
     waits += 1
   _queue = HotQueue(REDIS_JOB_QUEUE_KEY, host=redis_addr, db=RedisDb.QUEUE_DB.value)
+  _warmup_queue = HotQueue(REDIS_WARMUP_QUEUE_KEY, host=redis_addr, db=RedisDb.QUEUE_DB.value)
 
 def get_redis(db: int, none_handler: Optional[Callable[[], None]] = None) -> Redis:
   """
@@ -85,6 +134,22 @@ def get_queue(none_handler: Optional[Callable[[], None]] = None) -> HotQueue:
     return None
   return _queue
 
+def get_warmup_queue(none_handler: Optional[Callable[[], None]] = None) -> HotQueue:
+  """
+  Returns the HotQueue instance of low-priority warm-up work, which workers only take from when the job queue is empty.
+  Runs the none_handler and returns None if HotQueue hasn't been initialized yet.
+
+  Args:
+    none_handler (Optional[Callable[[], None]]): Optional kwarg to select a function to be called in case the Queue is None
+  Returns:
+    queue (HotQueue): The HotQueue instance, or None if queue is None
+  """
+  global _warmup_queue
+  if _warmup_queue is None:
+    if none_handler: none_handler()
+    return None
+  return _warmup_queue
+
 def get_log_level() -> str:
   """
   Retrieves the log level from the environment using LOG_LVL_VAR.
@@ -111,6 +176,192 @@ def get_bing_api_key() -> str:
     return bing_api_key
   raise Exception(f'{BING_API_KEY_VAR} not defined in environment variables.')
 
+def is_columnar_store_enabled() -> bool:
+  """
+  Checks the environment using COLUMNAR_STORE_VAR to see if analytics should read from the columnar store.
+  The columnar store is optional and disabled unless the variable is set to a truthy value.
+
+  Returns:
+    enabled (bool): Whether the columnar store is enabled.
+  """
+  return environ.get(COLUMNAR_STORE_VAR, '').lower() in ['1', 'true', 'yes']
+
+def are_fine_hotspot_grids_enabled() -> bool:
+  """
+  Checks the environment using FINE_HOTSPOT_GRIDS_VAR to see if ingest should maintain the hotspot grids of every resolution.
+  Only the coarse grids are maintained unless the variable is set to a truthy value.
+
+  Returns:
+    enabled (bool): Whether the fine hotspot grids are enabled.
+  """
+  return environ.get(FINE_HOTSPOT_GRIDS_VAR, '').lower() in ['1', 'true', 'yes']
+
+def get_column_cache_budget() -> int:
+  """
+  Retrieves the memory budget of the process-local column cache from the environment using COLUMN_CACHE_MB_VAR.
+  Defaults to DEFAULT_COLUMN_CACHE_MB if the variable is not set; 0 disables the cache.
+  Throws an Exception if the variable is not a non-negative integer.
+
+  Returns:
+    budget (int): The memory budget in bytes.
+  """
+  budget_mb = environ.get(COLUMN_CACHE_MB_VAR, str(DEFAULT_COLUMN_CACHE_MB))
+  if not budget_mb.isdigit():
+    raise Exception(f'{COLUMN_CACHE_MB_VAR} must be a non-negative integer number of megabytes.')
+  return int(budget_mb) * 1024 * 1024
+
+def get_predict_max_batch_size() -> int:
+  """
+  Retrieves the most transactions /predict runs through the model at once from the environment using PREDICT_MAX_BATCH_SIZE_VAR.
+  Defaults to DEFAULT_PREDICT_MAX_BATCH_SIZE if the variable is not set.
+  Throws an Exception if the variable is not a positive integer.
+
+  Returns:
+    max_batch_size (int): The maximum batch size.
+  """
+  max_batch_size = environ.get(PREDICT_MAX_BATCH_SIZE_VAR, str(DEFAULT_PREDICT_MAX_BATCH_SIZE))
+  if not max_batch_size.isdigit() or int(max_batch_size) == 0:
+    raise Exception(f'{PREDICT_MAX_BATCH_SIZE_VAR} must be a positive integer.')
+  return int(max_batch_size)
+
+def get_predict_max_wait() -> float:
+  """
+  Retrieves how long /predict waits for more requests to batch with the first one from the environment using PREDICT_MAX_WAIT_MS_VAR.
+  Defaults to DEFAULT_PREDICT_MAX_WAIT_MS if the variable is not set; 0 only batches requests that are already waiting.
+  Throws an Exception if the variable is not a non-negative number.
+
+  Returns:
+    max_wait (float): The maximum wait in seconds.
+  """
+  max_wait_ms = environ.get(PREDICT_MAX_WAIT_MS_VAR, str(DEFAULT_PREDICT_MAX_WAIT_MS))
+  try:
+    assert float(max_wait_ms) >= 0
+  except (AssertionError, ValueError):
+    raise Exception(f'{PREDICT_MAX_WAIT_MS_VAR} must be a non-negative number of milliseconds.')
+  return float(max_wait_ms) / 1000
+
+def get_inference_mode() -> str:
+  """
+  Retrieves how the model is exported for inference in this process from the environment using INFERENCE_MODE_VAR.
+  Defaults to DEFAULT_INFERENCE_MODE if the variable is not set.
+  Throws an Exception if the variable is not one of INFERENCE_MODES.
+
+  Returns:
+    mode (str): The inference mode.
+  """
+  mode = environ.get(INFERENCE_MODE_VAR, DEFAULT_INFERENCE_MODE)
+  if mode not in INFERENCE_MODES:
+    raise Exception(f'{INFERENCE_MODE_VAR} must be one of {INFERENCE_MODES}.')
+  return mode
+
+def get_dataset_version(redisdb: Redis) -> int:
+  """
+  Returns the version of the dataset currently in Redis.
+  The version is bumped every time the dataset changes, so anything derived from the
+  dataset can be cached under the version it was computed from.
+
+  Args:
+    redisdb (Redis): Redis, selected on the cache db.
+  Returns:
+    version (int): The dataset version, 0 if the dataset has never changed.
+  """
+  version = redisdb.get(DATASET_VERSION_KEY)
+  return 0 if version is None else int(version)
+
+def bump_dataset_version(redisdb: Redis) -> int:
+  """
+  Atomically increments the dataset version, invalidating everything cached under older versions.
+
+  Args:
+    redisdb (Redis): Redis, selected on the cache db.
+  Returns:
+    version (int): The new dataset version.
+  """
+  return redisdb.incr(DATASET_VERSION_KEY)
+
+def plot_cache_key(graph_feature: str, dataset_version: int, render_options: dict[str, Any] = PLOT_RENDER_OPTIONS) -> str:
+  """
+  Returns the key a rendered plot is cached under in the cache db. The key is a digest of everything
+  that determines the image, so identical plots share an entry and stale ones are never served.
+
+  Args:
+    graph_feature (str): The plotted feature, one of PLOTTING_DATA_COLS.
+    dataset_version (int): The version of the dataset the plot is rendered from.
+    render_options (dict[str, Any]): Optional kwarg, the options the plot is rendered with.
+  Returns:
+    key (str): The cache key.
+  """
+  content = dumps({'graph_feature': graph_feature, 'dataset_version': dataset_version, 'render_options': render_options}, option=OPT_SORT_KEYS)
+  return f'plot:{sha256(content).hexdigest()}'
+
+def scan_raw_data_out_of_redis(redisdb: Redis, batch_size: int = SCAN_BATCH_SIZE) -> Iterator[list[bytes]]:
+  """
+  Yields all the values currently stored in Redis without decoding them, one batch at a time, in key order.
+  Ingest stores the transactions under the integer keys 0 to N-1, so each batch is the next range of
+  batch_size keys, fetched with a single MGET. Unlike a SCAN cursor, which may return a key more than once
+  and in any order, every value is read exactly once, in the same order on every read. Redis is never
+  blocked by an O(N) command and only one batch is held at a time. Reading stops at the first range
+  without any stored key.
+
+  Args:
+    redisdb (Redis): Redis, selected on the db to read.
+    batch_size (int): Optional kwarg, how many keys are fetched per batch.
+  Returns:
+    result (Iterator[list[bytes]]): The raw stored values, in batches.
+  """
+  start = 0
+  while True:
+    batch = [d for d in redisdb.mget(list(range(start, start + batch_size))) if d is not None]
+    if not batch:
+      return
+    yield batch
+    start += batch_size
+
+def scan_data_out_of_redis(redisdb: Redis, batch_size: int = SCAN_BATCH_SIZE) -> Iterator[list[dict[str, Any]]]:
+  """
+  Yields all the data currently stored in Redis, decoded one batch at a time.
+  See scan_raw_data_out_of_redis for how the keys are read.
+
+  Args:
+    redisdb (Redis): Redis, selected on the db to read.
+    batch_size (int): Optional kwarg, how many keys are fetched per batch.
+  Returns:
+    result (Iterator[list[dict[str, Any]]]): The decoded records, in batches.
+  """
+  for batch in scan_raw_data_out_of_redis(redisdb, batch_size=batch_size):
+    yield [loads(d) for d in batch]
+
+def scan_dataframes_out_of_redis(redisdb: Redis, cols: Optional[list[str]] = None, batch_size: int = SCAN_BATCH_SIZE) -> Iterator[pd.DataFrame]:
+  """
+  Yields all the data currently stored in Redis as one DataFrame per scanned batch.
+  If cols is provided, every other column is dropped from each batch as soon as it is decoded.
+
+  Args:
+    redisdb (Redis): Redis, selected on the db to read.
+    cols (Optional[list[str]]): Optional kwarg listing the columns to keep.
+    batch_size (int): Optional kwarg, how many keys are fetched per batch.
+  Returns:
+    result (Iterator[pd.DataFrame]): The decoded records, in batches, in key order.
+  """
+  for batch in scan_data_out_of_redis(redisdb, batch_size=batch_size):
+    df = pd.DataFrame(batch)
+    yield df if cols is None else df.drop(columns=df.columns.difference(cols))
+
+def apply_transaction_schema(df: pd.DataFrame) -> pd.DataFrame:
+  """
+  Converts the columns of a DataFrame of transactions to their compact dtypes in TRANSACTION_SCHEMA.
+  Dates are parsed with TRANSACTION_DATE_TIME_FORMAT. Columns missing from the schema are left as they are.
+
+  Args:
+    df (pd.DataFrame): The transactions, e.g. as read out of Redis.
+  Returns:
+    result (pd.DataFrame): The transactions with compact dtypes.
+  """
+  dtypes = {col: dtype for col, dtype in TRANSACTION_SCHEMA.items() if col in df.columns}
+  if 'trans_date_trans_time' in dtypes:
+    df = df.assign(trans_date_trans_time=pd.to_datetime(df['trans_date_trans_time'], format=TRANSACTION_DATE_TIME_FORMAT))
+  return df.astype(dtypes)
+
 def pipeline_data_out_of_redis(redisdb: Redis) -> list[dict[str, Any]]:
   """
     Returns all the data currently stored in Redis.
@@ -119,11 +370,7 @@ def pipeline_data_out_of_redis(redisdb: Redis) -> list[dict[str, Any]]:
     Returns:
         result (list[dict[str, Any]]): The data stored in Redis.
     """
-  keys = redisdb.keys()
-  with redisdb.pipeline() as pipe:
-    for key in keys: pipe.get(key)
-    data = pipe.execute()
-  return [loads(d) for d in data]
+  return [record for batch in scan_data_out_of_redis(redisdb) for record in batch]
 
 def _is_valid_date(date_string: str):
   try:
@@ -1,20 +1,24 @@
-from datetime import datetime
+from aggregates import compute_aggregate_table, derive_time_columns, has_aggregates, read_aggregate_table
+from columnstore import iter_column_segments, read_column_store_meta
 from hotqueue import HotQueue
-from input_vectorization import flatten, onehot_encode
+from inference import InferenceEngine, extract_transaction_row
 from io import BytesIO
 import logging
-import matplotlib.pyplot as plt
-from ml_model import load_saved_model
 import orjson
 import pandas as pd
+from plotting import render_feature_plot
 from redis import Redis
 import seaborn as sns
-from services import PLOTTING_DATA_COLS, PLOTTING_DATA_COLS_NAMES, RedisDb, get_log_level, get_queue, get_redis as generic_get_redis, init_backend_services, pipeline_data_out_of_redis, validate_transaction_list
+from services import PLOT_CACHE_TTL_SECONDS, PLOTTING_DATA_COLS, RedisDb, apply_transaction_schema, get_dataset_version, get_inference_mode, get_log_level, get_queue, get_redis as generic_get_redis, get_warmup_queue, init_backend_services, is_columnar_store_enabled, plot_cache_key, scan_dataframes_out_of_redis, validate_transaction_list
 import socket
-import torch
-from typing import Any
+from typing import Any, Iterator, Optional
 import warnings
 
+PLOTTING_BATCH_SIZE = 50000
+WARMUP_POLL_SECONDS = 1
+
+_inference_engine: Optional[InferenceEngine] = None
+
 def _on_no_queue():
     """Raise an exception when get_queue is called before HotQueue is initialized.
 
@@ -60,10 +64,73 @@ def _begin_job(job_id) -> dict[str, Any]:
     get_redis(RedisDb.JOB_DB).set(job_id, orjson.dumps(job_info))
     return job_info
 
+def _iter_plotting_chunks(cols: list[str]) -> Iterator[pd.DataFrame]:
+    """
+    Yields columns of the dataset one chunk at a time: segments of the columnar store when it is
+    enabled and populated, otherwise scanned batches of rows with every other column dropped.
+
+    Arguments:
+        cols (list[str]): The columns to read
+    Returns:
+        result (Iterator[pd.DataFrame]): The columns, in chunks
+    """
+    if is_columnar_store_enabled():
+        meta = read_column_store_meta(get_redis(RedisDb.COLUMN_DB))
+        if meta is not None:
+            yield from iter_column_segments(get_redis(RedisDb.COLUMN_DB), cols, meta=meta)
+            return
+    yield from scan_dataframes_out_of_redis(get_redis(RedisDb.TRANSACTION_DB), cols=cols, batch_size=PLOTTING_BATCH_SIZE)
+
+def _load_plotting_table(independent_variable: str) -> pd.DataFrame:
+    """
+    Loads the aggregates needed to plot a feature: the counts and summed amounts of transactions per
+    feature value, split by fraud label. These are read from the aggregates maintained at ingest when
+    present, otherwise they are computed one chunk at a time and merged, so that worker memory doesn't
+    grow with the dataset.
+
+    Arguments:
+        independent_variable (str): The feature being plotted
+    Returns:
+        result (pd.DataFrame): Indexed on the feature value with the columns count_0, count_1, amt_0 and amt_1
+    """
+    if has_aggregates(get_redis(RedisDb.AGGREGATE_DB)):
+        return read_aggregate_table(get_redis(RedisDb.AGGREGATE_DB), independent_variable)
+    derived = independent_variable in ['trans_month', 'trans_dayOfWeek']
+    cols = ['trans_date_trans_time' if derived else independent_variable, 'amt', 'is_fraud']
+    table = pd.DataFrame({'count_0': [], 'count_1': [], 'amt_0': [], 'amt_1': []}).astype({'count_0': int, 'count_1': int})
+    for chunk in _iter_plotting_chunks(cols):
+        chunk = apply_transaction_schema(chunk)
+        partial = compute_aggregate_table(derive_time_columns(chunk) if derived else chunk, independent_variable)
+        table = table.add(partial.set_axis(partial.index.astype(str)), fill_value=0).astype(table.dtypes.to_dict())
+    return table
+
+def _get_or_render_plot(independent_variable: str, dataset_version: int) -> Optional[bytes]:
+    """
+    Returns the plot of a feature from the plot cache, rendering and caching it on a miss.
+
+    Arguments:
+        independent_variable (str): The feature being plotted
+        dataset_version (int): The dataset version, read before the data is loaded
+    Returns:
+        result (Optional[bytes]): The image, or None if there is no data to plot
+    """
+    cache_key = plot_cache_key(independent_variable, dataset_version)
+    image = get_redis(RedisDb.CACHE_DB).get(cache_key)
+    if image is not None:
+        return image
+    table = _load_plotting_table(independent_variable)
+    if table.empty:
+        return None
+    image = render_feature_plot(independent_variable, table)
+    get_redis(RedisDb.CACHE_DB).set(cache_key, image, ex=PLOT_CACHE_TTL_SECONDS)
+    return image
+
 def _execute_graph_feature_analysis_job(job_id: str, job_description_dict: dict[str, str]) -> bool:
     """
     Attempts to perform mathematical analysis requested in the job description.
     The result is an image plot saved as a binary string in Redis.
+    Only the small table of aggregates per feature value is loaded and plotted.
+    Plots are cached per feature, dataset version and render options, so identical plots are rendered once.
     
     Arguments:
         job_id (str): The ID of the job
@@ -71,7 +138,6 @@ def _execute_graph_feature_analysis_job(job_id: str, job_description_dict: dict[
     Returns:
         result (bool): Whether or not the job was completed successfully
     """
-    labels=['Legitimate', 'Fraudulent']
     independent_variable = job_description_dict["graph_feature"]
     
     # Check if worker is compatible to plot feature
@@ -79,70 +145,15 @@ def _execute_graph_feature_analysis_job(job_id: str, job_description_dict: dict[
         logging.error(f'JOB ID: {job_id} | Unavailable metric to plot.')
         return False
 
-    df = pd.DataFrame(pipeline_data_out_of_redis(get_redis(RedisDb.TRANSACTION_DB)))
-    df[['trans_date', 'trans_time']] = df['trans_date_trans_time'].str.split(' ', expand=True)
-    df['trans_date'] = pd.to_datetime(df['trans_date'], format='%d/%m/%Y')
-
-    df['trans_month'] = df['trans_date'].dt.to_period('M').astype('str')
-    df['trans_dayOfWeek'] = df['trans_date'].dt.day_name()
-    df['fraud'] = df['is_fraud'].apply(lambda x: 'Fraudulent' if x == 1 else 'Legitimate')
-    
-    independent_variable_str = PLOTTING_DATA_COLS_NAMES[PLOTTING_DATA_COLS.index(independent_variable)]
-    
-    _, axes = plt.subplots(1, 2, figsize=(10, 6))
-    plt.suptitle(f'Distribution of Transaction by {independent_variable_str}', fontsize=20, fontweight='bold')
-    
-    for i, ax in enumerate(axes.flatten()):
-        df_1 = df[df['is_fraud'] == i]
-        
-        if independent_variable == 'trans_month':
-            ax = df_1.groupby(independent_variable)['amt'].sum().plot(kind='bar', ax=ax, label='Count')
-            ax.set_xticklabels(ax.get_xticklabels(), rotation = 45)
-            ax.set_ylabel('Count')
-            ax.legend(loc='upper left')
-            
-            ax1 = ax.twinx()
-            ax1 = df_1.groupby(independent_variable).size().plot(kind='line',color='orange', label='Amount', ax=ax1)
-            ax1.set_xticklabels(ax.get_xticklabels(), rotation = 45)
-            ax1.set_ylabel('Amount ($)')  
-            ax1.set_title(f"{labels[i]}")
-            ax1.legend(loc='upper right')
-
-        elif independent_variable == 'gender':
-            ax.pie(df_1[independent_variable].value_counts(), labels = ['Female','Male'] , autopct='%1.1f%%')
-            ax.set_title(f"{labels[i]}")
-
-        elif independent_variable == 'trans_dayOfWeek':
-            cats = [ 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-            ax = sns.barplot(data = df_1.groupby(independent_variable).size().reset_index(), x = independent_variable, y=0, label = 'Count'
-                            , color='#a1c9f4', order=['Monday','Tuesday','Wednesday','Thursday','Friday','Saturday','Sunday'], ax=ax)
-            ax.set_ylabel('Count')
-            ax.set_xticklabels(cats, rotation=45)  # Set x-axis tick labels to the days of the week
-            ax.legend(loc='upper left')
-
-            ax1 = ax.twinx()
-            ax1 = sns.lineplot(data = df_1.groupby(independent_variable)['amt'].sum().reindex(cats).reset_index(), x = independent_variable, y='amt', label ='Amount', color='orange', ax=ax1)
-            ax1.set_ylabel('Amount ($)')
-            ax1.set_title(f"{labels[i]}")
-            ax1.legend(loc='upper right')
-        
-        elif independent_variable == 'category':
-            cats = df_1['category'].unique().tolist()  # Get unique transaction categories
-            ax = sns.barplot(data = df_1.groupby(independent_variable).size().reset_index(), x = independent_variable, y=0, label = 'Count'
-                            ,color='#a1c9f4', order=cats, ax=ax)
-            ax.set_ylabel('Count')
-            ax.set_xticklabels(cats, rotation=90)
-            ax.legend(loc='upper left')
-            ax.set_title(f"{labels[i]}")
-        else:
-            logging.error(f'JOB ID: {job_id} | Encountered unsupported data element despite checking PLOTTING_DATA_COLS.')
-            return False
+    # The version is read before loading, so a plot that races an ingest is cached under the old version
+    image = _get_or_render_plot(independent_variable, get_dataset_version(get_redis(RedisDb.CACHE_DB)))
+    if image is None:
+        logging.error(f'JOB ID: {job_id} | No data to plot.')
+        return False
 
     # Save Plot into Redis Results Data Base
     try:
-        img_buffer = BytesIO()
-        plt.savefig(img_buffer, format='png')
-        successful_data_entry = get_redis(RedisDb.JOB_RESULTS_DB).set(job_id, img_buffer.getvalue())
+        successful_data_entry = get_redis(RedisDb.JOB_RESULTS_DB).set(job_id, image)
         if not successful_data_entry:
             raise Exception('Image data failed to be set in Redis.')
     except Exception as e:
@@ -150,42 +161,33 @@ def _execute_graph_feature_analysis_job(job_id: str, job_description_dict: dict[
         return False
     return True
 
-def _extract_row(t: dict[str, Any]) -> list[str|float|int]:
+def _warm_plot(warmup: dict[str, Any]) -> bool:
     """
-    Converts a transaction dictionary from a transaction analysis job input to a row of values.
-    This is the first step in preparing a tensor for model inference.
-    The date is broken into more meaningful numeric components.
+    Renders the plot of a feature into the plot cache ahead of any job asking for it.
+    Warm-ups for a dataset version that has since been replaced are skipped.
 
     Arguments:
-        t (dict[str, Any]): The transaction dictionary
+        warmup (dict[str, Any]): The graph_feature to plot and the dataset_version it was queued for
     Returns:
-        result (list[str|float|int]): The transaction dictionary as a list of values
+        result (bool): Whether or not the plot is now cached
     """
-    date = datetime.strptime(t['trans_date_trans_time'], '%d/%m/%Y %H:%M')
-    return [date.day, date.month, date.year, date.weekday(), date.hour, date.minute, t['merchant'], t['category'], t['amt'], t['lat'], t['long'], t['job'], t['merch_lat'], t['merch_long']]
+    if warmup['dataset_version'] != get_dataset_version(get_redis(RedisDb.CACHE_DB)):
+        logging.info(f'Skipping stale plot warm-up {warmup}.')
+        return False
+    return _get_or_render_plot(warmup['graph_feature'], warmup['dataset_version']) is not None
 
-def _standardize_tensor(tensor: torch.Tensor) -> torch.Tensor:
+def get_inference_engine() -> InferenceEngine:
     """
-    This is the last step in preparing a tensor for model inference.
-    This loads the mean and standard deviation tensors (obtained from training data)
-    from saved files and then standardizes the input tensor with them.
+    Returns the inference engine of this worker process, loading the model artifacts
+    from the current working directory in the INFERENCE_MODE the first time it is called.
 
-    This function requires a 'meanandstd.txt' file to be present in the
-    current working directory with the first line being the mean tensor values
-    and the second line being the std tensor values, e.g.
-    1.0, 2.0, 3.0
-    0.1, 0.2, 0.3
-
-    Arguments:
-        tensor (torch.Tensor): The tensor to standardize
     Returns:
-        result (torch.Tensor): The standardized tensor
+        engine (InferenceEngine): The inference engine
     """
-    with open('meanandstd.txt', 'r') as meanandstd_file:
-        lines = [line.strip().split(', ') for line in meanandstd_file.readlines()[:2]]
-    mean = torch.tensor([float(m) for m in lines[0]], dtype=torch.float)
-    std = torch.tensor([float(s) for s in lines[1]], dtype=torch.float)
-    return (tensor - mean) / (std + 1e-8)
+    global _inference_engine
+    if _inference_engine is None:
+        _inference_engine = InferenceEngine(mode=get_inference_mode())
+    return _inference_engine
 
 def _execute_transaction_analysis_job(job_id: str, job_info: dict[str, Any]) -> bool:
     """
@@ -203,23 +205,8 @@ def _execute_transaction_analysis_job(job_id: str, job_info: dict[str, Any]) ->
         if isinstance(job_info['transactions'], list) and job_info['transactions']:
             err = validate_transaction_list(job_info)
             if err is None:
-                with open('merchants.txt', 'r') as merchants_file:
-                    merchants = [line.strip() for line in merchants_file.readlines()]
-                with open('categories.txt', 'r') as categories_file:
-                    categories = [line.strip() for line in categories_file.readlines()]
-                with open('jobs.txt', 'r') as jobs_file:
-                    jobs = [line.strip() for line in jobs_file.readlines()]
-                transaction_rows = [_extract_row(t) for t in job_info['transactions']]
-                transaction_rows = [flatten(onehot_encode(t, merchants, categories, jobs)) for t in transaction_rows]
-                inputs = _standardize_tensor(torch.tensor(transaction_rows, dtype=torch.float))
-                model = load_saved_model('binaryclassifierstate.pt')
-                model.eval()
-                with torch.no_grad():
-                    predictions = model(inputs).round().squeeze()
-                if predictions.dim() == 0:
-                    predictions = [predictions.item()]
-                else:
-                    predictions = [p.item() for p in predictions]
+                transaction_rows = [extract_transaction_row(t) for t in job_info['transactions']]
+                predictions = get_inference_engine().predict(transaction_rows)
                 successful_data_entry = get_redis(RedisDb.JOB_RESULTS_DB).set(job_id, orjson.dumps(predictions))
                 if not successful_data_entry:
                     logging.error('Failed to upload results to Redis.')
@@ -263,28 +250,42 @@ def _complete_job(job_id: str, job_info: dict[str, Any], success: bool):
     get_redis(RedisDb.JOB_DB).set(job_id, orjson.dumps(job_info))
     logging.info(f'Job information updated in database...')
 
-def do_jobs(queue: HotQueue):
+def _do_job(job_id: str):
+    """Executes a job popped off of the queue and records its outcome.
+
+    Args:
+        job_id (str): uuid of job
+    """
+    try:
+        job_info = _begin_job(job_id)
+        logging.info("Job has begun...")
+        success = _execute_job(job_id, job_info)
+        logging.info(f"Job has finished executing. {job_id} success code is {success}.")
+        _complete_job(job_id, job_info, success)
+    except Exception as e:
+        logging.error(e)
+
+def do_jobs(queue: HotQueue, warmup_queue: HotQueue, poll_seconds: int = WARMUP_POLL_SECONDS):
     """Starts a worker to execute jobs from the provided HotQueue.
+    Warm-up work is only taken when no job has been queued for poll_seconds, one item at a time,
+    so it never delays a job by more than a single plot.
 
     Args:
-        queue (HotQueue): The HotQueue instance, or None if queue is None
+        queue (HotQueue): The HotQueue instance of jobs
+        warmup_queue (HotQueue): The HotQueue instance of low-priority warm-up work
+        poll_seconds (int): Optional kwarg, how long to wait for a job before checking for warm-up work
     """
-    @queue.worker
-    def do_job(job_id: str):
-        """Pops job tasks off of queue to execute
-
-        Args:
-            job_id (str): uuid of job
-        """
-        try:
-            job_info = _begin_job(job_id)
-            logging.info("Job has begun...")
-            success = _execute_job(job_id, job_info)
-            logging.info(f"Job has finished executing. {job_id} success code is {success}.")
-            _complete_job(job_id, job_info, success)
-        except Exception as e:
-            logging.error(e)
-    do_job()
+    while True:
+        job_id = queue.get(block=True, timeout=poll_seconds)
+        if job_id is not None:
+            _do_job(job_id)
+            continue
+        warmup = warmup_queue.get()
+        if warmup is not None:
+            try:
+                _warm_plot(warmup)
+            except Exception as e:
+                logging.error(e)
 
 
 def main():
@@ -294,7 +295,7 @@ def main():
     sns.set_palette("pastel")
     init_backend_services()
     logging.info('Redis and HotQueue instances attached, beginning work...')
-    do_jobs(get_queue(none_handler=_on_no_queue))
+    do_jobs(get_queue(none_handler=_on_no_queue), get_warmup_queue(none_handler=_on_no_queue))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,254 @@
+import aggregates
+import math
+import numpy as np
+import pandas as pd
+import pytest
+
+class FakeRedis:
+  """A minimal in-memory stand-in for the handful of Redis hash commands the aggregates use."""
+  def __init__(self):
+    self.hashes = {}
+    self.commands = 0
+
+  def exists(self, *keys):
+    return sum(key in self.hashes for key in keys)
+
+  def hmget(self, key, fields):
+    table = self.hashes.get(key, {})
+    return [str(table[field]).encode() if field in table else None for field in fields]
+
+  def hgetall(self, key):
+    return {k.encode(): str(v).encode() for k, v in self.hashes.get(key, {}).items()}
+
+  def hincrby(self, key, field, amount):
+    table = self.hashes.setdefault(key, {})
+    table[field] = int(table.get(field, 0)) + amount
+
+  def hincrbyfloat(self, key, field, amount):
+    table = self.hashes.setdefault(key, {})
+    table[field] = float(table.get(field, 0)) + amount
+
+  def hset(self, key, mapping):
+    self.hashes.setdefault(key, {}).update(mapping)
+
+  def pipeline(self):
+    return _FakePipeline(self)
+
+class _FakePipeline:
+  def __init__(self, redisdb):
+    self.redisdb = redisdb
+    self.commands = []
+
+  def __getattr__(self, name):
+    return lambda *args, **kwargs: self.commands.append((name, args, kwargs))
+
+  def execute(self):
+    self.redisdb.commands += len(self.commands)
+    return [getattr(self.redisdb, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *_):
+    return False
+
+example_chunk = pd.DataFrame({
+  'trans_date_trans_time': ['21/06/2020 12:14', '21/06/2020 12:14', '22/07/2020 00:03'],
+  'state': ['SC', 'UT', 'SC'],
+  'category': ['personal_care', 'personal_care', 'travel'],
+  'gender': ['M', 'F', 'F'],
+  'amt': [2.86, 29.84, 41.28],
+  'is_fraud': [0, 1, 1],
+})
+
+def test_derive_time_columns():
+  df = aggregates.derive_time_columns(example_chunk)
+  assert df['trans_month'].astype(str).tolist() == ['2020-06', '2020-06', '2020-07']
+  assert df['trans_day'].astype(str).tolist() == ['2020-06-21', '2020-06-21', '2020-07-22']
+  assert df['trans_hour'].astype(str).tolist() == ['2020-06-21 12:00', '2020-06-21 12:00', '2020-07-22 00:00']
+  assert df['trans_dayOfWeek'].tolist() == ['Sunday', 'Sunday', 'Wednesday']
+  assert 'trans_month' not in example_chunk.columns
+
+def test_merge_moments_matches_computing_over_all_values():
+  values = np.random.default_rng(0).exponential(50, size=1001)
+  merged = aggregates.compute_moments(np.array([]))
+  for chunk in np.array_split(values, 7):
+    merged = aggregates.merge_moments(merged, aggregates.compute_moments(chunk))
+  expected = aggregates.compute_moments(values)
+  assert merged['n'] == expected['n']
+  assert merged['min'] == expected['min'] and merged['max'] == expected['max']
+  assert merged['mean'] == pytest.approx(expected['mean'])
+  assert merged['m2'] == pytest.approx(expected['m2'])
+
+def test_compute_moments_ignores_missing_values():
+  assert aggregates.compute_moments(np.array([1.0, np.nan, 3.0])) == {'n': 2, 'mean': 2.0, 'm2': 2.0, 'min': 1.0, 'max': 3.0}
+
+def test_describe_moments_matches_pandas_describe():
+  values = pd.Series([1.0, 2.0, 3.0, 4.0, 10.0])
+  described = aggregates.describe_moments(aggregates.compute_moments(values.to_numpy()))
+  expected = values.describe()
+  for stat in ['count', 'mean', 'std', 'min', 'max']:
+    assert described[stat] == pytest.approx(expected[stat])
+
+def test_describe_moments_of_a_single_value_has_no_std():
+  assert math.isnan(aggregates.describe_moments(aggregates.compute_moments(np.array([1.0])))['std'])
+
+def test_update_aggregates_across_chunks():
+  redisdb = FakeRedis()
+  assert not aggregates.has_aggregates(redisdb)
+  aggregates.update_aggregates(redisdb, example_chunk.iloc[:2])
+  aggregates.update_aggregates(redisdb, example_chunk.iloc[2:])
+  assert aggregates.has_aggregates(redisdb)
+  assert aggregates.read_counts(redisdb, 'state', 1) == {'UT': 1, 'SC': 1}
+  assert aggregates.read_counts(redisdb, 'trans_month', 0) == {'2020-06': 1}
+  moments = aggregates.read_moments(redisdb, 'amt')
+  expected = aggregates.compute_moments(example_chunk['amt'].to_numpy())
+  assert moments['n'] == 3
+  assert moments['mean'] == pytest.approx(expected['mean'])
+  assert moments['m2'] == pytest.approx(expected['m2'])
+
+@pytest.mark.parametrize('q', [0, .01, .25, .5, .75, .99, 1])
+def test_sketch_quantiles_are_within_relative_accuracy(q: float):
+  values = np.random.default_rng(0).lognormal(4, 1.5, size=10001)
+  estimate = aggregates.sketch_quantiles(aggregates.compute_sketch(values), [q])[q]
+  exact = np.sort(values)[int(np.floor(q * (len(values) - 1)))]
+  assert abs(estimate - exact) <= aggregates.SKETCH_RELATIVE_ACCURACY * exact
+
+def test_merge_sketches_matches_computing_over_all_values():
+  values = np.random.default_rng(0).exponential(50, size=1001)
+  merged = {}
+  for chunk in np.array_split(values, 7):
+    merged = aggregates.merge_sketches(merged, aggregates.compute_sketch(chunk))
+  assert merged == aggregates.compute_sketch(values)
+
+def test_sketch_quantiles_with_zero_and_negative_values():
+  sketch = aggregates.compute_sketch(np.array([-3.0, 0.0, np.nan, 0.0, 2.0, 5.0]))
+  assert sketch['z'] == 2
+  quantiles = aggregates.sketch_quantiles(sketch, [0, .5, 1])
+  assert quantiles[0] == pytest.approx(-3.0, rel=aggregates.SKETCH_RELATIVE_ACCURACY)
+  assert quantiles[.5] == 0.0
+  assert quantiles[1] == pytest.approx(5.0, rel=aggregates.SKETCH_RELATIVE_ACCURACY)
+
+def test_update_aggregates_maintains_sketch():
+  redisdb = FakeRedis()
+  aggregates.update_aggregates(redisdb, example_chunk.iloc[:2])
+  aggregates.update_aggregates(redisdb, example_chunk.iloc[2:])
+  assert aggregates.read_sketch(redisdb, 'amt') == aggregates.compute_sketch(example_chunk['amt'].to_numpy())
+  assert aggregates.read_sketch(FakeRedis(), 'amt') is None
+
+def test_read_aggregate_table():
+  redisdb = FakeRedis()
+  aggregates.update_aggregates(redisdb, example_chunk)
+  table = aggregates.read_aggregate_table(redisdb, 'category').sort_index()
+  assert table.index.tolist() == ['personal_care', 'travel']
+  assert table['count_0'].tolist() == [1, 0]
+  assert table['count_1'].tolist() == [1, 1]
+  assert table['amt_1'].tolist() == pytest.approx([29.84, 41.28])
+
+def test_compute_aggregate_table_fills_missing_labels():
+  table = aggregates.compute_aggregate_table(example_chunk[example_chunk['is_fraud'] == 1], 'state')
+  assert table.to_dict('index') == {
+    'SC': {'count_0': 0, 'count_1': 1, 'amt_0': 0.0, 'amt_1': 41.28},
+    'UT': {'count_0': 0, 'count_1': 1, 'amt_0': 0.0, 'amt_1': 29.84},
+  }
+
+def test_update_aggregates_maintains_time_rollups():
+  redisdb = FakeRedis()
+  aggregates.update_aggregates(redisdb, example_chunk)
+  assert aggregates.read_counts(redisdb, 'trans_hour', 1) == {'2020-06-21 12:00': 1, '2020-07-22 00:00': 1}
+  assert aggregates.read_counts(redisdb, 'trans_day', 0) == {'2020-06-21': 1}
+
+def test_summarize_time_buckets():
+  table = aggregates.compute_aggregate_table(aggregates.derive_time_columns(example_chunk), 'trans_day')
+  assert aggregates.summarize_time_buckets(table, 'day') == [
+    {'bucket': '2020-06-21', 'transactions': 2, 'frauds': 1, 'fraud_rate': 0.5, 'amt': pytest.approx(32.7)},
+    {'bucket': '2020-07-22', 'transactions': 1, 'frauds': 1, 'fraud_rate': 1.0, 'amt': pytest.approx(41.28)},
+  ]
+
+@pytest.mark.parametrize('start,end,expect', [
+  (pd.Timestamp(2020, 6, 1), pd.Timestamp(2020, 7, 1), ['2020-06']),
+  (pd.Timestamp(2020, 6, 15), None, ['2020-07']),
+  (None, pd.Timestamp(2020, 7, 2), ['2020-06', '2020-07']),
+])
+def test_summarize_time_buckets_keeps_buckets_starting_in_range(start, end, expect):
+  redisdb = FakeRedis()
+  aggregates.update_aggregates(redisdb, example_chunk)
+  table = aggregates.read_aggregate_table(redisdb, 'trans_month')
+  assert [b['bucket'] for b in aggregates.summarize_time_buckets(table, 'month', start=start, end=end)] == expect
+
+def test_read_moments_returns_none_when_missing():
+  assert aggregates.read_moments(FakeRedis(), 'amt') is None
+
+def test_merge_comoments_matches_pandas_cov_and_corr():
+  rng = np.random.default_rng(0)
+  values = rng.normal(size=(1001, 3)) @ np.array([[1.0, .5, 0.0], [0.0, 2.0, .3], [0.0, 0.0, 10.0]])
+  merged = aggregates.compute_comoments(np.empty((0, 3)))
+  for chunk in np.array_split(values, 7):
+    merged = aggregates.merge_comoments(merged, aggregates.compute_comoments(chunk))
+  cov, corr = aggregates.covariance_and_correlation(merged)
+  assert merged['n'] == 1001
+  np.testing.assert_allclose(cov, pd.DataFrame(values).cov().to_numpy())
+  np.testing.assert_allclose(corr, pd.DataFrame(values).corr().to_numpy())
+
+def test_compute_comoments_drops_rows_with_missing_values():
+  comoments = aggregates.compute_comoments(np.array([[1.0, 2.0], [np.nan, 5.0], [3.0, 6.0]]))
+  assert comoments['n'] == 2
+  np.testing.assert_allclose(comoments['mean'], [2.0, 4.0])
+
+def test_correlation_of_a_constant_column_is_undefined():
+  _, corr = aggregates.covariance_and_correlation(aggregates.compute_comoments(np.array([[1.0, 5.0], [2.0, 5.0], [3.0, 5.0]])))
+  assert corr[0, 0] == 1.0
+  assert np.isnan(corr[0, 1]) and np.isnan(corr[1, 0]) and np.isnan(corr[1, 1])
+
+def test_grid_cells_and_bounds():
+  cells = aggregates.grid_cells(np.array([30.2, 30.4, np.nan, 90.0]), np.array([-97.7, -97.6, 1.0, 180.0]), 0.5)
+  assert cells[0] == cells[1]
+  assert cells[2] is pd.NA
+  assert aggregates.cell_bounds(int(cells[0]), 0.5) == (30.0, -98.0, 30.5, -97.5)
+  assert aggregates.cell_bounds(int(cells[3]), 0.5) == (89.5, 179.5, 90.0, 180.0)
+
+@pytest.mark.parametrize('resolutions', [aggregates.COARSE_HOTSPOT_RESOLUTIONS, aggregates.HOTSPOT_RESOLUTIONS])
+def test_update_aggregates_maintains_hotspot_grids(resolutions: list[float]):
+  redisdb = FakeRedis()
+  chunk = example_chunk.assign(lat=[30.2, 30.4, 41.0], long=[-97.7, -97.6, -74.0])
+  aggregates.update_aggregates(redisdb, chunk.iloc[:2], hotspot_resolutions=resolutions)
+  aggregates.update_aggregates(redisdb, chunk.iloc[2:], hotspot_resolutions=resolutions)
+  for resolution in aggregates.HOTSPOT_RESOLUTIONS:
+    dim = aggregates.hotspot_dimension('customer', resolution)
+    assert aggregates.has_aggregate_dimension(redisdb, dim) == (resolution in resolutions)
+    if resolution in resolutions:
+      expected = aggregates.compute_aggregate_table(aggregates.derive_hotspot_columns(chunk), dim)
+      assert aggregates.read_aggregate_table(redisdb, dim).to_dict('index') == expected.set_axis(expected.index.astype(str)).to_dict('index')
+  assert not aggregates.has_aggregate_dimension(redisdb, aggregates.hotspot_dimension('merchant', 0.5))
+
+def test_update_aggregates_issues_a_bounded_number_of_commands_per_chunk():
+  rng = np.random.default_rng(0)
+  chunk = pd.DataFrame({
+    'trans_date_trans_time': [f'{d:02d}/06/2020 {h:02d}:00' for d, h in zip(rng.integers(1, 29, 700), rng.integers(0, 24, 700))],
+    'state': 'SC',
+    'category': 'travel',
+    'gender': 'F',
+    'amt': rng.exponential(50, 700),
+    'is_fraud': rng.integers(0, 2, 700),
+    'lat': rng.uniform(25, 49, 700),
+    'long': rng.uniform(-124, -67, 700),
+    'merch_lat': rng.uniform(25, 49, 700),
+    'merch_long': rng.uniform(-124, -67, 700),
+  })
+  redisdb = FakeRedis()
+  aggregates.update_aggregates(redisdb, chunk, hotspot_resolutions=aggregates.HOTSPOT_RESOLUTIONS)
+  # An HMGET and an HSET per hash, whatever the number of distinct values, plus the moments
+  hashes = 4 * (len(aggregates.AGGREGATE_DIMENSIONS) + 2 * len(aggregates.HOTSPOT_RESOLUTIONS)) + len(aggregates.SKETCH_COLUMNS)
+  assert redisdb.commands == 2 * hashes + len(aggregates.MOMENT_COLUMNS)
+  table = aggregates.read_aggregate_table(redisdb, aggregates.hotspot_dimension('merchant', 0.25))
+  assert (table['count_0'] + table['count_1']).sum() == 700
+  assert (table['amt_0'] + table['amt_1']).sum() == pytest.approx(chunk['amt'].sum())
+
+def test_summarize_hotspots():
+  table = pd.DataFrame({'count_0': [9, 0, 1], 'count_1': [3, 1, 3], 'amt_0': 0.0, 'amt_1': 0.0}, index=['172964', '0', '259199'])
+  assert [h['center'] for h in aggregates.summarize_hotspots(table, 0.5, 2)] == [[30.25, -97.75], [89.75, 179.75]]
+  by_rate = aggregates.summarize_hotspots(table, 0.5, 5, rank_by='fraud_rate', min_transactions=2)
+  assert by_rate == [
+    {'center': [89.75, 179.75], 'bounds': [[89.5, 179.5], [90.0, 180.0]], 'transactions': 4, 'frauds': 3, 'fraud_rate': 0.75},
+    {'center': [30.25, -97.75], 'bounds': [[30.0, -98.0], [30.5, -97.5]], 'transactions': 12, 'frauds': 3, 'fraud_rate': 0.25},
+  ]
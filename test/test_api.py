@@ -1,13 +1,19 @@
+import aggregates
 import api
+from columncache import ColumnCache
+import geocode
+import gzip
 from io import BytesIO
+import numpy as np
 import orjson
 import pandas as pd
 import pytest
-from services import OK_200, PLOTTING_DATA_COLS, RedisDb, REDIS_JOB_IDS_KEY, TRANSACTION_DATE_TIME_FORMAT
+from services import OK_200, PLOTTING_DATA_COLS, RedisDb, REDIS_JOB_IDS_KEY, TRANSACTION_DATE_TIME_FORMAT, plot_cache_key
 from typing import Any
-from unittest.mock import patch, MagicMock, Mock
+from unittest.mock import call, patch, MagicMock, Mock
 from werkzeug.exceptions import HTTPException
 import zipfile
+import zlib
 
 example_dataframe = pd.DataFrame({
     'trans_date_trans_time': ['21/06/2020 12:14'],
@@ -40,10 +46,48 @@ example_dataframe_byte_string = b'{"trans_date_trans_time":"21/06/2020 12:14","c
 def test_get_transaction_data_from_redis(mock_get_redis, mock_pipeline_data_out_of_redis):
   mock_get_redis.return_value = 'aredisinstance'
   mock_pipeline_data_out_of_redis.return_value = 'apipelinedataoutofredisreturnvalue'
-  assert api.get_transaction_data_from_redis() == 'apipelinedataoutofredisreturnvalue'
+  with api.app.test_request_context():
+    assert api.get_transaction_data_from_redis() == 'apipelinedataoutofredisreturnvalue'
   mock_get_redis.assert_called_once_with(RedisDb.TRANSACTION_DB)
   mock_pipeline_data_out_of_redis.assert_called_once_with('aredisinstance')
 
+@patch('api.abort', side_effect=Exception)
+def test_get_transaction_data_from_redis_aborts_on_bad_stream_format(mock_abort):
+  with api.app.test_request_context('?stream=xml'):
+    with pytest.raises(Exception):
+      api.get_transaction_data_from_redis()
+  mock_abort.assert_called_once_with(400, "Optional stream parameter must be one of ['ndjson', 'json'].")
+
+@pytest.mark.parametrize('stream_format,batches,expected_body,expected_mimetype', [
+  ('ndjson', [[b'{"a":1}', b'{"a":2}'], [b'{"a":3}']], b'{"a":1}\n{"a":2}\n{"a":3}\n', 'application/x-ndjson'),
+  ('json', [[b'{"a":1}', b'{"a":2}'], [], [b'{"a":3}']], b'[{"a":1},{"a":2},{"a":3}]', 'application/json'),
+  ('json', [], b'[]', 'application/json'),
+])
+def test_get_transaction_data_from_redis_streams_batches(stream_format, batches, expected_body, expected_mimetype):
+  with patch('api.get_redis') as mock_get_redis:
+    with patch('api.scan_raw_data_out_of_redis') as mock_scan_raw:
+      mock_scan_raw.return_value = iter(batches)
+      with api.app.test_request_context(f'?stream={stream_format}'):
+        response = api.get_transaction_data_from_redis()
+        assert response.mimetype == expected_mimetype
+        assert 'Content-Encoding' not in response.headers
+        assert b''.join(response.response) == expected_body
+      mock_scan_raw.assert_called_once_with(mock_get_redis.return_value)
+    mock_get_redis.assert_called_once_with(RedisDb.TRANSACTION_DB)
+
+@patch('api.scan_raw_data_out_of_redis')
+@patch('api.get_redis')
+def test_get_transaction_data_from_redis_gzips_stream_when_accepted(mock_get_redis, mock_scan_raw):
+  mock_scan_raw.return_value = iter([[b'{"a":1}'], [b'{"a":2}']])
+  with api.app.test_request_context('?stream=ndjson', headers={'Accept-Encoding': 'gzip'}):
+    response = api.get_transaction_data_from_redis()
+    assert response.headers['Content-Encoding'] == 'gzip'
+    chunks = list(response.response)
+  # Every batch is flushed, so it can be decompressed before the stream ends
+  decompressor = zlib.decompressobj(wbits=31)
+  assert decompressor.decompress(chunks[0]) == b'{"a":1}\n'
+  assert gzip.decompress(b''.join(chunks)) == b'{"a":1}\n{"a":2}\n'
+
 @patch.dict('os.environ', {}, clear=True)
 @patch('logging.error')
 def test_attempt_fetch_transaction_data_from_kaggle_fails_without_login_creds(mock_error):
@@ -146,6 +190,30 @@ def test_attempt_fetch_transaction_data_from_kaggle_succeeds_with_good_env(mock_
   mock_kaggle_api.authenticate.assert_called_once_with()
   mock_kaggle_api.datasets_download_file.assert_called_once_with('owner', 'dataset', 'filename', _preload_content=False)
 
+@patch.dict('os.environ', {
+    'KAGGLE_USERNAME': 'username',
+    'KAGGLE_KEY': 'ohlookafakekagglekey',
+    'KAGGLE_OWNER': 'owner',
+    'KAGGLE_DATASET': 'dataset',
+    'KAGGLE_FILENAME': 'filename',
+  }, clear=True)
+@patch('api.import_kaggle')
+def test_attempt_fetch_transaction_data_from_kaggle_streams_with_chunksize(mock_import_kaggle):
+  mock_kaggle_api = Mock()
+  mock_import_kaggle.return_value = lambda: mock_kaggle_api
+  csv_data = b",trans_date_trans_time,cc_num,merchant,category,amt,first,last,gender,street,city,state,zip,lat,long,city_pop,job,dob,trans_num,unix_time,merch_lat,merch_long,is_fraud\n0,21/06/2020 12:14,2.29116E+15,fraud_Kirlin and Sons,personal_care,2.86,Jeff,Elliott,M,351 Darlene Green,Columbia,SC,29209,33.9659,-80.9355,333497,Mechanical engineer,19/03/1968,2da90c7d74bd46a0caf3777415b3ebd3,1371816865,33.986391,-81.200714,0\n1,21/06/2020 12:14,2.29116E+15,fraud_Kirlin and Sons,personal_care,2.86,Jeff,Elliott,M,351 Darlene Green,Columbia,SC,29209,33.9659,-80.9355,333497,Mechanical engineer,19/03/1968,2da90c7d74bd46a0caf3777415b3ebd3,1371816865,33.986391,-81.200714,0"
+  buffer = BytesIO()
+  with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as zipf:
+    zipf.writestr('filename', csv_data)
+  mock_kaggle_download = Mock()
+  mock_kaggle_download.status = 200
+  mock_kaggle_download.data = buffer.getvalue()
+  mock_kaggle_api.datasets_download_file.return_value = mock_kaggle_download
+  chunks = list(api._attempt_fetch_transaction_data_from_kaggle(chunksize=1))
+  assert len(chunks) == 2
+  for chunk in chunks:
+    assert chunk.reset_index(drop=True).equals(example_dataframe)
+
 @pytest.mark.parametrize('bad_env', [
   {
     'FALLBACK_DATASET_PATH': '',
@@ -175,39 +243,210 @@ def test_attempt_read_transaction_data_from_disk_succeeds_with_good_env(mock_rea
 def test_load_transaction_data_into_redis_aborts_when_kaggle_and_disk_fail(mock_kaggle_fetch, mock_disk_read, mock_abort):
   mock_kaggle_fetch.return_value = None
   mock_disk_read.return_value = None
-  with pytest.raises(Exception):
-    api.load_transaction_data_into_redis()
-  mock_kaggle_fetch.assert_called_once_with()
-  mock_disk_read.assert_called_once_with()
+  with api.app.test_request_context():
+    with pytest.raises(Exception):
+      api.load_transaction_data_into_redis()
+  mock_kaggle_fetch.assert_called_once_with(chunksize=None)
+  mock_disk_read.assert_called_once_with(chunksize=None)
   mock_abort.assert_called_once_with(500, 'Unable to fetch data from Kaggle or from disk.')
 
 @patch('api.get_redis')
 @patch('api._attempt_fetch_transaction_data_from_kaggle')
-def test_load_transaction_data_into_redis_succeeds_with_kaggle(mock_kaggle_fetch, mock_get_redis):
+@patch('api.update_aggregates')
+@patch('api.index_chunk')
+def test_load_transaction_data_into_redis_succeeds_with_kaggle(mock_index_chunk, mock_update_aggregates, mock_kaggle_fetch, mock_get_redis):
   mock_kaggle_fetch.return_value = example_dataframe
   mock_redis = MagicMock()
   mock_pipe = Mock()
   mock_redis.pipeline.return_value.__enter__.return_value = mock_pipe
   mock_get_redis.return_value = mock_redis
-  assert api.load_transaction_data_into_redis() == OK_200
-  mock_get_redis.assert_called_once_with(RedisDb.TRANSACTION_DB)
+  with api.app.test_request_context():
+    assert api.load_transaction_data_into_redis() == OK_200
+  mock_get_redis.assert_any_call(RedisDb.TRANSACTION_DB)
+  mock_get_redis.assert_any_call(RedisDb.COLUMN_DB)
+  mock_get_redis.assert_any_call(RedisDb.CACHE_DB)
+  mock_get_redis.assert_any_call(RedisDb.AGGREGATE_DB)
+  mock_get_redis.assert_any_call(RedisDb.INDEX_DB)
+  assert mock_redis.flushdb.call_count == 4
+  assert mock_redis.incr.call_count == 2
   mock_redis.pipeline.assert_called_once_with()
   mock_pipe.set.assert_called_once_with(0, example_dataframe_byte_string)
+  mock_update_aggregates.assert_called_once_with(mock_redis, example_dataframe, hotspot_resolutions=aggregates.COARSE_HOTSPOT_RESOLUTIONS)
+  mock_index_chunk.assert_called_once_with(mock_redis, example_dataframe, 0)
 
 @patch('api.get_redis')
 @patch('api._attempt_read_transaction_data_from_disk')
 @patch('api._attempt_fetch_transaction_data_from_kaggle')
-def test_load_transaction_data_into_redis_uses_disk_as_backup(mock_kaggle_fetch, mock_disk_read, mock_get_redis):
+@patch('api.update_aggregates')
+@patch('api.index_chunk')
+def test_load_transaction_data_into_redis_uses_disk_as_backup(mock_index_chunk, mock_update_aggregates, mock_kaggle_fetch, mock_disk_read, mock_get_redis):
   mock_kaggle_fetch.return_value = None
   mock_disk_read.return_value = example_dataframe
   mock_redis = MagicMock()
   mock_pipe = Mock()
   mock_redis.pipeline.return_value.__enter__.return_value = mock_pipe
   mock_get_redis.return_value = mock_redis
-  assert api.load_transaction_data_into_redis() == OK_200
-  mock_get_redis.assert_called_once_with(RedisDb.TRANSACTION_DB)
+  with api.app.test_request_context():
+    assert api.load_transaction_data_into_redis() == OK_200
+  mock_get_redis.assert_any_call(RedisDb.TRANSACTION_DB)
+  mock_get_redis.assert_any_call(RedisDb.COLUMN_DB)
+  mock_get_redis.assert_any_call(RedisDb.CACHE_DB)
+  mock_get_redis.assert_any_call(RedisDb.AGGREGATE_DB)
+  mock_get_redis.assert_any_call(RedisDb.INDEX_DB)
+  assert mock_redis.flushdb.call_count == 4
+  assert mock_redis.incr.call_count == 2
   mock_redis.pipeline.assert_called_once_with()
   mock_pipe.set.assert_called_once_with(0, example_dataframe_byte_string)
+  mock_update_aggregates.assert_called_once_with(mock_redis, example_dataframe, hotspot_resolutions=aggregates.COARSE_HOTSPOT_RESOLUTIONS)
+  mock_index_chunk.assert_called_once_with(mock_redis, example_dataframe, 0)
+
+@patch.dict('os.environ', {'FINE_HOTSPOT_GRIDS': 'true'})
+@patch('api.get_redis')
+@patch('api.update_aggregates')
+@patch('api.index_chunk')
+def test_ingest_transaction_chunks_maintains_enabled_fine_hotspot_grids(mock_index_chunk, mock_update_aggregates, mock_get_redis):
+  api._ingest_transaction_chunks([example_dataframe])
+  mock_update_aggregates.assert_called_once_with(mock_get_redis.return_value, example_dataframe, hotspot_resolutions=aggregates.HOTSPOT_RESOLUTIONS)
+
+@patch('api._current_rss_mb')
+@patch('api.get_redis')
+@patch('api.update_aggregates')
+@patch('api.index_chunk')
+def test_ingest_transaction_chunks_reports_rss_growth_of_the_ingest(mock_index_chunk, mock_update_aggregates, mock_get_redis, mock_current_rss_mb):
+  mock_current_rss_mb.side_effect = [100.0, 130.04, 120.0, 110.0]
+  stats = api._ingest_transaction_chunks([example_dataframe, example_dataframe])
+  assert (stats['rss_before_mb'], stats['rss_after_mb'], stats['rss_growth_mb']) == (100.0, 110.0, 30.0)
+
+@patch('api._current_rss_mb')
+@patch('api.get_redis')
+@patch('api.update_aggregates')
+@patch('api.index_chunk')
+def test_ingest_transaction_chunks_reports_no_rss_where_it_cannot_be_read(mock_index_chunk, mock_update_aggregates, mock_get_redis, mock_current_rss_mb):
+  mock_current_rss_mb.return_value = None
+  stats = api._ingest_transaction_chunks([example_dataframe])
+  assert stats['rows'] == 1
+  assert (stats['rss_before_mb'], stats['rss_after_mb'], stats['rss_growth_mb']) == (None, None, None)
+
+def test_current_rss_mb():
+  rss = api._current_rss_mb()
+  assert rss is None or rss > 0
+
+@patch('api.get_redis')
+@patch('api.update_aggregates')
+@patch('api.index_chunk')
+def test_ingest_transaction_chunks_drops_rows_of_a_larger_dataset(mock_index_chunk, mock_update_aggregates, mock_get_redis):
+  dbs = {}
+  def get_redis(db):
+    if db not in dbs:
+      rows = {}
+      dbs[db] = MagicMock()
+      dbs[db].rows = rows
+      dbs[db].flushdb.side_effect = rows.clear
+      dbs[db].pipeline.return_value.__enter__.return_value.set.side_effect = rows.__setitem__
+    return dbs[db]
+  mock_get_redis.side_effect = get_redis
+  larger = pd.concat([example_dataframe] * 3, ignore_index=True)
+  assert api._ingest_transaction_chunks([larger])['rows'] == 3
+  assert sorted(dbs[RedisDb.TRANSACTION_DB].rows) == [0, 1, 2]
+  assert api._ingest_transaction_chunks([example_dataframe])['rows'] == 1
+  assert list(dbs[RedisDb.TRANSACTION_DB].rows) == [0]
+
+@patch.dict('os.environ', {
+    'FALLBACK_DATASET_PATH': 'a file.csv',
+  }, clear=True)
+@patch('pandas.read_csv')
+def test_attempt_read_transaction_data_from_disk_streams_with_chunksize(mock_read_csv):
+  mock_read_csv.return_value = 'achunkreader'
+  assert api._attempt_read_transaction_data_from_disk(chunksize=100) == 'achunkreader'
+  mock_read_csv.assert_called_once_with('a file.csv', sep=',', usecols=api._is_dataset_col, chunksize=100)
+
+def test_is_dataset_col():
+  assert not api._is_dataset_col('Unnamed: 0')
+  assert api._is_dataset_col('amt')
+
+@patch('api.get_warmup_queue')
+@patch('api.get_redis')
+@patch('api._attempt_fetch_transaction_data_from_kaggle')
+@patch('api.update_aggregates')
+@patch('api.index_chunk')
+def test_load_transaction_data_into_redis_queues_plot_warmup(mock_index_chunk, mock_update_aggregates, mock_kaggle_fetch, mock_get_redis, mock_get_warmup_queue):
+  mock_kaggle_fetch.return_value = example_dataframe
+  mock_get_redis.return_value = MagicMock()
+  mock_get_redis.return_value.get.return_value = b'8'
+  with api.app.test_request_context('?warm_plots=true'):
+    assert api.load_transaction_data_into_redis() == OK_200
+  mock_get_warmup_queue.return_value.put.assert_called_once_with(
+    *[{'graph_feature': feature, 'dataset_version': 8} for feature in PLOTTING_DATA_COLS])
+
+@patch('api.get_warmup_queue')
+@patch('api.get_redis')
+@patch('api._attempt_fetch_transaction_data_from_kaggle')
+@patch('api.update_aggregates')
+@patch('api.index_chunk')
+def test_load_transaction_data_into_redis_does_not_warm_plots_by_default(mock_index_chunk, mock_update_aggregates, mock_kaggle_fetch, mock_get_redis, mock_get_warmup_queue):
+  mock_kaggle_fetch.return_value = example_dataframe
+  with api.app.test_request_context():
+    assert api.load_transaction_data_into_redis() == OK_200
+  mock_get_warmup_queue.assert_not_called()
+
+@patch('api._attempt_fetch_transaction_data_from_kaggle')
+@patch('api.abort', side_effect=Exception)
+def test_load_transaction_data_into_redis_aborts_on_bad_warm_plots(mock_abort, mock_kaggle_fetch):
+  with api.app.test_request_context('?warm_plots=yes'):
+    with pytest.raises(Exception):
+      api.load_transaction_data_into_redis()
+  mock_abort.assert_called_once_with(400, 'Optional warm_plots parameter must be true or false.')
+  mock_kaggle_fetch.assert_not_called()
+
+@pytest.mark.parametrize('arg', ['?chunk_size=a', '?chunk_size=0', '?chunk_size=-5'])
+def test_load_transaction_data_into_redis_aborts_on_bad_chunk_size(arg: str):
+  with patch('api.abort', side_effect=Exception) as mock_abort:
+    with api.app.test_request_context(arg):
+      with pytest.raises(Exception):
+        api.load_transaction_data_into_redis()
+    mock_abort.assert_called_once_with(400, 'Optional chunk_size parameter must be a valid positive integer.')
+
+@patch('api.get_redis')
+@patch('api._attempt_read_transaction_data_from_disk')
+@patch('api._attempt_fetch_transaction_data_from_kaggle')
+@patch('api.update_aggregates')
+@patch('api.index_chunk')
+def test_load_transaction_data_into_redis_streams_chunks(mock_index_chunk, mock_update_aggregates, mock_kaggle_fetch, mock_disk_read, mock_get_redis):
+  second_row = example_dataframe.assign(amt=[5.0])
+  mock_kaggle_fetch.return_value = None
+  mock_disk_read.return_value = iter([example_dataframe, second_row])
+  mock_redis = MagicMock()
+  mock_pipe = Mock()
+  mock_redis.pipeline.return_value.__enter__.return_value = mock_pipe
+  mock_get_redis.return_value = mock_redis
+  with api.app.test_request_context('?chunk_size=1'):
+    stats = api.load_transaction_data_into_redis()
+  mock_kaggle_fetch.assert_called_once_with(chunksize=1)
+  mock_disk_read.assert_called_once_with(chunksize=1)
+  assert stats['rows'] == 2
+  assert stats.keys() == {'rows', 'seconds', 'rows_per_second', 'rss_before_mb', 'rss_after_mb', 'rss_growth_mb'}
+  assert mock_redis.pipeline.call_count == 2
+  assert mock_pipe.execute.call_count == 2
+  assert mock_pipe.set.call_args_list[0].args == (0, example_dataframe_byte_string)
+  assert mock_pipe.set.call_args_list[1].args[0] == 1
+  assert orjson.loads(mock_pipe.set.call_args_list[1].args[1])['amt'] == 5.0
+  assert mock_update_aggregates.call_count == 2
+  assert [c.args[2] for c in mock_index_chunk.call_args_list] == [0, 1]
+
+@patch.dict('os.environ', {'COLUMNAR_STORE': 'true'}, clear=True)
+@patch('api.append_columns')
+@patch('api.get_redis')
+@patch('api._attempt_fetch_transaction_data_from_kaggle')
+@patch('api.update_aggregates')
+@patch('api.index_chunk')
+def test_load_transaction_data_into_redis_appends_to_enabled_column_store(mock_index_chunk, mock_update_aggregates, mock_kaggle_fetch, mock_get_redis, mock_append_columns):
+  mock_kaggle_fetch.return_value = example_dataframe
+  mock_redis = MagicMock()
+  mock_get_redis.return_value = mock_redis
+  with api.app.test_request_context():
+    assert api.load_transaction_data_into_redis() == OK_200
+  mock_get_redis.assert_any_call(RedisDb.COLUMN_DB)
+  mock_append_columns.assert_called_once_with(mock_redis, example_dataframe)
 
 @patch('api.get_redis')
 def test_clear_transaction_data_succeeds(mock_get_redis):
@@ -215,8 +454,13 @@ def test_clear_transaction_data_succeeds(mock_get_redis):
   mock_redis.flushdb.return_value = True
   mock_get_redis.return_value = mock_redis
   assert api.clear_transaction_data() == OK_200
-  mock_get_redis.assert_called_once_with(RedisDb.TRANSACTION_DB)
-  mock_redis.flushdb.assert_called_once_with()
+  mock_get_redis.assert_any_call(RedisDb.TRANSACTION_DB)
+  mock_get_redis.assert_any_call(RedisDb.COLUMN_DB)
+  mock_get_redis.assert_any_call(RedisDb.CACHE_DB)
+  mock_get_redis.assert_any_call(RedisDb.AGGREGATE_DB)
+  mock_get_redis.assert_any_call(RedisDb.INDEX_DB)
+  assert mock_redis.flushdb.call_count == 4
+  mock_redis.incr.assert_called_once_with('dataset_version')
 
 @patch('api.abort', side_effect=Exception)
 @patch('api.get_redis')
@@ -234,12 +478,16 @@ def test_clear_transaction_data_calls_abort_on_failure(mock_get_redis, mock_abor
   ('?limit=a', 'Optional limit parameter must be a valid positive integer.', False),
   ('?offset=a', 'Optional offset parameter must be a valid nonnegative integer.', False),
   ('?offset=5000', 'Optional offset parameter must be less than the length of the dataset.', True),
-  ('?limit=0', 'Optional limit parameter must be greater than zero.', True),
+  ('?limit=0', 'Optional limit parameter must be greater than zero.', False),
+  ('?cursor=notacursor', 'Optional cursor parameter is invalid.', False),
+  ('?cursor=eyJvZmZzZXQiOi0xfQ==', 'Optional cursor parameter is invalid.', False),
+  ('?cursor=eyJvZmZzZXQiOjJ9&offset=2', 'Optional cursor parameter cannot be combined with the offset parameter.', False),
+  ('?fields=,', 'Optional fields parameter must be a comma separated list of field names.', False),
 ])
 def test_get_transaction_data_view_calls_abort_on_bad_args(badarg: str, abortmatcher: str, should_check_redis: bool):
   with patch('api.get_redis') as mock_get_redis:
     mock_redis = Mock()
-    mock_redis.dbsize.return_value = 10
+    mock_redis.mget.side_effect = lambda ids: [b'{}' if idx < 10 else None for idx in ids]
     mock_get_redis.return_value = mock_redis
     with patch('api.abort', side_effect=Exception) as mock_abort:
       with api.app.test_request_context(badarg):
@@ -248,25 +496,144 @@ def test_get_transaction_data_view_calls_abort_on_bad_args(badarg: str, abortmat
       mock_abort.assert_called_once_with(400, abortmatcher)
     if should_check_redis:
       mock_get_redis.assert_called_once_with(RedisDb.TRANSACTION_DB)
-      mock_redis.dbsize.assert_called_once_with()
+      mock_redis.mget.assert_called_once()
+    else:
+      mock_redis.mget.assert_not_called()
 
 @pytest.mark.parametrize('arg,expected_start_idx,expected_end_idx', [
   ('', 0, 5),
   ('?limit=2', 0, 2),
   ('?offset=2', 2, 7),
   ('?limit=3&offset=3', 3, 6),
+  ('?limit=20&offset=3', 3, 10),
+  (f'?limit=3&cursor={api._encode_view_cursor(3)}', 3, 6),
 ])
 def test_get_transaction_data_view_succeeds_with_good_args(arg: str, expected_start_idx: int, expected_end_idx: int):
   fake_data_rows = [{'fake data point': idx} for idx in range(10)]
   with patch('api.get_redis') as mock_get_redis:
     mock_redis = Mock()
-    mock_redis.dbsize.return_value = 10
-    mock_redis.get.side_effect = lambda idx: orjson.dumps(fake_data_rows[idx])
+    mock_redis.mget.side_effect = lambda ids: [orjson.dumps(fake_data_rows[idx]) if idx < 10 else None for idx in ids]
     mock_get_redis.return_value = mock_redis
     with api.app.test_request_context(arg):
-      assert api.get_transaction_data_view() == fake_data_rows[expected_start_idx:expected_end_idx]
-    for idx in range(expected_start_idx, expected_end_idx):
-      mock_redis.get.assert_any_call(idx)
+      response = api.get_transaction_data_view()
+    assert orjson.loads(response.get_data()) == fake_data_rows[expected_start_idx:expected_end_idx]
+    mock_redis.mget.assert_called_once()
+    mock_redis.get.assert_not_called()
+    mock_redis.dbsize.assert_not_called()
+
+@pytest.mark.parametrize('arg,expected_next_offset', [
+  ('?limit=4', 4),
+  ('?limit=4&offset=5', 9),
+  ('?limit=5&offset=5', None),
+  ('?limit=7&offset=5', None),
+])
+def test_get_transaction_data_view_returns_next_cursor_only_when_more_data_exists(arg: str, expected_next_offset: int):
+  with patch('api.get_redis') as mock_get_redis:
+    mock_get_redis.return_value.mget.side_effect = lambda ids: [b'{}' if idx < 10 else None for idx in ids]
+    with api.app.test_request_context(arg):
+      response = api.get_transaction_data_view()
+  if expected_next_offset is None:
+    assert 'X-Next-Cursor' not in response.headers
+  else:
+    assert api._decode_view_cursor(response.headers['X-Next-Cursor']) == expected_next_offset
+
+def test_view_cursor_roundtrip():
+  assert api._decode_view_cursor(api._encode_view_cursor(1234)) == 1234
+
+@patch('api.get_redis')
+def test_get_transaction_data_view_projects_fields(mock_get_redis):
+  mock_get_redis.return_value.mget.return_value = [
+    b'{"amt":1.0,"state":"TX","city":"Austin"}',
+    b'{"amt":2.0,"state":"CA","city":"Fresno"}',
+    None,
+  ]
+  with api.app.test_request_context('?limit=2&fields=amt,state,notafield'):
+    response = api.get_transaction_data_view()
+  assert orjson.loads(response.get_data()) == [{'amt': 1.0, 'state': 'TX'}, {'amt': 2.0, 'state': 'CA'}]
+
+@patch('api.query_row_ids')
+@patch('api.get_redis')
+def test_query_transaction_data_reads_only_matching_rows(mock_get_redis, mock_query_row_ids):
+  mock_query_row_ids.return_value = (42, [3, 10])
+  mock_get_redis.return_value.mget.return_value = [b'{"id":3}', b'{"id":10}']
+  with api.app.test_request_context('?state=TX,CA&is_fraud=1&min_amt=100.5&limit=2&offset=4'):
+    response = api.query_transaction_data()
+  mock_query_row_ids.assert_called_once_with(mock_get_redis.return_value, {'state': ['TX', 'CA'], 'is_fraud': ['1']}, {'amt': (100.5, None)}, 4, 2)
+  mock_get_redis.assert_any_call(RedisDb.INDEX_DB)
+  mock_get_redis.assert_any_call(RedisDb.TRANSACTION_DB)
+  mock_get_redis.return_value.mget.assert_called_once_with([3, 10])
+  assert orjson.loads(response.get_data()) == {'count': 42, 'transactions': [{'id': 3}, {'id': 10}]}
+
+@patch('api.query_row_ids')
+@patch('api.get_redis')
+def test_query_transaction_data_with_no_matches(mock_get_redis, mock_query_row_ids):
+  mock_query_row_ids.return_value = (0, [])
+  with api.app.test_request_context('?max_unix_time=5'):
+    response = api.query_transaction_data()
+  mock_query_row_ids.assert_called_once_with(mock_get_redis.return_value, {}, {'unix_time': (None, 5.0)}, 0, 100)
+  mock_get_redis.return_value.mget.assert_not_called()
+  assert orjson.loads(response.get_data()) == {'count': 0, 'transactions': []}
+
+@pytest.mark.parametrize('args,abortmatcher', [
+  ('', f'At least one filter parameter must be provided: {api.QUERY_FILTER_PARAMS}.'),
+  ('?state=TX&limit=0', 'Optional limit parameter must be a valid positive integer.'),
+  ('?state=TX&offset=a', 'Optional offset parameter must be a valid nonnegative integer.'),
+  ('?state=,', 'Optional state parameter must be a comma separated list of values.'),
+  ('?min_amt=lots', 'Optional min_amt parameter must be a valid number.'),
+])
+def test_query_transaction_data_aborts_on_bad_params(args: str, abortmatcher: str):
+  with patch('api.abort', side_effect=Exception) as mock_abort:
+    with patch('api.query_row_ids') as mock_query_row_ids:
+      with api.app.test_request_context(args):
+        with pytest.raises(Exception):
+          api.query_transaction_data()
+      mock_query_row_ids.assert_not_called()
+    mock_abort.assert_called_once_with(400, abortmatcher)
+
+@pytest.fixture(autouse=True)
+def no_column_cache(monkeypatch):
+  """Keeps AnalysisManager from serving columns cached by other tests."""
+  monkeypatch.setattr(api, '_column_cache', ColumnCache(0))
+
+@pytest.fixture
+def result_cache_miss():
+  """Runs an analytics route inside a request context with an empty result cache."""
+  with patch('api.get_redis') as mock_get_redis:
+    mock_get_redis.return_value.get.return_value = None
+    mock_get_redis.return_value.exists.return_value = 0
+    with api.app.test_request_context():
+      yield mock_get_redis
+
+def _scanned(records):
+  """Fakes api._scan_transaction_data by serving the records as a single scanned batch."""
+  return lambda cols, batch_size=None: iter([pd.DataFrame(records)] if records else [])
+
+def test_cached_result_serves_cache_hits_without_computing():
+  mock_route = Mock(return_value={'computed': 1})
+  with patch('api.get_redis') as mock_get_redis:
+    mock_get_redis.return_value.get.side_effect = lambda key: b'7' if key == 'dataset_version' else b'{"cached":2}'
+    with api.app.test_request_context('/a_route?b=2&a=1'):
+      assert api.cached_result(mock_route)() == {'cached': 2}
+    mock_get_redis.assert_called_with(RedisDb.CACHE_DB)
+    mock_get_redis.return_value.get.assert_called_with('result:7:/a_route:[["a","1"],["b","2"]]')
+  mock_route.assert_not_called()
+
+def test_cached_result_computes_and_stores_cache_misses():
+  mock_route = Mock(return_value={'computed': np.int64(1)})
+  with patch('api.get_redis') as mock_get_redis:
+    mock_get_redis.return_value.get.side_effect = lambda key: b'3' if key == 'dataset_version' else None
+    with api.app.test_request_context('/a_route'):
+      assert api.cached_result(mock_route)('anarg') == {'computed': 1}
+    mock_get_redis.return_value.set.assert_called_once_with('result:3:/a_route:[]', b'{"computed":1}', ex=api.RESULT_CACHE_TTL_SECONDS)
+  mock_route.assert_called_once_with('anarg')
+
+def test_cached_result_does_not_cache_aborts():
+  with patch('api.get_redis') as mock_get_redis:
+    mock_get_redis.return_value.get.return_value = None
+    with api.app.test_request_context('/a_route'):
+      with pytest.raises(HTTPException):
+        api.cached_result(lambda: api.abort(400, 'nope'))()
+    mock_get_redis.return_value.set.assert_not_called()
 
 def test_AnalysisManager_init():
   am = api.AnalysisManager(['required_col'])
@@ -274,19 +641,19 @@ def test_AnalysisManager_init():
 
 @pytest.mark.parametrize('data', [None, []])
 def test_AnalysisManager_enter_fails_on_bad_data(data):
-  with patch('api.get_transaction_data_from_redis') as mock_get_transaction_data_from_redis:
-    mock_get_transaction_data_from_redis.return_value = data
+  with patch('api._scan_transaction_data') as mock_scan_transaction_data:
+    mock_scan_transaction_data.side_effect = _scanned(data)
     with patch('api.abort', side_effect=Exception) as mock_abort:
       am = api.AnalysisManager(['col1', 'col2'])
       with pytest.raises(Exception):
         am.__enter__()
       mock_abort.assert_called_once_with(400, 'Data must be loaded into Redis before analysis can be performed.')
-    mock_get_transaction_data_from_redis.assert_called_once_with()
+    mock_scan_transaction_data.assert_called_once_with(['col1', 'col2'])
 
 @patch('api.abort', side_effect=Exception)
-@patch('api.get_transaction_data_from_redis')
-def test_AnalysisManager_enter_fails_on_missing_cols(mock_get_transaction_data_from_redis, mock_abort):
-  mock_get_transaction_data_from_redis.return_value = [
+@patch('api._scan_transaction_data')
+def test_AnalysisManager_enter_fails_on_missing_cols(mock_scan_transaction_data, mock_abort):
+  mock_scan_transaction_data.side_effect = _scanned([
     {
       'col1': 0,
     },
@@ -296,16 +663,16 @@ def test_AnalysisManager_enter_fails_on_missing_cols(mock_get_transaction_data_f
     {
       'col1': 2,
     },
-  ]
+  ])
   am = api.AnalysisManager(['col1', 'col2'])
   with pytest.raises(Exception):
     am.__enter__()
   mock_abort.assert_called_once_with(500, 'Required column col2 is missing from the dataset.')
-  mock_get_transaction_data_from_redis.assert_called_once_with()
+  mock_scan_transaction_data.assert_called_once_with(['col1', 'col2'])
 
-@patch('api.get_transaction_data_from_redis')
-def test_AnalysisManager_enter_drops_unused_cols_and_succeeds(mock_get_transaction_data_from_redis):
-  mock_get_transaction_data_from_redis.return_value = [
+@patch('api._scan_transaction_data')
+def test_AnalysisManager_enter_drops_unused_cols_and_succeeds(mock_scan_transaction_data):
+  mock_scan_transaction_data.side_effect = _scanned([
     {
       'col1': 0,
       'col2': 3,
@@ -321,12 +688,126 @@ def test_AnalysisManager_enter_drops_unused_cols_and_succeeds(mock_get_transacti
       'col2': 5,
       'col3': 8,
     },
-  ]
+  ])
   am = api.AnalysisManager(['col1', 'col2'])
   df = am.__enter__()
-  mock_get_transaction_data_from_redis.assert_called_once_with()
+  mock_scan_transaction_data.assert_called_once_with(['col1', 'col2'])
   assert (df.columns == ['col1', 'col2']).all()
 
+@patch.dict('os.environ', {'COLUMNAR_STORE': 'true'}, clear=True)
+@patch('api.read_columns')
+@patch('api.read_column_store_meta')
+@patch('api._scan_transaction_data')
+@patch('api.get_redis')
+def test_AnalysisManager_enter_reads_only_required_cols_from_column_store(mock_get_redis, mock_scan_transaction_data, mock_read_meta, mock_read_columns):
+  mock_get_redis.return_value = 'acolumndb'
+  mock_read_meta.return_value = {'columns': ['col1', 'col2', 'col3'], 'segment_rows': [3]}
+  mock_read_columns.return_value = pd.DataFrame({'col1': [0, 1, 2], 'col2': [3, 4, 5]})
+  am = api.AnalysisManager(['col1', 'col2'])
+  assert am.__enter__().equals(mock_read_columns.return_value)
+  mock_get_redis.assert_called_with(RedisDb.COLUMN_DB)
+  mock_read_columns.assert_called_once_with('acolumndb', ['col1', 'col2'], meta=mock_read_meta.return_value)
+  mock_scan_transaction_data.assert_not_called()
+
+@patch.dict('os.environ', {'COLUMNAR_STORE': 'true'}, clear=True)
+@patch('api.abort', side_effect=Exception)
+@patch('api.read_column_store_meta')
+@patch('api.get_redis')
+def test_AnalysisManager_enter_fails_on_missing_cols_in_column_store(mock_get_redis, mock_read_meta, mock_abort):
+  mock_read_meta.return_value = {'columns': ['col1'], 'segment_rows': [3]}
+  am = api.AnalysisManager(['col1', 'col2'])
+  with pytest.raises(Exception):
+    am.__enter__()
+  mock_abort.assert_called_once_with(500, 'Required column col2 is missing from the dataset.')
+
+@patch.dict('os.environ', {'COLUMNAR_STORE': 'true'}, clear=True)
+@patch('api.read_column_store_meta')
+@patch('api._scan_transaction_data')
+@patch('api.get_redis')
+def test_AnalysisManager_enter_falls_back_to_rows_when_column_store_is_empty(mock_get_redis, mock_scan_transaction_data, mock_read_meta):
+  mock_read_meta.return_value = None
+  mock_scan_transaction_data.side_effect = _scanned([{'col1': 0, 'col2': 1}])
+  am = api.AnalysisManager(['col1'])
+  df = am.__enter__()
+  assert (df.columns == ['col1']).all()
+  mock_scan_transaction_data.assert_called_once_with(['col1'])
+
+def test_get_column_cache_creates_the_cache_once(monkeypatch):
+  monkeypatch.setattr(api, '_column_cache', None)
+  monkeypatch.setenv('COLUMN_CACHE_MB', '2')
+  cache = api.get_column_cache()
+  assert cache.budget_bytes == 2 * 1024 * 1024
+  assert api.get_column_cache() is cache
+
+def test_get_column_cache_fails_on_invalid_budget(monkeypatch):
+  monkeypatch.setattr(api, '_column_cache', None)
+  monkeypatch.setenv('COLUMN_CACHE_MB', 'lots')
+  with pytest.raises(Exception, match='COLUMN_CACHE_MB must be a non-negative integer number of megabytes.'):
+    api.get_column_cache()
+
+@patch('api._scan_transaction_data')
+@patch('api.get_redis')
+def test_AnalysisManager_enter_serves_cached_cols_and_loads_only_missing_ones(mock_get_redis, mock_scan_transaction_data, monkeypatch):
+  monkeypatch.setattr(api, '_column_cache', ColumnCache(1024 * 1024))
+  mock_get_redis.return_value.get.return_value = b'3'
+  mock_scan_transaction_data.side_effect = _scanned([{'col1': 0, 'col2': 1, 'col3': 2}, {'col1': 3, 'col2': 4, 'col3': 5}])
+  with api.AnalysisManager(['col1', 'col2']) as df:
+    assert df.to_dict('list') == {'col1': [0, 3], 'col2': [1, 4]}
+    df.loc[0, 'col1'] = 100
+  with api.AnalysisManager(['col2', 'col1']) as df:
+    assert df.to_dict('list') == {'col2': [1, 4], 'col1': [0, 3]}
+  with api.AnalysisManager(['col1', 'col3']) as df:
+    assert df.to_dict('list') == {'col1': [0, 3], 'col3': [2, 5]}
+  assert [c.args[0] for c in mock_scan_transaction_data.call_args_list] == [['col1', 'col2'], ['col3']]
+  mock_get_redis.assert_any_call(RedisDb.CACHE_DB)
+
+@patch('api._scan_transaction_data')
+@patch('api.get_redis')
+def test_AnalysisManager_enter_reloads_all_cols_when_loaded_ones_do_not_line_up(mock_get_redis, mock_scan_transaction_data, monkeypatch):
+  monkeypatch.setattr(api, '_column_cache', ColumnCache(1024 * 1024))
+  mock_get_redis.return_value.get.return_value = b'3'
+  mock_scan_transaction_data.side_effect = _scanned([{'col1': 0}, {'col1': 3}])
+  with api.AnalysisManager(['col1']) as df:
+    assert df['col1'].tolist() == [0, 3]
+  scans = iter([[{'col2': 4}], [{'col1': 6, 'col2': 7}]])
+  mock_scan_transaction_data.side_effect = lambda cols, batch_size=None: iter([pd.DataFrame(next(scans))])
+  with api.AnalysisManager(['col1', 'col2']) as df:
+    assert df.to_dict('list') == {'col1': [6], 'col2': [7]}
+  assert [c.args[0] for c in mock_scan_transaction_data.call_args_list] == [['col1'], ['col2'], ['col1', 'col2']]
+
+@patch('api._scan_transaction_data')
+@patch('api.get_redis')
+def test_AnalysisManager_enter_does_not_cache_cols_loaded_while_the_dataset_changed(mock_get_redis, mock_scan_transaction_data, monkeypatch):
+  monkeypatch.setattr(api, '_column_cache', ColumnCache(1024 * 1024))
+  mock_get_redis.return_value.get.side_effect = [b'3', b'4', b'4', b'4']
+  mock_scan_transaction_data.side_effect = _scanned([{'col1': 0}])
+  with api.AnalysisManager(['col1']) as df:
+    assert df['col1'].tolist() == [0]
+  assert not api._column_cache.get(3, ['col1'])
+  with api.AnalysisManager(['col1']) as df:
+    assert df['col1'].tolist() == [0]
+  assert api._column_cache.get(4, ['col1'])
+
+@patch('api._scan_transaction_data')
+@patch('api.get_redis')
+def test_AnalysisManager_enter_reloads_cols_after_dataset_changes(mock_get_redis, mock_scan_transaction_data, monkeypatch):
+  monkeypatch.setattr(api, '_column_cache', ColumnCache(1024 * 1024))
+  mock_get_redis.return_value.get.return_value = b'3'
+  mock_scan_transaction_data.side_effect = _scanned([{'col1': 0}])
+  with api.AnalysisManager(['col1']) as df:
+    assert df['col1'].tolist() == [0]
+  mock_get_redis.return_value.get.return_value = b'5'
+  mock_scan_transaction_data.side_effect = _scanned([{'col1': 7}])
+  with api.AnalysisManager(['col1']) as df:
+    assert df['col1'].tolist() == [7]
+  assert mock_scan_transaction_data.call_count == 2
+
+@patch('api._scan_transaction_data')
+def test_AnalysisManager_enter_loads_compact_dtypes(mock_scan_transaction_data):
+  mock_scan_transaction_data.side_effect = _scanned([{'state': 'SC', 'is_fraud': 0, 'trans_date_trans_time': '21/06/2020 12:14'}])
+  with api.AnalysisManager(['state', 'is_fraud', 'trans_date_trans_time']) as df:
+    assert df.dtypes.astype(str).to_dict() == {'state': 'category', 'is_fraud': 'int8', 'trans_date_trans_time': 'datetime64[ns]'}
+
 def test_AnalysisManager_exit_propagates_HTTPExceptions():
   am = api.AnalysisManager(['col1', 'col2'])
   ex_type = HTTPException
@@ -345,9 +826,10 @@ def test_AnalysisManager_exit_aborts_on_all_other_exceptions(exception: Exceptio
       am.__exit__(type(exception), exception, None)
     mock_abort.assert_called_once_with(500, 'Error computing statistics.')
 
-@patch('api.get_transaction_data_from_redis')
-def test_amt_analysis(mock_get_transaction_data_from_redis):
-  mock_get_transaction_data_from_redis.return_value = [
+@pytest.mark.usefixtures('result_cache_miss')
+@patch('api._scan_transaction_data')
+def test_amt_analysis(mock_scan_transaction_data):
+  mock_scan_transaction_data.side_effect = _scanned([
     {'amt': 1},
     {'amt': 2},
     {'amt': 3},
@@ -357,7 +839,24 @@ def test_amt_analysis(mock_get_transaction_data_from_redis):
     {'amt': 7},
     {'amt': 8},
     {'amt': 9},
-  ]
+  ])
+  assert api.amt_analysis() == {
+    '25%': 3.0,
+    '50%': 5.0,
+    '75%': 7.0,
+    'count': 9.0,
+    'max': 9.0,
+    'mean': 5.0,
+    'min': 1.0,
+    'std': 2.7386127875258306,
+  }
+
+@patch('api.read_moments')
+@patch('api._scan_transaction_data')
+def test_amt_analysis_uses_maintained_moments(mock_scan_transaction_data, mock_read_moments, result_cache_miss):
+  result_cache_miss.return_value.exists.return_value = 1
+  mock_read_moments.return_value = {'n': 9, 'mean': 5.0, 'm2': 60.0, 'min': 1.0, 'max': 9.0}
+  mock_scan_transaction_data.side_effect = _scanned([{'amt': float(a)} for a in range(1, 10)])
   assert api.amt_analysis() == {
     '25%': 3.0,
     '50%': 5.0,
@@ -368,10 +867,60 @@ def test_amt_analysis(mock_get_transaction_data_from_redis):
     'min': 1.0,
     'std': 2.7386127875258306,
   }
+  result_cache_miss.assert_any_call(RedisDb.AGGREGATE_DB)
+  mock_read_moments.assert_called_once_with(result_cache_miss.return_value, 'amt')
+
+@patch('api.read_sketch')
+@patch('api.read_moments')
+@patch('api._scan_transaction_data')
+def test_amt_analysis_approx_uses_maintained_sketch(mock_scan_transaction_data, mock_read_moments, mock_read_sketch, result_cache_miss):
+  result_cache_miss.return_value.exists.return_value = 1
+  values = np.arange(1.0, 10.0)
+  mock_read_moments.return_value = aggregates.compute_moments(values)
+  mock_read_sketch.return_value = aggregates.compute_sketch(values)
+  with api.app.test_request_context('?mode=approx'):
+    result = api.amt_analysis()
+  mock_scan_transaction_data.assert_not_called()
+  mock_read_sketch.assert_called_once_with(result_cache_miss.return_value, 'amt')
+  assert result['count'] == 9.0
+  assert result['std'] == pytest.approx(2.7386127875258306)
+  for q, exact in [('25%', 3.0), ('50%', 5.0), ('75%', 7.0)]:
+    assert result[q] == pytest.approx(exact, rel=aggregates.SKETCH_RELATIVE_ACCURACY)
 
-@patch('api.get_transaction_data_from_redis')
-def test_compute_correlation(mock_get_transaction_data_from_redis):
-  mock_get_transaction_data_from_redis.return_value = [
+@pytest.mark.usefixtures('result_cache_miss')
+@patch('api._scan_transaction_data')
+def test_amt_analysis_approx_streams_when_no_aggregates(mock_scan_transaction_data):
+  mock_scan_transaction_data.return_value = iter([pd.DataFrame({'amt': [1.0, 2.0, 3.0, 4.0]}), pd.DataFrame({'amt': [5.0, 6.0, 7.0, 8.0, 9.0]})])
+  with api.app.test_request_context('?mode=approx'):
+    result = api.amt_analysis()
+  mock_scan_transaction_data.assert_called_once_with(['amt'])
+  assert result['count'] == 9.0
+  assert result['mean'] == pytest.approx(5.0)
+  assert result['min'] == 1.0 and result['max'] == 9.0
+  assert result['50%'] == pytest.approx(5.0, rel=aggregates.SKETCH_RELATIVE_ACCURACY)
+
+@pytest.mark.usefixtures('result_cache_miss')
+@patch('api.abort', side_effect=Exception)
+@patch('api._scan_transaction_data')
+def test_amt_analysis_approx_aborts_without_data(mock_scan_transaction_data, mock_abort):
+  mock_scan_transaction_data.return_value = iter([])
+  with api.app.test_request_context('?mode=approx'):
+    with pytest.raises(Exception):
+      api.amt_analysis()
+  mock_abort.assert_called_once_with(400, 'Data must be loaded into Redis before analysis can be performed.')
+
+@pytest.mark.usefixtures('result_cache_miss')
+@patch('api.abort', side_effect=Exception)
+def test_amt_analysis_aborts_on_bad_mode(mock_abort):
+  with api.app.test_request_context('?mode=fast'):
+    with pytest.raises(Exception):
+      api.amt_analysis()
+  mock_abort.assert_called_once_with(400, "Optional mode parameter must be one of ['exact', 'approx'].")
+
+@pytest.mark.usefixtures('result_cache_miss')
+@patch('api._scan_transaction_data')
+def test_compute_correlation(mock_scan_transaction_data):
+  mock_scan_transaction_data.side_effect = _scanned([
     {'amt': 1, 'is_fraud': 0},
     {'amt': 2, 'is_fraud': 0},
     {'amt': 3, 'is_fraud': 0},
@@ -381,7 +930,7 @@ def test_compute_correlation(mock_get_transaction_data_from_redis):
     {'amt': 7, 'is_fraud': 0},
     {'amt': 8, 'is_fraud': 0},
     {'amt': 9, 'is_fraud': 0},
-  ]
+  ])
   result: dict[str, dict[str, float]] = api.compute_correlation()
   assert result.keys() == {'amt', 'is_fraud'}
   assert result['amt'].keys() == {'amt', 'is_fraud'}
@@ -391,92 +940,133 @@ def test_compute_correlation(mock_get_transaction_data_from_redis):
   assert isinstance(result['is_fraud']['amt'], float)
   assert isinstance(result['is_fraud']['is_fraud'], float)
 
+@pytest.mark.usefixtures('result_cache_miss')
+@patch('api._scan_transaction_data')
+def test_correlation_merges_comoments_across_chunks(mock_scan_transaction_data):
+  df = pd.DataFrame({'amt': [1.0, 5.0, 2.0, 8.0, 3.0, np.nan], 'city_pop': [10, 40, 20, 30, 60, 70], 'is_fraud': [0, 1, 0, 1, 0, 1]})
+  mock_scan_transaction_data.return_value = iter([df.iloc[:2], df.iloc[2:]])
+  with api.app.test_request_context('?columns=amt,city_pop,is_fraud'):
+    result = api.compute_correlation_matrix()
+  expected = df.dropna()
+  assert result['n'] == 5
+  for col in df.columns:
+    for row in df.columns:
+      assert result['covariance'][col][row] == pytest.approx(expected.cov()[col][row])
+      assert result['correlation'][col][row] == pytest.approx(expected.corr()[col][row])
+  mock_scan_transaction_data.assert_called_once_with(['amt', 'city_pop', 'is_fraud'], batch_size=api.STREAM_BATCH_SIZE)
+
+@pytest.mark.usefixtures('result_cache_miss')
+@patch('api._scan_transaction_data')
+def test_correlation_defaults_to_all_numeric_columns_with_null_for_undefined(mock_scan_transaction_data):
+  mock_scan_transaction_data.side_effect = _scanned([{col: 1 for col in api.NUMERIC_COLUMNS}, {col: 1 for col in api.NUMERIC_COLUMNS}])
+  result = api.compute_correlation_matrix()
+  assert result['n'] == 2
+  assert result['covariance']['amt']['amt'] == 0.0
+  assert result['correlation']['amt']['is_fraud'] is None
+  mock_scan_transaction_data.assert_called_once_with(api.NUMERIC_COLUMNS, batch_size=api.STREAM_BATCH_SIZE)
+
+@pytest.mark.usefixtures('result_cache_miss')
+@pytest.mark.parametrize('columns', ['amt,state', 'amt,nope', ','])
+@patch('api.abort', side_effect=Exception)
+def test_correlation_aborts_on_bad_columns(mock_abort, columns: str):
+  with api.app.test_request_context(f'?columns={columns}'):
+    with pytest.raises(Exception):
+      api.compute_correlation_matrix()
+  mock_abort.assert_called_once_with(400, f'Optional columns parameter must be a comma separated list of columns in {api.NUMERIC_COLUMNS}.')
+
+def _fake_json_response(fake_json: Any) -> Mock:
+  response = Mock(status_code=200)
+  response.json.return_value = fake_json
+  return response
+
 fraudulent_zipcode_test_data = [
-  {'zip': 11111, 'is_fraud': 0},
-  {'zip': 22222, 'is_fraud': 1},
-  {'zip': 33333, 'is_fraud': 0},
-  {'zip': 44444, 'is_fraud': 0},
-  {'zip': 55555, 'is_fraud': 0},
-  {'zip': 11111, 'is_fraud': 0},
-  {'zip': 22222, 'is_fraud': 1},
-  {'zip': 33333, 'is_fraud': 1},
-  {'zip': 44444, 'is_fraud': 0},
-  {'zip': 55555, 'is_fraud': 0},
+  {'zip': 11111, 'lat': 10.0, 'long': -100.0, 'is_fraud': 0},
+  {'zip': 22222, 'lat': 20.0, 'long': -80.0, 'is_fraud': 1},
+  {'zip': 33333, 'lat': 30.0, 'long': -100.0, 'is_fraud': 0},
+  {'zip': 44444, 'lat': 40.0, 'long': -100.0, 'is_fraud': 0},
+  {'zip': 55555, 'lat': 50.0, 'long': -100.0, 'is_fraud': 0},
+  {'zip': 11111, 'lat': 10.0, 'long': -100.0, 'is_fraud': 0},
+  {'zip': 22222, 'lat': 20.5, 'long': -80.25, 'is_fraud': 1},
+  {'zip': 33333, 'lat': 30.0, 'long': -100.0, 'is_fraud': 1},
+  {'zip': 44444, 'lat': 40.0, 'long': -100.0, 'is_fraud': 0},
+  {'zip': 55555, 'lat': 50.0, 'long': -100.0, 'is_fraud': 0},
 ]
+# The same transactions without coordinates, so the location of 22222 has to be geocoded
+uncoordinated_zipcode_test_data = [{**record, 'lat': None, 'long': None} for record in fraudulent_zipcode_test_data]
+
+@pytest.mark.usefixtures('result_cache_miss')
+@patch('api.fetch_location')
+@patch('api.get_bing_api_key')
+@patch('api._scan_transaction_data')
+def test_fraudulent_zipcode_info_uses_dataset_coordinates(mock_scan_transaction_data, mock_get_bing_api_key, mock_fetch_location):
+  mock_scan_transaction_data.side_effect = _scanned(fraudulent_zipcode_test_data)
+  assert api.fraudulent_zipcode_info() == {
+    'most_fraudulent_zipcode': '22222',
+    'fraud_count': 2,
+    'latitude': 20.25,
+    'longitude': -80.125,
+    'Google Maps Link': 'https://www.google.com/maps/search/?api=1&query=20.25,-80.125'
+  }
+  mock_get_bing_api_key.assert_not_called()
+  mock_fetch_location.assert_not_called()
+
+@patch('api.fetch_location')
+@patch('api._scan_transaction_data')
+def test_fraudulent_zipcode_info_uses_cached_location(mock_scan_transaction_data, mock_fetch_location, result_cache_miss):
+  mock_scan_transaction_data.side_effect = _scanned(uncoordinated_zipcode_test_data)
+  result_cache_miss.return_value.get.side_effect = lambda key: b'1.5,-2.5' if key == 'geocode:22222' else None
+  result = api.fraudulent_zipcode_info()
+  assert (result['latitude'], result['longitude']) == (1.5, -2.5)
+  mock_fetch_location.assert_not_called()
 
+@pytest.mark.usefixtures('result_cache_miss')
 @patch('api.abort', side_effect=Exception)
+@patch('api._scan_transaction_data')
 @patch('api.get_bing_api_key', side_effect=Exception)
-def test_fraudulent_zipcode_info_fails_without_bing_api_key(mock_get_bing_api_key, mock_abort):
+def test_fraudulent_zipcode_info_fails_without_bing_api_key(mock_get_bing_api_key, mock_scan_transaction_data, mock_abort):
+  mock_scan_transaction_data.side_effect = _scanned(uncoordinated_zipcode_test_data)
   with pytest.raises(Exception):
     api.fraudulent_zipcode_info()
   mock_get_bing_api_key.assert_called_once_with()
   mock_abort.assert_called_once_with(500, 'Error fetching bing api key.')
 
+@pytest.mark.usefixtures('result_cache_miss')
 @patch('api.abort', side_effect=Exception)
-@patch('requests.get', side_effect=Exception)
-@patch('api.get_transaction_data_from_redis')
+@patch('api.fetch_location', side_effect=Exception)
+@patch('api._scan_transaction_data')
 @patch('api.get_bing_api_key')
-def test_fraudulent_zipcode_info_fails_when_requests_get_fails(
-  mock_get_bing_api_key, mock_get_transaction_data_from_redis, mock_requests_get, mock_abort):
+def test_fraudulent_zipcode_info_fails_when_fetching_location_fails(
+  mock_get_bing_api_key, mock_scan_transaction_data, mock_fetch_location, mock_abort):
   mock_get_bing_api_key.return_value = 'afakeapikey'
-  mock_get_transaction_data_from_redis.return_value = fraudulent_zipcode_test_data
+  mock_scan_transaction_data.side_effect = _scanned(uncoordinated_zipcode_test_data)
   with pytest.raises(Exception):
     api.fraudulent_zipcode_info()
   mock_get_bing_api_key.assert_called_once_with()
-  mock_requests_get.assert_called_once_with('http://dev.virtualearth.net/REST/v1/Locations/US/22222', params={'key': 'afakeapikey'})
+  mock_fetch_location.assert_called_once_with('22222', 'afakeapikey')
   mock_abort.assert_called_once_with(500, 'Error fetching location.')
 
-def _fake_json_response(fake_json: Any) -> Mock:
-  response = Mock(status_code=200)
-  response.json.return_value = fake_json
-  return response
+@pytest.mark.usefixtures('result_cache_miss')
+@patch('api.abort', side_effect=Exception)
+@patch('api.fetch_location')
+@patch('api._scan_transaction_data')
+@patch('api.get_bing_api_key')
+def test_fraudulent_zipcode_info_fails_when_response_cannot_parse(
+  mock_get_bing_api_key, mock_scan_transaction_data, mock_fetch_location, mock_abort):
+  mock_get_bing_api_key.return_value = 'afakeapikey'
+  mock_scan_transaction_data.side_effect = _scanned(uncoordinated_zipcode_test_data)
+  mock_fetch_location.return_value = Mock(status_code=500)
+  with pytest.raises(Exception):
+    api.fraudulent_zipcode_info()
+  mock_abort.assert_called_once_with(500, 'Error parsing virtualearth response.')
 
-@pytest.mark.parametrize('response', [
-  None,
-  Mock(status_code=0),
-  Mock(status_code=200),
-  _fake_json_response(None),
-  _fake_json_response({}),
-  _fake_json_response({'resourceSets': 7}),
-  _fake_json_response({'resourceSets': []}),
-  _fake_json_response({'resourceSets': {}}),
-  _fake_json_response({'resourceSets': [{}]}),
-  _fake_json_response({'resourceSets': [{'resources': 'rip'}]}),
-  _fake_json_response({'resourceSets': [{'resources': []}]}),
-  _fake_json_response({'resourceSets': [{'resources': [None]}]}),
-  _fake_json_response({'resourceSets': [{'resources': [{}]}]}),
-  _fake_json_response({'resourceSets': [{'resources': [{'point': False}]}]}),
-  _fake_json_response({'resourceSets': [{'resources': [{'point': {}}]}]}),
-  _fake_json_response({'resourceSets': [{'resources': [{'point': {'coordinates': 5}}]}]}),
-  _fake_json_response({'resourceSets': [{'resources': [{'point': {'coordinates': None}}]}]}),
-  _fake_json_response({'resourceSets': [{'resources': [{'point': {'coordinates': [0.0]}}]}]}),
-  _fake_json_response({'resourceSets': [{'resources': [{'point': {'coordinates': [0.0, 1.0, 2.0]}}]}]}),
-  _fake_json_response({'resourceSets': [{'resources': [{'point': {'coordinates': [-90.0, 200.0]}}]}]}),
-  _fake_json_response({'resourceSets': [{'resources': [{'point': {'coordinates': [-100.0, 90.0]}}]}]}),
-  _fake_json_response({'resourceSets': [{'resources': [{'point': {'coordinates': [-10.0, 200.0]}}]}]}),
-  _fake_json_response({'resourceSets': [{'resources': [{'point': {'coordinates': [-90, 90]}}]}]}),
-])
-def test_fraudulent_zipcode_info_fails_when_response_cannot_parse(response):
-  with patch('api.get_bing_api_key') as mock_get_bing_api_key:
-    mock_get_bing_api_key.return_value = 'afakeapikey'
-    with patch('api.get_transaction_data_from_redis') as mock_get_transaction_data_from_redis:
-      mock_get_transaction_data_from_redis.return_value = fraudulent_zipcode_test_data
-      with patch('requests.get') as mock_requests_get:
-        mock_requests_get.return_value = response
-        with patch('api.abort', side_effect=Exception) as mock_abort:
-          with pytest.raises(Exception):
-            api.fraudulent_zipcode_info()
-          mock_abort.assert_called_once_with(500, 'Error parsing virtualearth response.')
-        mock_requests_get.assert_called_once_with('http://dev.virtualearth.net/REST/v1/Locations/US/22222', params={'key': 'afakeapikey'})
-    mock_get_bing_api_key.assert_called_once_with()
-
-@patch('requests.get')
-@patch('api.get_transaction_data_from_redis')
+@patch('api.fetch_location')
+@patch('api._scan_transaction_data')
 @patch('api.get_bing_api_key')
-def test_fraudulent_zipcode_info_succeeds_with_valid_api_key_data_and_response(mock_get_bing_api_key, mock_get_transaction_data_from_redis, mock_requests_get):
+def test_fraudulent_zipcode_info_geocodes_and_caches_zipcodes_without_coordinates(
+  mock_get_bing_api_key, mock_scan_transaction_data, mock_fetch_location, result_cache_miss):
   mock_get_bing_api_key.return_value = 'afakeapikey'
-  mock_get_transaction_data_from_redis.return_value = fraudulent_zipcode_test_data
-  mock_requests_get.return_value = _fake_json_response({'resourceSets': [{'resources': [{'point': {'coordinates': [0.0, 0.0]}}]}]})
+  mock_scan_transaction_data.side_effect = _scanned(uncoordinated_zipcode_test_data)
+  mock_fetch_location.return_value = _fake_json_response({'resourceSets': [{'resources': [{'point': {'coordinates': [0.0, 0.0]}}]}]})
   assert api.fraudulent_zipcode_info() == {
     'most_fraudulent_zipcode': '22222',
     'fraud_count': 2,
@@ -484,12 +1074,13 @@ def test_fraudulent_zipcode_info_succeeds_with_valid_api_key_data_and_response(m
     'longitude': 0.0,
     'Google Maps Link': 'https://www.google.com/maps/search/?api=1&query=0.0,0.0'
   }
-  mock_get_bing_api_key.assert_called_once_with()
-  mock_requests_get.assert_called_once_with('http://dev.virtualearth.net/REST/v1/Locations/US/22222', params={'key': 'afakeapikey'})
+  mock_fetch_location.assert_called_once_with('22222', 'afakeapikey')
+  result_cache_miss.return_value.set.assert_any_call('geocode:22222', '0.0,0.0', ex=geocode.GEOCODE_CACHE_TTL_SECONDS)
 
-@patch('api.get_transaction_data_from_redis')
-def test_fraud_by_state(mock_get_transaction_data_from_redis):
-  mock_get_transaction_data_from_redis.return_value = [
+@pytest.mark.usefixtures('result_cache_miss')
+@patch('api._scan_transaction_data')
+def test_fraud_by_state(mock_scan_transaction_data):
+  mock_scan_transaction_data.side_effect = _scanned([
     {'state': 'AZ', 'is_fraud': 0},
     {'state': 'AL', 'is_fraud': 1},
     {'state': 'SC', 'is_fraud': 0},
@@ -501,7 +1092,7 @@ def test_fraud_by_state(mock_get_transaction_data_from_redis):
     {'state': 'NY', 'is_fraud': 0},
     {'state': 'NJ', 'is_fraud': 1},
     {'state': 'TX', 'is_fraud': 0},
-  ]
+  ])
   assert api.fraud_by_state() == {
     'AL': 1,
     'CA': 1,
@@ -509,6 +1100,189 @@ def test_fraud_by_state(mock_get_transaction_data_from_redis):
     'NJ': 1,
   }
 
+@patch('api.read_counts')
+@patch('api._scan_transaction_data')
+def test_fraud_by_state_uses_maintained_counts(mock_scan_transaction_data, mock_read_counts, result_cache_miss):
+  result_cache_miss.return_value.exists.return_value = 1
+  mock_read_counts.return_value = {'AL': 1, 'IA': 2}
+  assert api.fraud_by_state() == {'AL': 1, 'IA': 2}
+  mock_read_counts.assert_called_once_with(result_cache_miss.return_value, 'state', 1)
+  mock_scan_transaction_data.assert_not_called()
+
+@patch('api.read_aggregate_table')
+@patch('api._scan_transaction_data')
+def test_fraud_rate_uses_maintained_rollups(mock_scan_transaction_data, mock_read_aggregate_table, result_cache_miss):
+  result_cache_miss.return_value.exists.return_value = 1
+  mock_read_aggregate_table.return_value = pd.DataFrame(
+    {'count_0': [3, 1], 'count_1': [1, 0], 'amt_0': [10.0, 5.0], 'amt_1': [90.0, 0.0]},
+    index=['2020-06-21 13:00', '2020-06-21 12:00'])
+  with api.app.test_request_context('?bucket=hour&start=2020-06-21T12:00&end=2020-06-21T14:00'):
+    assert api.fraud_rate() == [
+      {'bucket': '2020-06-21 12:00', 'transactions': 1, 'frauds': 0, 'fraud_rate': 0.0, 'amt': 5.0},
+      {'bucket': '2020-06-21 13:00', 'transactions': 4, 'frauds': 1, 'fraud_rate': 0.25, 'amt': 100.0},
+    ]
+  mock_read_aggregate_table.assert_called_once_with(result_cache_miss.return_value, 'trans_hour')
+  mock_scan_transaction_data.assert_not_called()
+
+@pytest.mark.usefixtures('result_cache_miss')
+@patch('api._scan_transaction_data')
+def test_fraud_rate_computes_rollups_without_aggregates(mock_scan_transaction_data):
+  mock_scan_transaction_data.side_effect = _scanned([
+    {'trans_date_trans_time': '21/06/2020 12:14', 'amt': 2.0, 'is_fraud': 0},
+    {'trans_date_trans_time': '21/06/2020 12:15', 'amt': 8.0, 'is_fraud': 1},
+    {'trans_date_trans_time': '03/07/2020 00:03', 'amt': 5.0, 'is_fraud': 0},
+  ])
+  with api.app.test_request_context('?bucket=month'):
+    assert api.fraud_rate() == [
+      {'bucket': '2020-06', 'transactions': 2, 'frauds': 1, 'fraud_rate': 0.5, 'amt': 10.0},
+      {'bucket': '2020-07', 'transactions': 1, 'frauds': 0, 'fraud_rate': 0.0, 'amt': 5.0},
+    ]
+
+@patch('api.read_aggregate_table')
+def test_fraud_rate_converts_timezones_to_utc(mock_read_aggregate_table, result_cache_miss):
+  result_cache_miss.return_value.exists.return_value = 1
+  mock_read_aggregate_table.return_value = pd.DataFrame(
+    {'count_0': [3, 1], 'count_1': [1, 0], 'amt_0': [10.0, 5.0], 'amt_1': [90.0, 0.0]},
+    index=['2020-06-21 13:00', '2020-06-21 12:00'])
+  with api.app.test_request_context('?bucket=hour&start=2020-06-21T15:00%2B02:00&end=2020-06-21T14:00Z'):
+    assert api.fraud_rate() == [
+      {'bucket': '2020-06-21 13:00', 'transactions': 4, 'frauds': 1, 'fraud_rate': 0.25, 'amt': 100.0},
+    ]
+
+@pytest.mark.usefixtures('result_cache_miss')
+@pytest.mark.parametrize('args,abortmatcher', [
+  ('?bucket=week', "Optional bucket parameter must be one of ['hour', 'day', 'month']."),
+  ('?start=yesterday', 'Optional start parameter must be an ISO 8601 date or date time, e.g. 2020-06-21 or 2020-06-21T12:00.'),
+  ('?end=2020-13-01', 'Optional end parameter must be an ISO 8601 date or date time, e.g. 2020-06-21 or 2020-06-21T12:00.'),
+  ('?start=', 'Optional start parameter must be an ISO 8601 date or date time, e.g. 2020-06-21 or 2020-06-21T12:00.'),
+])
+def test_fraud_rate_aborts_on_bad_params(args: str, abortmatcher: str):
+  with patch('api.abort', side_effect=Exception) as mock_abort:
+    with api.app.test_request_context(args):
+      with pytest.raises(Exception):
+        api.fraud_rate()
+    mock_abort.assert_called_once_with(400, abortmatcher)
+
+@patch('api.read_aggregate_table')
+@patch('api._scan_transaction_data')
+def test_fraud_hotspots_uses_maintained_grids(mock_scan_transaction_data, mock_read_aggregate_table, result_cache_miss):
+  result_cache_miss.return_value.exists.return_value = 1
+  mock_read_aggregate_table.return_value = pd.DataFrame(
+    {'count_0': [9, 0, 1], 'count_1': [3, 1, 3], 'amt_0': 0.0, 'amt_1': 0.0}, index=['691528', '0', '1036799'])
+  with api.app.test_request_context('?location=merchant&resolution=0.25&top=1'):
+    assert api.fraud_hotspots() == [
+      {'center': [30.125, -97.875], 'bounds': [[30.0, -98.0], [30.25, -97.75]], 'transactions': 12, 'frauds': 3, 'fraud_rate': 0.25},
+    ]
+  mock_read_aggregate_table.assert_called_once_with(result_cache_miss.return_value, 'hotspot:merchant:0.25')
+  mock_scan_transaction_data.assert_not_called()
+
+@patch('api.read_aggregate_table')
+@patch('api._scan_transaction_data')
+def test_fraud_hotspots_bins_coordinates_of_grids_not_maintained_at_ingest(mock_scan_transaction_data, mock_read_aggregate_table, result_cache_miss):
+  # The aggregates were maintained, without the fine grids
+  result_cache_miss.return_value.exists.side_effect = lambda *keys: int(keys == ('moments:amt',))
+  mock_scan_transaction_data.side_effect = _scanned([
+    {'merch_lat': 30.1, 'merch_long': -97.8, 'amt': 2.0, 'is_fraud': 1},
+    {'merch_lat': 30.2, 'merch_long': -97.7, 'amt': 8.0, 'is_fraud': 0},
+  ])
+  with api.app.test_request_context('?location=merchant&resolution=0.25'):
+    assert api.fraud_hotspots() == [
+      {'center': [30.125, -97.875], 'bounds': [[30.0, -98.0], [30.25, -97.75]], 'transactions': 1, 'frauds': 1, 'fraud_rate': 1.0},
+      {'center': [30.125, -97.625], 'bounds': [[30.0, -97.75], [30.25, -97.5]], 'transactions': 1, 'frauds': 0, 'fraud_rate': 0.0},
+    ]
+  result_cache_miss.return_value.exists.assert_any_call('count:hotspot:merchant:0.25:0', 'count:hotspot:merchant:0.25:1')
+  mock_read_aggregate_table.assert_not_called()
+
+@pytest.mark.usefixtures('result_cache_miss')
+@patch('api._scan_transaction_data')
+def test_fraud_hotspots_bins_coordinates_without_aggregates(mock_scan_transaction_data):
+  mock_scan_transaction_data.side_effect = _scanned([
+    {'lat': 30.2, 'long': -97.7, 'amt': 2.0, 'is_fraud': 1},
+    {'lat': 30.4, 'long': -97.6, 'amt': 8.0, 'is_fraud': 0},
+    {'lat': 41.0, 'long': -74.1, 'amt': 5.0, 'is_fraud': 1},
+    {'lat': 41.1, 'long': -74.2, 'amt': 5.0, 'is_fraud': 1},
+  ])
+  with api.app.test_request_context('?rank_by=fraud_rate'):
+    assert api.fraud_hotspots() == [
+      {'center': [41.25, -74.25], 'bounds': [[41.0, -74.5], [41.5, -74.0]], 'transactions': 2, 'frauds': 2, 'fraud_rate': 1.0},
+      {'center': [30.25, -97.75], 'bounds': [[30.0, -98.0], [30.5, -97.5]], 'transactions': 2, 'frauds': 1, 'fraud_rate': 0.5},
+    ]
+  mock_scan_transaction_data.assert_called_once_with(['lat', 'long', 'amt', 'is_fraud'])
+
+@pytest.mark.usefixtures('result_cache_miss')
+@pytest.mark.parametrize('args,abortmatcher', [
+  ('?location=home', "Optional location parameter must be one of ['customer', 'merchant']."),
+  ('?resolution=fine', 'Optional resolution parameter must be a valid number.'),
+  ('?resolution=0.3', 'Optional resolution parameter must be one of [1.0, 0.5, 0.25].'),
+  ('?top=0', 'Optional top parameter must be a valid positive integer.'),
+  ('?rank_by=amt', "Optional rank_by parameter must be one of ['frauds', 'fraud_rate']."),
+  ('?min_transactions=-1', 'Optional min_transactions parameter must be a valid nonnegative integer.'),
+])
+def test_fraud_hotspots_aborts_on_bad_params(args: str, abortmatcher: str):
+  with patch('api.abort', side_effect=Exception) as mock_abort:
+    with api.app.test_request_context(args):
+      with pytest.raises(Exception):
+        api.fraud_hotspots()
+    mock_abort.assert_called_once_with(400, abortmatcher)
+
+@pytest.mark.usefixtures('result_cache_miss')
+@patch('api._scan_transaction_data')
+def test_aggregate_merges_partials_across_chunks(mock_scan_transaction_data):
+  mock_scan_transaction_data.return_value = iter([
+    pd.DataFrame({'state': ['TX', 'CA', 'TX'], 'amt': [10.0, 20.0, 30.0], 'is_fraud': [1, 0, 0]}),
+    pd.DataFrame({'state': ['CA', 'TX', 'NY'], 'amt': [40.0, 500.0, 1.0], 'is_fraud': [1, 1, 0]}),
+  ])
+  with api.app.test_request_context('?group_by=state&metrics=count,fraud_rate,sum:amt,mean:amt&filter=amt:lt:100'):
+    assert api.aggregate() == [
+      {'state': 'CA', 'count': 2, 'fraud_rate': 0.5, 'sum_amt': 60.0, 'mean_amt': 30.0},
+      {'state': 'NY', 'count': 1, 'fraud_rate': 0.0, 'sum_amt': 1.0, 'mean_amt': 1.0},
+      {'state': 'TX', 'count': 2, 'fraud_rate': 0.5, 'sum_amt': 40.0, 'mean_amt': 20.0},
+    ]
+  mock_scan_transaction_data.assert_called_once_with(['state', 'amt', 'is_fraud'], batch_size=api.STREAM_BATCH_SIZE)
+
+@pytest.mark.usefixtures('result_cache_miss')
+@patch('api._scan_transaction_data')
+def test_aggregate_defaults_to_count_of_everything(mock_scan_transaction_data):
+  mock_scan_transaction_data.side_effect = _scanned([{'is_fraud': 0}, {'is_fraud': 1}])
+  with api.app.test_request_context():
+    assert api.aggregate() == [{'count': 2}]
+
+@pytest.mark.usefixtures('result_cache_miss')
+@patch.dict('os.environ', {'COLUMNAR_STORE': 'true'}, clear=True)
+@patch('api.iter_column_segments')
+@patch('api.read_column_store_meta')
+@patch('api._scan_transaction_data')
+def test_aggregate_streams_column_store_segments(mock_scan_transaction_data, mock_read_meta, mock_iter_column_segments):
+  mock_read_meta.return_value = {'columns': ['trans_date_trans_time', 'is_fraud'], 'segment_rows': [1, 2]}
+  mock_iter_column_segments.return_value = iter([
+    pd.DataFrame({'trans_date_trans_time': ['21/06/2020 12:14'], 'is_fraud': [1]}),
+    pd.DataFrame({'trans_date_trans_time': ['30/06/2020 12:14', '01/07/2020 00:03'], 'is_fraud': [0, 0]}),
+  ])
+  with api.app.test_request_context('?group_by=trans_month&metrics=fraud_rate'):
+    assert api.aggregate() == [
+      {'trans_month': '2020-06', 'fraud_rate': 0.5},
+      {'trans_month': '2020-07', 'fraud_rate': 0.0},
+    ]
+  assert mock_iter_column_segments.call_args.args[1] == ['trans_date_trans_time', 'is_fraud']
+  mock_scan_transaction_data.assert_not_called()
+
+@pytest.mark.usefixtures('result_cache_miss')
+@pytest.mark.parametrize('args,abortcode,abortmatcher', [
+  ('?group_by=amt', 400, f'Optional group_by parameter must be a comma separated list of columns in {api.GROUPABLE_COLUMNS}.'),
+  ('?metrics=median:amt', 400, "Metric median:amt must be one of ['count', 'sum', 'mean', 'fraud_rate'], e.g. count, fraud_rate, sum:amt or mean:amt."),
+  ('?filter=amt:like:5', 400, "Filter amt:like:5 must use an op in ['eq', 'ne', 'in', 'lt', 'le', 'gt', 'ge']."),
+  ('?filter=zip:ge:5', 500, 'Required column zip is missing from the dataset.'),
+  ('?filter=is_fraud:eq:2', 400, 'Data must be loaded into Redis before analysis can be performed.'),
+])
+def test_aggregate_aborts(args: str, abortcode: int, abortmatcher: str):
+  records = [] if 'is_fraud' in args else [{'is_fraud': 0}]
+  with patch('api._scan_transaction_data', side_effect=_scanned(records)):
+    with patch('api.abort', side_effect=Exception) as mock_abort:
+      with api.app.test_request_context(args):
+        with pytest.raises(Exception):
+          api.aggregate()
+      mock_abort.assert_called_once_with(abortcode, abortmatcher)
+
 @patch('api.get_redis')
 def test_get_all_existing_job_ids(mock_get_redis):
   job_ids = [b'0', b'1', b'2', b'3', b'4', b'5']
@@ -564,17 +1338,37 @@ def test_post_job_fails_with_appropriate_error_message_on_bad_input(json: Any, e
 def test_post_job_succeeds_on_valid_graph_feature_input(mock_uuid, mock_get_redis, mock_get_queue):
   mock_uuid.return_value = 'oohanid'
   mock_redis = Mock()
+  mock_redis.get.side_effect = lambda key: b'3' if key == 'dataset_version' else None
   mock_queue = Mock()
   mock_get_redis.return_value = mock_redis
   mock_get_queue.return_value = mock_queue
   with api.app.test_request_context(content_type='application/json', json={'graph_feature': 'gender'}):
     assert api.post_job() == {'job_id': 'oohanid'}
   mock_get_redis.assert_any_call(RedisDb.JOB_DB)
+  mock_redis.get.assert_called_with(plot_cache_key('gender', 3))
   mock_redis.set.assert_called_once_with('oohanid', b'{"status":"queued","graph_feature":"gender"}')
   mock_redis.rpush.assert_called_once_with(REDIS_JOB_IDS_KEY, 'oohanid')
   mock_get_queue.assert_called_once_with()
   mock_queue.put.assert_called_once_with('oohanid')
 
+@patch('api.get_queue')
+@patch('api.get_redis')
+@patch('api.uuid4')
+def test_post_job_completes_graph_feature_job_from_plot_cache(mock_uuid, mock_get_redis, mock_get_queue):
+  mock_uuid.return_value = 'oohanid'
+  mock_redis = Mock()
+  mock_redis.get.side_effect = lambda key: b'3' if key == 'dataset_version' else {plot_cache_key('gender', 3): b'a png'}.get(key)
+  mock_get_redis.return_value = mock_redis
+  with api.app.test_request_context(content_type='application/json', json={'graph_feature': 'gender'}):
+    assert api.post_job() == {'job_id': 'oohanid'}
+  mock_get_redis.assert_any_call(RedisDb.JOB_RESULTS_DB)
+  assert mock_redis.set.call_args_list == [
+    call('oohanid', b'a png'),
+    call('oohanid', b'{"status":"completed","graph_feature":"gender"}'),
+  ]
+  mock_redis.rpush.assert_called_once_with(REDIS_JOB_IDS_KEY, 'oohanid')
+  mock_get_queue.assert_not_called()
+
 @patch('api.get_queue')
 @patch('api.get_redis')
 @patch('api.uuid4')
@@ -602,6 +1396,66 @@ def test_post_job_succeeds_on_valid_transactions_input(mock_uuid, mock_get_redis
   mock_get_queue.assert_called_once_with()
   mock_queue.put.assert_called_once_with('oohanid')
 
+PREDICT_TRANSACTION = {
+  'trans_date_trans_time': '21/06/2020 12:16',
+  'merchant': 'amerchant',
+  'category': 'acategory',
+  'amt': 1.23,
+  'lat': 4.56,
+  'long': 7.89,
+  'job': 'painter',
+  'merch_lat': 7.0,
+  'merch_long': 7.0,
+}
+
+@pytest.mark.parametrize('json,error_message', [
+  (None, 'JSON data params must be an object with a single key: "transactions".'),
+  (['transactions'], 'JSON data params must be an object with a single key: "transactions".'),
+  ({'graph_feature': 'gender'}, 'JSON data params must be an object with a single key: "transactions".'),
+  ({'transactions': [PREDICT_TRANSACTION], 'k': 'v'}, 'JSON data params must be an object with a single key: "transactions".'),
+  ({'transactions': 5}, 'JSON param "transactions" must be a non-empty list of transactions.'),
+  ({'transactions': []}, 'JSON param "transactions" must be a non-empty list of transactions.'),
+  ({'transactions': [{**PREDICT_TRANSACTION, 'amt': '1.23'}]}, 'JSON param "transactions" has object with key amt of incorrect type. (Should be <class \'float\'>).'),
+])
+@patch('api.get_predict_batcher')
+def test_predict_fails_with_appropriate_error_message_on_bad_input(mock_get_predict_batcher, json: Any, error_message: str):
+  with api.app.test_request_context(content_type='application/json', json=json):
+    with patch('api.abort', side_effect=Exception) as mock_abort:
+      with pytest.raises(Exception):
+        api.predict()
+      mock_abort.assert_called_once_with(400, error_message)
+  mock_get_predict_batcher.assert_not_called()
+
+@patch('api.get_predict_batcher')
+def test_predict_runs_transactions_through_the_batcher(mock_get_predict_batcher):
+  mock_get_predict_batcher.return_value.run.return_value = [0.0, 1.0]
+  with api.app.test_request_context(content_type='application/json', json={'transactions': [PREDICT_TRANSACTION] * 2}):
+    assert api.predict() == [0.0, 1.0]
+  mock_get_predict_batcher.return_value.run.assert_called_once_with([PREDICT_TRANSACTION] * 2, timeout=api.PREDICT_TIMEOUT_SECONDS)
+
+@pytest.mark.parametrize('failure', [ImportError('No module named torch'), TimeoutError()])
+@patch('api.get_predict_batcher')
+def test_predict_fails_with_503_when_the_model_cannot_run(mock_get_predict_batcher, failure: Exception):
+  mock_get_predict_batcher.return_value.run.side_effect = failure
+  with api.app.test_request_context(content_type='application/json', json={'transactions': [PREDICT_TRANSACTION]}):
+    with patch('api.abort', side_effect=Exception) as mock_abort:
+      with pytest.raises(Exception):
+        api.predict()
+      mock_abort.assert_called_once_with(503, 'Model inference is currently unavailable.')
+
+@patch('api.MicroBatcher')
+@patch('inference.InferenceEngine')
+def test_get_predict_batcher_loads_the_model_once(mock_inference_engine, mock_micro_batcher, monkeypatch):
+  monkeypatch.setattr(api, '_predict_batcher', None)
+  with patch.dict('os.environ', {'PREDICT_MAX_BATCH_SIZE': '32', 'PREDICT_MAX_WAIT_MS': '5', 'INFERENCE_MODE': 'eager'}):
+    assert api.get_predict_batcher() is mock_micro_batcher.return_value
+    assert api.get_predict_batcher() is mock_micro_batcher.return_value
+  mock_inference_engine.assert_called_once_with(mode='eager')
+  run_batch, max_batch_size, max_wait = mock_micro_batcher.call_args.args
+  assert (max_batch_size, max_wait) == (32, 0.005)
+  run_batch([PREDICT_TRANSACTION])
+  mock_inference_engine.return_value.predict.assert_called_once_with([[21, 6, 2020, 6, 12, 16, 'amerchant', 'acategory', 1.23, 4.56, 7.89, 'painter', 7.0, 7.0]])
+
 @patch('api.abort', side_effect=Exception)
 @patch('api.get_redis')
 def test_get_job_information_fails_on_invalid_jobid(mock_get_redis, mock_abort):
@@ -0,0 +1,52 @@
+from columncache import ColumnCache
+import pandas as pd
+
+def _column(n: int) -> pd.Series:
+  return pd.Series(range(n), dtype='int64')
+
+def test_disabled_cache_stores_nothing():
+  cache = ColumnCache(0)
+  assert not cache.enabled
+  cache.put(1, 'amt', _column(10))
+  assert cache.get(1, ['amt']) == {}
+
+def test_get_returns_only_cached_cols_of_the_version():
+  cache = ColumnCache(1024)
+  amt = _column(10)
+  cache.put(1, 'amt', amt)
+  assert cache.get(1, ['amt', 'state']) == {'amt': amt}
+  assert cache.get(2, ['amt']) == {}
+  assert cache.nbytes == 80
+
+def test_newer_version_drops_older_columns_and_older_puts_are_ignored():
+  cache = ColumnCache(1024)
+  cache.put(1, 'amt', _column(10))
+  cache.put(2, 'state', _column(10))
+  assert cache.get(1, ['amt']) == {}
+  assert cache.get(2, ['amt']) == {}
+  cache.put(1, 'amt', _column(10))
+  assert cache.get(2, ['amt']) == {}
+  assert cache.nbytes == 80
+
+def test_least_recently_used_cols_are_evicted_to_stay_within_budget():
+  cache = ColumnCache(200)
+  cache.put(1, 'a', _column(10))
+  cache.put(1, 'b', _column(10))
+  cache.get(1, ['a'])
+  cache.put(1, 'c', _column(10))
+  assert cache.get(1, ['a', 'b', 'c']).keys() == {'a', 'c'}
+  assert cache.nbytes == 160
+
+def test_cols_larger_than_the_budget_are_not_cached():
+  cache = ColumnCache(100)
+  cache.put(1, 'a', _column(10))
+  cache.put(1, 'b', _column(100))
+  assert cache.get(1, ['a', 'b']).keys() == {'a'}
+
+def test_replacing_a_col_updates_its_size():
+  cache = ColumnCache(1024)
+  cache.put(1, 'a', _column(10))
+  cache.put(1, 'a', _column(5))
+  assert cache.nbytes == 40
+  cache.clear()
+  assert cache.nbytes == 0 and cache.get(1, ['a']) == {}
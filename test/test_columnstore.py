@@ -0,0 +1,93 @@
+import columnstore
+import numpy as np
+import pandas as pd
+import pytest
+
+class FakeRedis:
+  """A minimal in-memory stand-in for the handful of Redis commands the column store uses."""
+  def __init__(self):
+    self.data = {}
+    self.mget_calls = 0
+
+  def get(self, key):
+    return self.data.get(key)
+
+  def set(self, key, value):
+    self.data[key] = value
+
+  def mget(self, keys):
+    self.mget_calls += 1
+    return [self.data.get(k) for k in keys]
+
+  def pipeline(self):
+    return self
+
+  def execute(self):
+    pass
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *_):
+    return False
+
+example_chunk = pd.DataFrame({
+  'amt': [2.86, 29.84, 41.28],
+  'state': ['SC', 'UT', None],
+  'is_fraud': [0, 1, 0],
+  'unix_time': [1371816865, 1371816873, 1371816893],
+})
+
+@pytest.mark.parametrize('values', [
+  pd.Series([1.5, -2.25, 3.0]),
+  pd.Series([1, 2, 3], dtype='int64'),
+  pd.Series([1, 0, 1], dtype='int8'),
+  pd.Series([True, False, True]),
+])
+def test_encode_decode_numeric_segment_roundtrip(values: pd.Series):
+  decoded = columnstore.decode_segment(columnstore.encode_segment(values))
+  assert decoded.dtype == values.dtype
+  assert (decoded == values.to_numpy()).all()
+
+def test_encode_decode_string_segment_roundtrip_with_missing_values():
+  values = pd.Series(['TX', 'CA', 'TX', None, 'NY'])
+  decoded = columnstore.decode_segment(columnstore.encode_segment(values))
+  assert decoded.tolist() == ['TX', 'CA', 'TX', None, 'NY']
+
+def test_read_column_store_meta_handles_empty_store():
+  assert columnstore.read_column_store_meta(FakeRedis()) is None
+
+def test_read_columns_handles_empty_store():
+  df = columnstore.read_columns(FakeRedis(), ['amt'])
+  assert df.empty
+  assert df.columns.tolist() == ['amt']
+
+def test_append_columns_splits_chunks_into_segments(monkeypatch):
+  monkeypatch.setattr(columnstore, 'COLUMN_SEGMENT_ROWS', 2)
+  redis = FakeRedis()
+  columnstore.append_columns(redis, example_chunk)
+  columnstore.append_columns(redis, example_chunk)
+  assert columnstore.read_column_store_meta(redis) == {
+    'columns': ['amt', 'state', 'is_fraud', 'unix_time'],
+    'segment_rows': [2, 1, 2, 1],
+  }
+  assert 'amt:3' in redis.data
+  assert 'amt:4' not in redis.data
+
+def test_read_columns_reads_only_requested_columns_in_one_roundtrip(monkeypatch):
+  monkeypatch.setattr(columnstore, 'COLUMN_SEGMENT_ROWS', 2)
+  redis = FakeRedis()
+  columnstore.append_columns(redis, example_chunk)
+  df = columnstore.read_columns(redis, ['state', 'amt'])
+  assert redis.mget_calls == 1
+  assert df.columns.tolist() == ['state', 'amt']
+  assert df['state'].tolist() == ['SC', 'UT', None]
+  assert np.allclose(df['amt'], example_chunk['amt'])
+
+def test_iter_column_segments_yields_one_frame_per_segment(monkeypatch):
+  monkeypatch.setattr(columnstore, 'COLUMN_SEGMENT_ROWS', 2)
+  redis = FakeRedis()
+  columnstore.append_columns(redis, example_chunk)
+  segments = list(columnstore.iter_column_segments(redis, ['is_fraud']))
+  assert [s['is_fraud'].tolist() for s in segments] == [[0, 1], [0]]
+  assert redis.mget_calls == 2
@@ -0,0 +1,68 @@
+from export import INFERENCE_MODES, FoldedFraudDetectionModel, export_model, fold_model
+from input_vectorization import NUMERIC_SIZE
+from ml_model import EmbeddingFraudDetectionModel
+import pytest
+import torch
+
+NUM_MERCHANTS, NUM_CATEGORIES, NUM_JOBS = 20, 5, 10
+
+@pytest.fixture
+def model() -> EmbeddingFraudDetectionModel:
+  torch.manual_seed(0)
+  model = EmbeddingFraudDetectionModel(NUM_MERCHANTS, NUM_CATEGORIES, NUM_JOBS)
+  with torch.no_grad():
+    model.mean.uniform_(0, 100)
+    model.std.uniform_(1, 10)
+    # A column that was constant in the training data
+    model.mean[2] = 2020.0
+    model.std[2] = 1e-8
+    for bn in [model.bn1, model.bn2]:
+      bn.weight.uniform_(0.5, 2)
+      bn.bias.uniform_(-1, 1)
+      bn.running_mean.uniform_(-1, 1)
+      bn.running_var.uniform_(0.5, 2)
+  return model.eval()
+
+@pytest.fixture
+def inputs() -> tuple[torch.Tensor, torch.Tensor]:
+  generator = torch.Generator().manual_seed(1)
+  numerics = torch.rand(256, NUMERIC_SIZE, generator=generator) * 100
+  numerics[:, 2] = 2020.0
+  indices = torch.stack([
+    torch.randint(0, n + 1, (256,), generator=generator) for n in [NUM_MERCHANTS, NUM_CATEGORIES, NUM_JOBS]
+  ], dim=1)
+  return numerics, indices
+
+def _predict(model: torch.nn.Module, inputs: tuple[torch.Tensor, torch.Tensor]) -> torch.Tensor:
+  with torch.no_grad():
+    return model(*inputs).squeeze(1)
+
+def test_fold_model_makes_the_same_predictions(model: EmbeddingFraudDetectionModel, inputs):
+  folded = fold_model(model)
+  assert isinstance(folded, FoldedFraudDetectionModel)
+  assert not folded.training
+  assert _predict(folded, inputs).tolist() == pytest.approx(_predict(model, inputs).tolist(), abs=1e-5)
+
+def test_fold_model_keeps_unknown_values_at_zero(model: EmbeddingFraudDetectionModel):
+  folded = fold_model(model)
+  unknown_rows = folded.offsets + torch.tensor([NUM_MERCHANTS, NUM_CATEGORIES, NUM_JOBS])
+  assert not folded.embeddings.weight[unknown_rows].any()
+
+def test_export_model_in_eager_mode_returns_the_model(model: EmbeddingFraudDetectionModel):
+  assert export_model(model, 'eager') is model
+
+def test_export_model_to_torchscript_makes_the_same_predictions(model: EmbeddingFraudDetectionModel, inputs, tmp_path):
+  exported = export_model(model, 'torchscript')
+  assert isinstance(exported, torch.jit.ScriptModule)
+  assert _predict(exported, inputs).tolist() == pytest.approx(_predict(model, inputs).tolist(), abs=1e-5)
+  torch.jit.save(exported, tmp_path / 'model.pt')
+  assert _predict(torch.jit.load(tmp_path / 'model.pt'), inputs).tolist() == pytest.approx(_predict(model, inputs).tolist(), abs=1e-5)
+
+def test_export_model_to_int8_stays_close_to_the_model(model: EmbeddingFraudDetectionModel, inputs):
+  exported = export_model(model, 'int8')
+  assert isinstance(exported, torch.jit.ScriptModule)
+  assert _predict(exported, inputs).tolist() == pytest.approx(_predict(model, inputs).tolist(), abs=0.05)
+
+def test_export_model_fails_on_unknown_modes(model: EmbeddingFraudDetectionModel):
+  with pytest.raises(ValueError, match='Inference mode fp16 must be one of'):
+    export_model(model, 'fp16')
@@ -0,0 +1,78 @@
+import geocode
+import pandas as pd
+import pytest
+from typing import Any
+from unittest.mock import Mock, patch
+
+def _fake_json_response(fake_json: Any) -> Mock:
+  response = Mock(status_code=200)
+  response.json.return_value = fake_json
+  return response
+
+def test_local_zip_centroid():
+  df = pd.DataFrame({
+    'zip': pd.Series([11111, 22222, 22222, 22222], dtype='int32'),
+    'lat': pd.Series([1.0, 20.1, 20.2, None], dtype='float32'),
+    'long': pd.Series([2.0, -80.0, -80.5, None], dtype='float32'),
+  })
+  assert geocode.local_zip_centroid(df, '22222') == (20.15, -80.25)
+  assert geocode.local_zip_centroid(df, '33333') is None
+
+def test_local_zip_centroid_without_coordinates():
+  df = pd.DataFrame({'zip': [22222], 'lat': [None], 'long': [None]})
+  assert geocode.local_zip_centroid(df, '22222') is None
+
+def test_cache_location_round_trips():
+  redisdb = Mock()
+  geocode.cache_location(redisdb, '22222', (20.15, -80.25))
+  redisdb.set.assert_called_once_with('geocode:22222', '20.15,-80.25', ex=geocode.GEOCODE_CACHE_TTL_SECONDS)
+  redisdb.get.return_value = redisdb.set.call_args.args[1].encode()
+  assert geocode.read_cached_location(redisdb, '22222') == (20.15, -80.25)
+  redisdb.get.assert_called_once_with('geocode:22222')
+
+def test_read_cached_location_miss():
+  assert geocode.read_cached_location(Mock(get=Mock(return_value=None)), '22222') is None
+
+@patch('geocode._session', None)
+def test_get_session_is_reused():
+  session = geocode.get_session()
+  assert geocode.get_session() is session
+  assert session.get_adapter('http://dev.virtualearth.net')._pool_maxsize == geocode.GEOCODE_POOL_SIZE
+
+@patch('geocode.get_session')
+def test_fetch_location_uses_session_with_timeout(mock_get_session):
+  assert geocode.fetch_location('22222', 'afakeapikey') is mock_get_session.return_value.get.return_value
+  mock_get_session.return_value.get.assert_called_once_with(
+    'http://dev.virtualearth.net/REST/v1/Locations/US/22222', params={'key': 'afakeapikey'}, timeout=geocode.GEOCODE_TIMEOUT_SECONDS)
+
+def test_parse_location():
+  assert geocode.parse_location(_fake_json_response({'resourceSets': [{'resources': [{'point': {'coordinates': [20.5, -80.5]}}]}]})) == (20.5, -80.5)
+
+@pytest.mark.parametrize('response', [
+  None,
+  Mock(status_code=0),
+  Mock(status_code=200),
+  _fake_json_response(None),
+  _fake_json_response({}),
+  _fake_json_response({'resourceSets': 7}),
+  _fake_json_response({'resourceSets': []}),
+  _fake_json_response({'resourceSets': {}}),
+  _fake_json_response({'resourceSets': [{}]}),
+  _fake_json_response({'resourceSets': [{'resources': 'rip'}]}),
+  _fake_json_response({'resourceSets': [{'resources': []}]}),
+  _fake_json_response({'resourceSets': [{'resources': [None]}]}),
+  _fake_json_response({'resourceSets': [{'resources': [{}]}]}),
+  _fake_json_response({'resourceSets': [{'resources': [{'point': False}]}]}),
+  _fake_json_response({'resourceSets': [{'resources': [{'point': {}}]}]}),
+  _fake_json_response({'resourceSets': [{'resources': [{'point': {'coordinates': 5}}]}]}),
+  _fake_json_response({'resourceSets': [{'resources': [{'point': {'coordinates': None}}]}]}),
+  _fake_json_response({'resourceSets': [{'resources': [{'point': {'coordinates': [0.0]}}]}]}),
+  _fake_json_response({'resourceSets': [{'resources': [{'point': {'coordinates': [0.0, 1.0, 2.0]}}]}]}),
+  _fake_json_response({'resourceSets': [{'resources': [{'point': {'coordinates': [-90.0, 200.0]}}]}]}),
+  _fake_json_response({'resourceSets': [{'resources': [{'point': {'coordinates': [-100.0, 90.0]}}]}]}),
+  _fake_json_response({'resourceSets': [{'resources': [{'point': {'coordinates': [-10.0, 200.0]}}]}]}),
+  _fake_json_response({'resourceSets': [{'resources': [{'point': {'coordinates': [-90, 90]}}]}]}),
+])
+def test_parse_location_rejects_invalid_responses(response):
+  with pytest.raises(Exception):
+    geocode.parse_location(response)
@@ -0,0 +1,79 @@
+import groupby
+import numpy as np
+import pandas as pd
+import pytest
+from services import apply_transaction_schema
+
+example_df = apply_transaction_schema(pd.DataFrame({
+  'trans_date_trans_time': ['21/06/2020 12:14', '21/06/2020 13:14', '22/07/2020 00:03', '23/07/2020 00:03', '24/07/2020 09:30'],
+  'state': ['TX', 'CA', 'TX', 'NY', 'TX'],
+  'amt': [10.0, 20.0, np.nan, 40.0, 50.0],
+  'is_fraud': [1, 0, 1, 0, 0],
+}))
+
+def _run(df: pd.DataFrame, group_by: list[str], metrics: list[str], filters: list[str], chunk_rows: int) -> list[dict]:
+  metrics = [groupby.parse_metric(m) for m in metrics]
+  filters = [groupby.parse_filter(f) for f in filters]
+  partial = None
+  for start in range(0, len(df), chunk_rows):
+    # Every chunk gets its own categories, as it would when read out of Redis
+    chunk = df.iloc[start:start + chunk_rows].astype({'state': str}).astype({'state': 'category'})
+    partial = groupby.merge_partials(partial, groupby.partial_aggregate(chunk, group_by, metrics, filters))
+  return groupby.finalize(partial, group_by, metrics)
+
+@pytest.mark.parametrize('chunk_rows', [1, 2, 5])
+def test_results_do_not_depend_on_chunking(chunk_rows: int):
+  assert _run(example_df, ['state'], ['count', 'fraud_rate', 'sum:amt', 'mean:amt'], [], chunk_rows) == [
+    {'state': 'CA', 'count': 1, 'fraud_rate': 0.0, 'sum_amt': 20.0, 'mean_amt': 20.0},
+    {'state': 'NY', 'count': 1, 'fraud_rate': 0.0, 'sum_amt': 40.0, 'mean_amt': 40.0},
+    {'state': 'TX', 'count': 3, 'fraud_rate': pytest.approx(2 / 3), 'sum_amt': 60.0, 'mean_amt': 30.0},
+  ]
+
+def test_group_by_derived_time_columns_with_filters():
+  assert _run(example_df, ['trans_month', 'state'], ['count'], ['state:in:TX|NY', 'trans_date_trans_time:lt:2020-07-24'], 2) == [
+    {'trans_month': '2020-06', 'state': 'TX', 'count': 1},
+    {'trans_month': '2020-07', 'state': 'NY', 'count': 1},
+    {'trans_month': '2020-07', 'state': 'TX', 'count': 1},
+  ]
+
+def test_filter_on_a_date_with_a_timezone():
+  assert _run(example_df, ['state'], ['count'], ['trans_date_trans_time:ge:2020-06-21T15:00:00+02:00'], 2) == [
+    {'state': 'CA', 'count': 1},
+    {'state': 'NY', 'count': 1},
+    {'state': 'TX', 'count': 2},
+  ]
+
+def test_mean_of_only_missing_values_is_none():
+  assert _run(example_df, [], ['count', 'mean:amt'], ['trans_day:eq:2020-07-22'], 2) == [{'count': 1, 'mean_amt': None}]
+
+def test_no_matching_rows():
+  assert _run(example_df, ['state'], ['count'], ['amt:gt:1000'], 2) == []
+  assert groupby.finalize(None, [], [('count', None)]) == []
+
+@pytest.mark.parametrize('spec,expect', [
+  ('count', ('count', None)),
+  ('mean:amt', ('mean', 'amt')),
+  ('sum:state', f'Metric sum requires a numeric column, one of {groupby.NUMERIC_COLUMNS}.'),
+  ('fraud_rate:amt', 'Metric fraud_rate does not take a column.'),
+])
+def test_parse_metric(spec: str, expect):
+  assert groupby.parse_metric(spec) == expect
+
+@pytest.mark.parametrize('spec,expect', [
+  ('amt:ge:10', ('amt', 'ge', 10.0)),
+  ('state:in:TX|CA', ('state', 'in', ['TX', 'CA'])),
+  ('trans_date_trans_time:lt:2020-07-01', ('trans_date_trans_time', 'lt', pd.Timestamp(2020, 7, 1))),
+  ('trans_date_trans_time:ge:2020-07-01T02:00:00+02:00', ('trans_date_trans_time', 'ge', pd.Timestamp(2020, 7, 1))),
+  ('trans_date_trans_time:in:2020-07-01T00:00Z|2020-07-02', ('trans_date_trans_time', 'in', [pd.Timestamp(2020, 7, 1), pd.Timestamp(2020, 7, 2)])),
+  ('trans_date_trans_time:ge:', 'Filter trans_date_trans_time:ge: has a value of the wrong type for trans_date_trans_time.'),
+  ('nope:eq:1', 'Filter nope:eq:1 must be on a dataset column.'),
+  ('state:gt:TX', 'Filter state:gt:TX can only compare a numeric or date column with gt.'),
+  ('amt:eq:ten', 'Filter amt:eq:ten has a value of the wrong type for amt.'),
+])
+def test_parse_filter(spec: str, expect):
+  assert groupby.parse_filter(spec) == expect
+
+def test_required_columns():
+  metrics = [('mean', 'amt'), ('count', None)]
+  filters = [('state', 'eq', 'TX'), ('trans_day', 'eq', '2020-06-21')]
+  assert groupby.required_columns(['trans_month', 'state'], metrics, filters) == ['trans_date_trans_time', 'state', 'amt', 'is_fraud']
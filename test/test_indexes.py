@@ -0,0 +1,53 @@
+import indexes
+import pandas as pd
+from unittest.mock import call, MagicMock
+
+def _mock_redis() -> tuple[MagicMock, MagicMock]:
+  mock_redis = MagicMock()
+  mock_pipe = MagicMock()
+  mock_redis.pipeline.return_value.__enter__.return_value = mock_pipe
+  return mock_redis, mock_pipe
+
+example_chunk = pd.DataFrame({
+  'state': ['TX', 'CA', 'TX'],
+  'is_fraud': [1, 0, 1],
+  'amt': [2.86, 29.84, 41.28],
+  'unix_time': [1371816865, 1371816873, 1371816893],
+}, index=[7, 8, 9])
+
+def test_index_chunk_adds_row_ids_to_indexes_of_present_fields():
+  mock_redis, mock_pipe = _mock_redis()
+  indexes.index_chunk(mock_redis, example_chunk, 10)
+  assert mock_pipe.sadd.call_args_list == [
+    call('idx:state:CA', 11),
+    call('idx:state:TX', 10, 12),
+    call('idx:is_fraud:0', 11),
+    call('idx:is_fraud:1', 10, 12),
+  ]
+  assert mock_pipe.zadd.call_args_list == [
+    call('idx:amt', {10: 2.86, 11: 29.84, 12: 41.28}),
+    call('idx:unix_time', {10: 1371816865, 11: 1371816873, 12: 1371816893}),
+  ]
+  mock_pipe.execute.assert_called_once_with()
+
+def test_query_row_ids_uses_single_value_sets_directly():
+  mock_redis, mock_pipe = _mock_redis()
+  mock_pipe.execute.return_value = [2, [b'3', b'10'], 1]
+  assert indexes.query_row_ids(mock_redis, {'state': ['TX'], 'is_fraud': ['1']}, {}, 0, 5) == (2, [3, 10])
+  mock_redis.pipeline.assert_called_once_with(transaction=True)
+  result_key = mock_pipe.zinterstore.call_args.args[0]
+  mock_pipe.zinterstore.assert_called_once_with(result_key, ['idx:state:TX', 'idx:is_fraud:1'])
+  mock_pipe.sort.assert_called_once_with(result_key, start=0, num=5)
+  mock_pipe.delete.assert_called_once_with(result_key)
+  mock_pipe.sunionstore.assert_not_called()
+
+def test_query_row_ids_unions_values_and_stores_ranges():
+  mock_redis, mock_pipe = _mock_redis()
+  mock_pipe.execute.return_value = [3, 40, 7, [b'1'], 3]
+  assert indexes.query_row_ids(mock_redis, {'state': ['TX', 'CA']}, {'amt': (100.0, None)}, 20, 10) == (7, [1])
+  result_key = mock_pipe.zinterstore.call_args.args[0]
+  mock_pipe.sunionstore.assert_called_once_with(f'{result_key}:state', ['idx:state:TX', 'idx:state:CA'])
+  mock_pipe.zrangestore.assert_called_once_with(f'{result_key}:amt', 'idx:amt', 100.0, '+inf', byscore=True)
+  mock_pipe.zinterstore.assert_called_once_with(result_key, [f'{result_key}:state', f'{result_key}:amt'])
+  mock_pipe.sort.assert_called_once_with(result_key, start=20, num=10)
+  mock_pipe.delete.assert_called_once_with(result_key, f'{result_key}:state', f'{result_key}:amt')
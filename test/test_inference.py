@@ -0,0 +1,127 @@
+import inference
+from inference import ARTIFACT_FILES, CATEGORIES_FILE, JOBS_FILE, MEAN_AND_STD_FILE, MERCHANTS_FILE, MODEL_FILE, InferenceEngine
+from input_vectorization import INPUT_SIZE, OneHotEncoder
+from ml_model import CreditCardFraudDetectionModel, EmbeddingFraudDetectionModel
+import os
+import pytest
+import torch
+from unittest.mock import patch
+
+NUMERIC_SIZE = 11
+MERCHANTS = [f'merchant {i}' for i in range(INPUT_SIZE - NUMERIC_SIZE - 2)]
+ROW = [1, 2, 2024, 3, 12, 34, 'merchant 1', 'a category', 7.44, 0.12, 3.45, 'a job', 6.78, 9.01]
+
+def _write(path, lines: list[str]):
+  with open(path, 'w') as file:
+    file.write('\n'.join(lines) + '\n')
+
+def _touch_later(path):
+  # Guarantees a new mtime even on filesystems with a coarse timestamp resolution
+  stat = os.stat(path)
+  os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+@pytest.fixture
+def artifact_dir(tmp_path):
+  torch.manual_seed(0)
+  torch.save(CreditCardFraudDetectionModel().state_dict(), tmp_path / MODEL_FILE)
+  _write(tmp_path / MEAN_AND_STD_FILE, [', '.join(['1.0'] * INPUT_SIZE), ', '.join(['2.0'] * INPUT_SIZE)])
+  _write(tmp_path / MERCHANTS_FILE, MERCHANTS)
+  _write(tmp_path / CATEGORIES_FILE, ['a category'])
+  _write(tmp_path / JOBS_FILE, ['a job'])
+  return tmp_path
+
+def test_extract_transaction_row():
+  assert inference.extract_transaction_row({
+    'trans_date_trans_time': '01/02/2024 12:34',
+    'merchant': 'a merchant',
+    'category': 'a category',
+    'amt': 7.44,
+    'lat': 0.12,
+    'long': 3.45,
+    'job': 'driveway vacuumer',
+    'merch_lat': 6.78,
+    'merch_long': 9.01,
+  }) == [1, 2, 2024, 3, 12, 34, 'a merchant', 'a category', 7.44, 0.12, 3.45, 'driveway vacuumer', 6.78, 9.01]
+
+def test_read_mean_and_std(artifact_dir):
+  mean, std = inference.read_mean_and_std(artifact_dir / MEAN_AND_STD_FILE)
+  assert torch.equal(mean, torch.ones(INPUT_SIZE))
+  assert torch.equal(std, torch.full((INPUT_SIZE,), 2.0))
+
+def test_load_artifacts_converts_the_model_in_eval_mode(artifact_dir):
+  artifacts = inference.load_artifacts(artifact_dir)
+  assert isinstance(artifacts.model, EmbeddingFraudDetectionModel)
+  assert not artifacts.model.training
+  assert artifacts.encoder.merchants == MERCHANTS
+  assert artifacts.encoder.categories == ['a category']
+  assert artifacts.encoder.jobs == ['a job']
+
+def test_encode_splits_numeric_values_and_indices(artifact_dir):
+  numerics, indices = InferenceEngine(artifact_dir).encode([list(ROW), ROW[:6] + ['unknown'] + ROW[7:]])
+  assert numerics.dtype == torch.float
+  assert numerics[0].tolist() == pytest.approx([1, 2, 2024, 3, 12, 34, 7.44, 0.12, 3.45, 6.78, 9.01])
+  assert indices.tolist() == [[1, 0, 0], [len(MERCHANTS), 0, 0]]
+
+def test_predict_matches_the_saved_model(artifact_dir):
+  rows = [list(ROW), ROW[:6] + ['unknown'] + ROW[7:], ROW[:8] + [-500.0] + ROW[9:]]
+  saved_model = CreditCardFraudDetectionModel()
+  saved_model.load_state_dict(torch.load(artifact_dir / MODEL_FILE))
+  saved_model.eval()
+  inputs = torch.from_numpy(OneHotEncoder(MERCHANTS, ['a category'], ['a job']).encode(rows))
+  with torch.no_grad():
+    expected = saved_model((inputs - 1.0) / (2.0 + 1e-8)).squeeze(1)
+  engine = InferenceEngine(artifact_dir)
+  with torch.no_grad():
+    probabilities = engine._artifacts.model(*engine.encode(rows)).squeeze(1)
+  assert probabilities.tolist() == pytest.approx(expected.tolist(), abs=1e-5)
+  assert engine.predict(rows) == probabilities.round().tolist()
+
+@pytest.mark.parametrize('mode', ['torchscript', 'int8'])
+def test_predict_in_exported_modes_matches_eager(artifact_dir, mode: str):
+  rows = [list(ROW), ROW[:6] + ['unknown'] + ROW[7:], ROW[:8] + [-500.0] + ROW[9:]]
+  eager, exported = InferenceEngine(artifact_dir, 'eager'), InferenceEngine(artifact_dir, mode)
+  assert isinstance(exported._artifacts.model, torch.jit.ScriptModule)
+  with torch.no_grad():
+    expected = eager._artifacts.model(*eager.encode(rows)).squeeze(1).tolist()
+    actual = exported._artifacts.model(*exported.encode(rows)).squeeze(1).tolist()
+  assert actual == pytest.approx(expected, abs=1e-5 if mode == 'torchscript' else 0.05)
+
+def test_predict_does_not_mutate_rows(artifact_dir):
+  rows = [list(ROW)]
+  InferenceEngine(artifact_dir).predict(rows)
+  assert rows == [ROW]
+
+def test_predict_does_not_reload_unchanged_artifacts(artifact_dir):
+  engine = InferenceEngine(artifact_dir)
+  with patch('inference.load_artifacts') as mock_load_artifacts:
+    engine.predict([list(ROW)])
+    engine.predict([list(ROW)])
+  mock_load_artifacts.assert_not_called()
+
+@pytest.mark.parametrize('changed_file', ARTIFACT_FILES)
+def test_predict_reloads_changed_artifacts(artifact_dir, changed_file: str):
+  engine = InferenceEngine(artifact_dir)
+  _touch_later(artifact_dir / changed_file)
+  with patch('inference.load_artifacts', wraps=inference.load_artifacts) as mock_load_artifacts:
+    engine.predict([list(ROW)])
+    engine.predict([list(ROW)])
+  mock_load_artifacts.assert_called_once_with(artifact_dir, 'eager')
+
+def test_predict_uses_reloaded_artifacts(artifact_dir):
+  engine = InferenceEngine(artifact_dir)
+  _write(artifact_dir / MERCHANTS_FILE, list(reversed(MERCHANTS)))
+  _touch_later(artifact_dir / MERCHANTS_FILE)
+  engine.predict([list(ROW)])
+  assert engine._artifacts.encoder.merchants == list(reversed(MERCHANTS))
+
+def test_predict_keeps_the_loaded_artifacts_when_a_reload_fails(artifact_dir):
+  engine = InferenceEngine(artifact_dir)
+  artifacts = engine._artifacts
+  _write(artifact_dir / MODEL_FILE, ['not a model'])
+  _touch_later(artifact_dir / MODEL_FILE)
+  assert len(engine.predict([list(ROW)])) == 1
+  assert engine._artifacts is artifacts
+
+def test_engine_fails_without_artifacts(tmp_path):
+  with pytest.raises(Exception):
+    InferenceEngine(tmp_path)
@@ -0,0 +1,72 @@
+import csv
+import input_vectorization
+from input_vectorization import INPUT_SIZE, OneHotEncoder, extract_row, flatten, onehot_encode
+import numpy as np
+import pytest
+
+MERCHANTS = ['merchant a', 'merchant b', 'merchant c']
+CATEGORIES = ['category a', 'category b']
+JOBS = ['job a', 'job b', 'job c', 'job d']
+ROWS = [
+  [1, 2, 2024, 3, 12, 34, 'merchant b', 'category a', 7.44, 0.12, 3.45, 'job d', 6.78, 9.01],
+  [28, 12, 2019, 6, 0, 5, 'merchant c', 'category b', 100.0, -1.5, 80.25, 'job a', 2.5, -3.0],
+  # Values outside the vocabularies are encoded as all zeros
+  [5, 6, 2020, 0, 23, 59, 'unknown', 'unknown', 0.5, 45.0, -120.0, 'unknown', 44.0, -119.5],
+]
+
+def _onehot_encode_each(rows: list[list]) -> np.ndarray:
+  return np.array([flatten(onehot_encode(list(row), MERCHANTS, CATEGORIES, JOBS)) for row in rows], dtype=np.float32)
+
+def test_one_hot_encoder_matches_onehot_encode():
+  encoded = OneHotEncoder(MERCHANTS, CATEGORIES, JOBS).encode(ROWS)
+  assert encoded.dtype == np.float32
+  assert encoded.shape == (3, 11 + len(MERCHANTS) + len(CATEGORIES) + len(JOBS))
+  np.testing.assert_array_equal(encoded, _onehot_encode_each(ROWS))
+
+def test_one_hot_encoder_keeps_trailing_labels_last():
+  rows = [row + [label] for row, label in zip(ROWS, [0, 1, 0])]
+  encoded = OneHotEncoder(MERCHANTS, CATEGORIES, JOBS).encode(rows)
+  np.testing.assert_array_equal(encoded, _onehot_encode_each(rows))
+  np.testing.assert_array_equal(encoded[:, -1], [0, 1, 0])
+
+def test_one_hot_encoder_does_not_mutate_rows():
+  rows = [list(row) for row in ROWS]
+  OneHotEncoder(MERCHANTS, CATEGORIES, JOBS).encode(rows)
+  assert rows == ROWS
+
+def test_one_hot_encoder_encodes_no_rows():
+  assert OneHotEncoder(MERCHANTS, CATEGORIES, JOBS).encode([]).shape == (0, 11 + len(MERCHANTS) + len(CATEGORIES) + len(JOBS))
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+def test_one_hot_encoder_encodes_as_dtype(dtype):
+  assert OneHotEncoder(MERCHANTS, CATEGORIES, JOBS).encode(ROWS, dtype=dtype).dtype == dtype
+
+def test_extract_row_encodes_to_the_model_input_size_with_the_label():
+  row = extract_row({
+    'trans_date_trans_time': '01/02/2024 12:34', 'merchant': 'merchant a', 'category': 'category b', 'amt': '7.44',
+    'lat': '0.12', 'long': '3.45', 'job': 'job c', 'merch_lat': '6.78', 'merch_long': '9.01', 'is_fraud': '1',
+  })
+  encoder = OneHotEncoder(['merchant a'] + [f'merchant {i}' for i in range(INPUT_SIZE - 11 - 3)], ['category b'], ['job c'])
+  assert encoder.encode([row]).shape == (1, INPUT_SIZE + 1)
+
+def test_one_hot_encoder_encodes_indices_past_the_end_of_vocabularies_for_unknown_values():
+  numerics, indices = OneHotEncoder(MERCHANTS, CATEGORIES, JOBS).encode_indices(ROWS)
+  np.testing.assert_array_equal(numerics[0], np.array([1, 2, 2024, 3, 12, 34, 7.44, 0.12, 3.45, 6.78, 9.01], dtype=np.float32))
+  np.testing.assert_array_equal(indices, [[1, 0, 3], [2, 1, 0], [3, 2, 4]])
+
+def test_test_validate_train_split_keeps_inputs_and_labels_of_shuffled_rows_together(tmp_path, monkeypatch):
+  monkeypatch.chdir(tmp_path)
+  with open('data.csv', 'w', newline='') as data:
+    writer = csv.DictWriter(data, ['trans_date_trans_time', 'merchant', 'category', 'amt', 'lat', 'long', 'job', 'merch_lat', 'merch_long', 'is_fraud'])
+    writer.writeheader()
+    for i in range(20):
+      writer.writerow({
+        'trans_date_trans_time': '01/02/2024 12:34', 'merchant': f'merchant {i % 3}', 'category': 'category a', 'amt': str(i),
+        'lat': '0.12', 'long': '3.45', 'job': 'job a', 'merch_lat': '6.78', 'merch_long': '9.01', 'is_fraud': str(i % 2),
+      })
+  split = input_vectorization.TestValidateTrainSplit('data.csv', 0.5, 0.25, 0.25)
+  numerics, _ = split.get_train_index_inputs()
+  np.testing.assert_array_equal(numerics[:, 6] % 2, split.get_train_labels())
+  assert [len(split.get_train_labels()), len(split.get_validation_labels()), len(split.get_test_labels())] == [10, 5, 5]
+  assert len(split.get_validation_inputs()) == 5 and len(split.get_test_inputs()) == 5
+  assert sorted(np.concatenate([numerics[:, 6], split.numerics[10:, 6]])) == list(range(20))
@@ -0,0 +1,76 @@
+from microbatch import MicroBatcher
+import pytest
+import threading
+
+class _BlockingRunner:
+  # Records every batch and holds the first one until released, so requests pile up behind it
+  def __init__(self):
+    self.batches = []
+    self.started = threading.Event()
+    self.release = threading.Event()
+
+  def __call__(self, items: list[int]) -> list[int]:
+    self.batches.append(list(items))
+    self.started.set()
+    self.release.wait(5)
+    return [item * 10 for item in items]
+
+@pytest.fixture
+def runner():
+  return _BlockingRunner()
+
+def test_run_returns_the_results_of_the_items(runner: _BlockingRunner):
+  runner.release.set()
+  batcher = MicroBatcher(runner, 8, 0)
+  assert batcher.run([1, 2, 3], timeout=5) == [10, 20, 30]
+  batcher.close()
+
+def test_waiting_requests_are_batched_together(runner: _BlockingRunner):
+  batcher = MicroBatcher(runner, 8, 0)
+  first = batcher.submit([1])
+  assert runner.started.wait(5)
+  futures = [batcher.submit([2, 3]), batcher.submit([4]), batcher.submit([5, 6, 7])]
+  runner.release.set()
+  assert first.result(5) == [10]
+  assert [future.result(5) for future in futures] == [[20, 30], [40], [50, 60, 70]]
+  batcher.close()
+  assert runner.batches == [[1], [2, 3, 4, 5, 6, 7]]
+
+def test_batches_stop_at_the_max_batch_size(runner: _BlockingRunner):
+  batcher = MicroBatcher(runner, 3, 0)
+  batcher.submit([0])
+  assert runner.started.wait(5)
+  futures = [batcher.submit([i]) for i in range(1, 6)]
+  runner.release.set()
+  assert [future.result(5) for future in futures] == [[10], [20], [30], [40], [50]]
+  batcher.close()
+  assert runner.batches == [[0], [1, 2, 3], [4, 5]]
+
+def test_requests_larger_than_the_max_batch_size_are_not_split(runner: _BlockingRunner):
+  runner.release.set()
+  batcher = MicroBatcher(runner, 2, 0)
+  assert batcher.run([1, 2, 3, 4], timeout=5) == [10, 20, 30, 40]
+  batcher.close()
+  assert runner.batches == [[1, 2, 3, 4]]
+
+def test_the_first_request_waits_for_more_requests_up_to_max_wait(runner: _BlockingRunner):
+  runner.release.set()
+  batcher = MicroBatcher(runner, 8, 5)
+  first = batcher.submit([1])
+  second = batcher.submit([2])
+  # A full batch runs without waiting out max_wait
+  third = batcher.submit(list(range(3, 9)))
+  assert [future.result(1) for future in [first, second, third]] == [[10], [20], [30, 40, 50, 60, 70, 80]]
+  batcher.close()
+  assert runner.batches == [list(range(1, 9))]
+
+def test_failed_batches_fail_all_of_their_requests():
+  def fail(items: list[int]) -> list[int]:
+    raise ValueError('model unavailable')
+  batcher = MicroBatcher(fail, 8, 0)
+  with pytest.raises(ValueError, match='model unavailable'):
+    batcher.run([1], timeout=5)
+  # The batching thread keeps serving later requests
+  batcher.run_batch = lambda items: items
+  assert batcher.run([2], timeout=5) == [2]
+  batcher.close()
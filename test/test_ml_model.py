@@ -0,0 +1,91 @@
+from input_vectorization import INPUT_SIZE, NUMERIC_SIZE, OneHotEncoder
+from ml_model import CreditCardFraudDetectionModel, EmbeddingFraudDetectionModel, convert_to_embedding_model, convert_to_onehot_model, onehot_mean_and_std, train_and_save
+import numpy as np
+import pytest
+import torch
+
+MERCHANTS = [f'merchant {i}' for i in range(INPUT_SIZE - NUMERIC_SIZE - 5)]
+CATEGORIES = ['category a', 'category b']
+JOBS = ['job a', 'job b', 'job c']
+ROWS = [
+  [1, 2, 2024, 3, 12, 34, 'merchant 1', 'category a', 7.44, 0.12, 3.45, 'job c', 6.78, 9.01],
+  [28, 12, 2019, 6, 0, 5, 'merchant 600', 'category b', 100.0, -1.5, 80.25, 'job a', 2.5, -3.0],
+  [5, 6, 2020, 0, 23, 59, 'unknown', 'unknown', 0.5, 45.0, -120.0, 'unknown', 44.0, -119.5],
+]
+
+@pytest.fixture
+def model():
+  torch.manual_seed(0)
+  model = CreditCardFraudDetectionModel()
+  # Trained-looking batchnorm statistics, so that converting them is tested too
+  for bn in [model.bn1, model.bn2]:
+    bn.running_mean.uniform_(-1, 1)
+    bn.running_var.uniform_(0.5, 2)
+  return model.eval()
+
+def test_embedding_model_ignores_values_outside_the_vocabularies():
+  model = EmbeddingFraudDetectionModel(3, 2, 4)
+  assert [embedding.padding_idx for embedding in model.embeddings] == [3, 2, 4]
+  assert all(not embedding.weight[-1].any() for embedding in model.embeddings)
+
+def test_convert_to_embedding_model_makes_the_same_predictions(model: CreditCardFraudDetectionModel):
+  mean, std = torch.rand(INPUT_SIZE), torch.rand(INPUT_SIZE) + 0.5
+  encoder = OneHotEncoder(MERCHANTS, CATEGORIES, JOBS)
+  converted = convert_to_embedding_model(model, mean, std, encoder)
+  assert not converted.training
+  numerics, indices = encoder.encode_indices(ROWS)
+  with torch.no_grad():
+    expected = model((torch.from_numpy(encoder.encode(ROWS)) - mean) / (std + 1e-8))
+    actual = converted(torch.from_numpy(numerics), torch.from_numpy(indices))
+  assert actual.shape == (3, 1)
+  assert actual.squeeze(1).tolist() == pytest.approx(expected.squeeze(1).tolist(), abs=1e-5)
+
+def test_convert_to_embedding_model_keeps_the_mode(model: CreditCardFraudDetectionModel):
+  converted = convert_to_embedding_model(model.train(), torch.zeros(INPUT_SIZE), torch.ones(INPUT_SIZE), OneHotEncoder(MERCHANTS, CATEGORIES, JOBS))
+  assert converted.training
+
+def test_convert_to_onehot_model_inverts_convert_to_embedding_model(model: CreditCardFraudDetectionModel):
+  mean, std = torch.rand(INPUT_SIZE), torch.rand(INPUT_SIZE) + 0.5
+  encoder = OneHotEncoder(MERCHANTS, CATEGORIES, JOBS)
+  converted = convert_to_onehot_model(convert_to_embedding_model(model, mean, std, encoder), mean, std, encoder)
+  assert isinstance(converted, CreditCardFraudDetectionModel)
+  assert not converted.training
+  inputs = (torch.from_numpy(encoder.encode(ROWS)) - mean) / (std + 1e-8)
+  with torch.no_grad():
+    assert converted(inputs).squeeze(1).tolist() == pytest.approx(model(inputs).squeeze(1).tolist(), abs=1e-5)
+
+def test_onehot_mean_and_std_matches_the_onehot_vectors():
+  encoder = OneHotEncoder(MERCHANTS, CATEGORIES, JOBS)
+  numerics, indices = encoder.encode_indices(ROWS)
+  mean, std = onehot_mean_and_std(torch.from_numpy(numerics), torch.from_numpy(indices), encoder)
+  onehot = torch.from_numpy(encoder.encode(ROWS))
+  assert mean.tolist() == pytest.approx(torch.mean(onehot, dim=0).tolist(), abs=1e-5)
+  assert std.tolist() == pytest.approx(torch.std(onehot, dim=0).tolist(), abs=1e-5)
+
+class _Datasource:
+  # The training split of TestValidateTrainSplit, without reading a CSV
+  def __init__(self, rows: list[list], labels: list[float]):
+    self.encoder = OneHotEncoder(MERCHANTS, CATEGORIES, JOBS)
+    self.rows, self.labels = rows, labels
+
+  def get_train_index_inputs(self) -> tuple[np.ndarray, np.ndarray]:
+    return self.encoder.encode_indices(self.rows)
+
+  def get_train_labels(self) -> np.ndarray:
+    return np.array(self.labels, dtype=np.float32)
+
+def test_train_and_save_saves_an_onehot_model_equivalent_to_the_trained_one(tmp_path):
+  torch.manual_seed(0)
+  datasource = _Datasource(ROWS[:2] * 32, [0.0, 1.0] * 32)
+  model = train_and_save(datasource, tmp_path / 'model.pt')
+  saved_model = CreditCardFraudDetectionModel()
+  saved_model.load_state_dict(torch.load(tmp_path / 'model.pt'))
+  saved_model.eval()
+  numerics, indices = datasource.get_train_index_inputs()
+  mean, std = onehot_mean_and_std(torch.from_numpy(numerics), torch.from_numpy(indices), datasource.encoder)
+  inputs = (torch.from_numpy(datasource.encoder.encode(datasource.rows)) - mean) / (std + 1e-8)
+  with torch.no_grad():
+    predictions = saved_model(inputs).squeeze(1)
+    assert predictions.tolist() == pytest.approx(model.eval()(inputs).squeeze(1).tolist(), abs=1e-6)
+  # The saved model learned the labels
+  assert predictions.round().tolist() == datasource.labels
@@ -0,0 +1,29 @@
+from concurrent.futures import ThreadPoolExecutor
+import matplotlib.pyplot as plt
+import pandas as pd
+import plotting
+import pytest
+from services import PLOTTING_DATA_COLS
+
+example_values = {
+  'trans_month': ['2020-07', '2020-06'],
+  'trans_dayOfWeek': ['Sunday', 'Monday'],
+  'gender': ['M', 'F'],
+  'category': ['travel', 'grocery_pos'],
+}
+
+def _example_table(feature: str) -> pd.DataFrame:
+  return pd.DataFrame({'count_0': [3, 1], 'count_1': [1, 0], 'amt_0': [10.0, 5.0], 'amt_1': [90.0, 0.0]}, index=example_values[feature])
+
+def test_every_plotting_feature_has_a_renderer():
+  assert set(plotting.RENDERERS) == set(PLOTTING_DATA_COLS)
+
+@pytest.mark.parametrize('feature', PLOTTING_DATA_COLS)
+def test_render_feature_plot_renders_png_without_pyplot_figures(feature: str):
+  assert plotting.render_feature_plot(feature, _example_table(feature)).startswith(b'\x89PNG')
+  assert plt.get_fignums() == []
+
+def test_render_feature_plot_from_several_threads():
+  with ThreadPoolExecutor(max_workers=4) as executor:
+    images = list(executor.map(lambda feature: plotting.render_feature_plot(feature, _example_table(feature)), PLOTTING_DATA_COLS * 3))
+  assert all(image.startswith(b'\x89PNG') for image in images)
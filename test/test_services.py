@@ -1,3 +1,4 @@
+import pandas as pd
 import pytest
 import services
 from unittest.mock import call, patch, MagicMock, Mock
@@ -6,6 +7,7 @@ from unittest.mock import call, patch, MagicMock, Mock
 def clean_global_state():
   services._redis = None
   services._queue = None
+  services._warmup_queue = None
 
 @patch.dict('os.environ', {}, clear=True)
 def test_init_backend_services_handles_undefined_redis_ip():
@@ -29,8 +31,12 @@ def test_init_backend_services_inits_redis_and_hotqueue(mock_redis, mock_hotqueu
   services.init_backend_services()
   assert services._redis is not None
   assert services._queue is not None
+  assert services._warmup_queue is not None
   mock_redis.assert_called_once_with(host='redis')
-  mock_hotqueue.assert_called_once_with(services.REDIS_JOB_QUEUE_KEY, host='redis', db=services.RedisDb.QUEUE_DB.value)
+  assert mock_hotqueue.call_args_list == [
+    call(services.REDIS_JOB_QUEUE_KEY, host='redis', db=services.RedisDb.QUEUE_DB.value),
+    call(services.REDIS_WARMUP_QUEUE_KEY, host='redis', db=services.RedisDb.QUEUE_DB.value),
+  ]
   mock_sleep.assert_called_once_with(.1)
 
 @pytest.mark.parametrize('db', [db for db in services.RedisDb])
@@ -56,6 +62,16 @@ def test_get_queue_handles_initialized_queue():
   services._queue = Mock()
   assert services.get_queue() is services._queue
 
+def test_get_warmup_queue_handles_unitialized_queue():
+  assert services.get_warmup_queue() is None
+  mock_none = Mock()
+  assert services.get_warmup_queue(none_handler=mock_none) is None
+  mock_none.assert_called_once_with()
+
+def test_get_warmup_queue_handles_initialized_queue():
+  services._warmup_queue = Mock()
+  assert services.get_warmup_queue() is services._warmup_queue
+
 @patch.dict('os.environ', {}, clear=True)
 def test_get_log_level_handles_undefined_env_var():
   with pytest.raises(Exception, match=f'{services.LOG_LVL_VAR} invalid or not defined in environment variables.'):
@@ -79,12 +95,14 @@ def test_get_bing_api_key_handles_undefined_env_var():
 def test_get_bing_api_key_handles_valid_env_var():
   assert services.get_bing_api_key() == 'apikey1234'
 
+def _stored(values: list[bytes]) -> Mock:
+  # A Redis holding the values under the keys 0 to N-1, as ingest stores transactions
+  mock_redis = Mock()
+  mock_redis.mget.side_effect = lambda keys: [values[key] if key < len(values) else None for key in keys]
+  return mock_redis
+
 def test_pipeline_data_out_of_redis():
-  mock_redis = MagicMock()
-  mock_pipe = Mock()
-  mock_redis.keys.return_value = [b'0', b'1', b'2']
-  mock_pipe.execute.return_value = [b'{"look a key": 1}', b'{"look a key": 2}', b'{"look a key": 3}']
-  mock_redis.pipeline.return_value.__enter__.return_value = mock_pipe
+  mock_redis = _stored([b'{"look a key": 1}', b'{"look a key": 2}', b'{"look a key": 3}'])
   assert services.pipeline_data_out_of_redis(mock_redis) == [
     {
       'look a key': 1,
@@ -96,14 +114,35 @@ def test_pipeline_data_out_of_redis():
       'look a key': 3,
     },
   ]
-  mock_redis.keys.assert_called_once_with()
-  mock_redis.pipeline.assert_called_once_with()
-  mock_pipe.get.assert_has_calls([
-    call(b'0'),
-    call(b'1'),
-    call(b'2'),
+  mock_redis.keys.assert_not_called()
+  mock_redis.scan.assert_not_called()
+  mock_redis.mget.assert_has_calls([
+    call(list(range(services.SCAN_BATCH_SIZE))),
+    call(list(range(services.SCAN_BATCH_SIZE, 2 * services.SCAN_BATCH_SIZE))),
   ])
-  mock_pipe.execute.assert_called_once_with()
+
+def test_scan_data_out_of_redis_yields_key_ranges_in_order():
+  mock_redis = _stored([b'{"a": 1}', b'{"a": 2}', b'{"a": 3}'])
+  batches = services.scan_data_out_of_redis(mock_redis, batch_size=2)
+  assert next(batches) == [{'a': 1}, {'a': 2}]
+  # The generator is lazy, so the second batch has not been fetched yet
+  assert mock_redis.mget.call_count == 1
+  assert list(batches) == [[{'a': 3}]]
+  assert mock_redis.mget.call_args_list == [call([0, 1]), call([2, 3]), call([4, 5])]
+
+def test_scan_data_out_of_redis_skips_missing_keys_within_a_range():
+  mock_redis = _stored([b'{"a": 1}', None, b'{"a": 3}'])
+  assert list(services.scan_data_out_of_redis(mock_redis, batch_size=2)) == [[{'a': 1}], [{'a': 3}]]
+
+def test_scan_data_out_of_redis_handles_empty_db():
+  mock_redis = _stored([])
+  assert list(services.scan_data_out_of_redis(mock_redis)) == []
+  mock_redis.mget.assert_called_once()
+
+def test_scan_dataframes_out_of_redis_keeps_only_requested_cols():
+  mock_redis = _stored([b'{"a": 1, "b": 2, "c": 3}', b'{"a": 4, "b": 5, "c": 6}'])
+  frames = list(services.scan_dataframes_out_of_redis(mock_redis, cols=['a', 'c'], batch_size=1))
+  assert [f.to_dict(orient='records') for f in frames] == [[{'a': 1, 'c': 3}], [{'a': 4, 'c': 6}]]
 
 @pytest.mark.parametrize('datestr,expect', [
   ('1/2/3 13:52', False),
@@ -182,4 +221,132 @@ def test_is_valid_date(datestr: str, expect: bool):
   }]}, None)
 ])
 def test_validate_transaction_list(client_submitted_data, expected_error_message):
-  assert services.validate_transaction_list(client_submitted_data) == expected_error_message
\ No newline at end of file
+  assert services.validate_transaction_list(client_submitted_data) == expected_error_message
+@pytest.mark.parametrize('env,expect', [
+  ({}, False),
+  ({services.COLUMNAR_STORE_VAR: ''}, False),
+  ({services.COLUMNAR_STORE_VAR: 'false'}, False),
+  ({services.COLUMNAR_STORE_VAR: 'true'}, True),
+  ({services.COLUMNAR_STORE_VAR: 'TRUE'}, True),
+  ({services.COLUMNAR_STORE_VAR: '1'}, True),
+])
+def test_is_columnar_store_enabled(env, expect):
+  with patch.dict('os.environ', env, clear=True):
+    assert services.is_columnar_store_enabled() == expect
+
+@pytest.mark.parametrize('env,expect', [
+  ({}, False),
+  ({services.FINE_HOTSPOT_GRIDS_VAR: 'false'}, False),
+  ({services.FINE_HOTSPOT_GRIDS_VAR: 'true'}, True),
+  ({services.FINE_HOTSPOT_GRIDS_VAR: 'Yes'}, True),
+])
+def test_are_fine_hotspot_grids_enabled(env, expect):
+  with patch.dict('os.environ', env, clear=True):
+    assert services.are_fine_hotspot_grids_enabled() == expect
+
+@pytest.mark.parametrize('env,expect', [
+  ({}, services.DEFAULT_COLUMN_CACHE_MB * 1024 * 1024),
+  ({services.COLUMN_CACHE_MB_VAR: '0'}, 0),
+  ({services.COLUMN_CACHE_MB_VAR: '64'}, 64 * 1024 * 1024),
+])
+def test_get_column_cache_budget(env, expect):
+  with patch.dict('os.environ', env, clear=True):
+    assert services.get_column_cache_budget() == expect
+
+@pytest.mark.parametrize('budget', ['-1', 'lots', '1.5'])
+def test_get_column_cache_budget_fails_on_invalid_budget(budget):
+  with patch.dict('os.environ', {services.COLUMN_CACHE_MB_VAR: budget}, clear=True):
+    with pytest.raises(Exception, match='COLUMN_CACHE_MB must be a non-negative integer number of megabytes.'):
+      services.get_column_cache_budget()
+
+@pytest.mark.parametrize('env,expect', [
+  ({}, services.DEFAULT_PREDICT_MAX_BATCH_SIZE),
+  ({services.PREDICT_MAX_BATCH_SIZE_VAR: '1'}, 1),
+  ({services.PREDICT_MAX_BATCH_SIZE_VAR: '1024'}, 1024),
+])
+def test_get_predict_max_batch_size(env, expect):
+  with patch.dict('os.environ', env, clear=True):
+    assert services.get_predict_max_batch_size() == expect
+
+@pytest.mark.parametrize('max_batch_size', ['0', '-1', 'lots', '1.5'])
+def test_get_predict_max_batch_size_fails_on_invalid_size(max_batch_size):
+  with patch.dict('os.environ', {services.PREDICT_MAX_BATCH_SIZE_VAR: max_batch_size}, clear=True):
+    with pytest.raises(Exception, match='PREDICT_MAX_BATCH_SIZE must be a positive integer.'):
+      services.get_predict_max_batch_size()
+
+@pytest.mark.parametrize('env,expect', [
+  ({}, services.DEFAULT_PREDICT_MAX_WAIT_MS / 1000),
+  ({services.PREDICT_MAX_WAIT_MS_VAR: '0'}, 0),
+  ({services.PREDICT_MAX_WAIT_MS_VAR: '0.5'}, 0.0005),
+])
+def test_get_predict_max_wait(env, expect):
+  with patch.dict('os.environ', env, clear=True):
+    assert services.get_predict_max_wait() == pytest.approx(expect)
+
+@pytest.mark.parametrize('max_wait_ms', ['-1', 'soon', 'nan'])
+def test_get_predict_max_wait_fails_on_invalid_wait(max_wait_ms):
+  with patch.dict('os.environ', {services.PREDICT_MAX_WAIT_MS_VAR: max_wait_ms}, clear=True):
+    with pytest.raises(Exception, match='PREDICT_MAX_WAIT_MS must be a non-negative number of milliseconds.'):
+      services.get_predict_max_wait()
+
+@pytest.mark.parametrize('env,expect', [
+  ({}, services.DEFAULT_INFERENCE_MODE),
+  ({services.INFERENCE_MODE_VAR: 'eager'}, 'eager'),
+  ({services.INFERENCE_MODE_VAR: 'int8'}, 'int8'),
+])
+def test_get_inference_mode(env, expect):
+  with patch.dict('os.environ', env, clear=True):
+    assert services.get_inference_mode() == expect
+
+def test_get_inference_mode_fails_on_invalid_mode():
+  with patch.dict('os.environ', {services.INFERENCE_MODE_VAR: 'fp16'}, clear=True):
+    with pytest.raises(Exception, match=r"INFERENCE_MODE must be one of \['eager', 'torchscript', 'int8'\]."):
+      services.get_inference_mode()
+
+def test_apply_transaction_schema():
+  df = pd.DataFrame({
+    'trans_date_trans_time': ['21/06/2020 12:14', '22/07/2020 00:03'],
+    'category': ['personal_care', 'travel'],
+    'amt': [2.86, 29.84],
+    'lat': [33.9659, 40.3207],
+    'zip': [29209, 84002],
+    'is_fraud': [0, 1],
+    'not_in_schema': ['a', 'b'],
+  })
+  compact = services.apply_transaction_schema(df)
+  assert compact.dtypes.astype(str).to_dict() == {
+    'trans_date_trans_time': 'datetime64[ns]',
+    'category': 'category',
+    'amt': 'float64',
+    'lat': 'float32',
+    'zip': 'int32',
+    'is_fraud': 'int8',
+    'not_in_schema': 'object',
+  }
+  assert compact['trans_date_trans_time'].tolist() == [pd.Timestamp(2020, 6, 21, 12, 14), pd.Timestamp(2020, 7, 22, 0, 3)]
+  assert compact['amt'].tolist() == [2.86, 29.84]
+  assert df['trans_date_trans_time'].dtype == object
+
+@pytest.mark.parametrize('stored,expect', [(None, 0), (b'12', 12)])
+def test_get_dataset_version(stored, expect):
+  mock_redis = Mock()
+  mock_redis.get.return_value = stored
+  assert services.get_dataset_version(mock_redis) == expect
+  mock_redis.get.assert_called_once_with(services.DATASET_VERSION_KEY)
+
+def test_bump_dataset_version():
+  mock_redis = Mock()
+  mock_redis.incr.return_value = 13
+  assert services.bump_dataset_version(mock_redis) == 13
+  mock_redis.incr.assert_called_once_with(services.DATASET_VERSION_KEY)
+
+def test_plot_cache_key_changes_with_every_input():
+  key = services.plot_cache_key('gender', 3)
+  assert key.startswith('plot:')
+  assert services.plot_cache_key('gender', 3, render_options=dict(reversed(services.PLOT_RENDER_OPTIONS.items()))) == key
+  assert len({
+    key,
+    services.plot_cache_key('category', 3),
+    services.plot_cache_key('gender', 4),
+    services.plot_cache_key('gender', 3, render_options={**services.PLOT_RENDER_OPTIONS, 'format': 'svg'}),
+  }) == 4
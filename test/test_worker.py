@@ -1,6 +1,8 @@
+from inference import extract_transaction_row
+import pandas as pd
 import pytest
 from unittest.mock import patch, Mock
-from services import RedisDb
+from services import PLOT_CACHE_TTL_SECONDS, RedisDb, plot_cache_key
 import worker
 
 @patch('worker.get_redis')
@@ -27,18 +29,92 @@ def test_begin_job_marks_valid_job_as_in_progress(mock_get_redis):
   mock_redis.get.assert_called_once_with('job id')
   mock_redis.set.assert_called_once_with('job id', b'{"some job info":"info","status":"in_progress"}')
 
-def test_extract_row():
-  assert worker._extract_row({
-    'trans_date_trans_time': '01/02/2024 12:34',
-    'merchant': 'a merchant',
-    'category': 'a category',
-    'amt': 7.44,
-    'lat': 0.12,
-    'long': 3.45,
-    'job': 'driveway vacuumer',
-    'merch_lat': 6.78,
-    'merch_long': 9.01,
-  }) == [1, 2, 2024, 3, 12, 34, 'a merchant', 'a category', 7.44, 0.12, 3.45, 'driveway vacuumer', 6.78, 9.01]
+TRANSACTION = {
+  'trans_date_trans_time': '01/02/2024 12:34',
+  'merchant': 'a merchant',
+  'category': 'a category',
+  'amt': 7.44,
+  'lat': 0.12,
+  'long': 3.45,
+  'job': 'driveway vacuumer',
+  'merch_lat': 6.78,
+  'merch_long': 9.01,
+}
+
+@patch('worker.InferenceEngine')
+def test_get_inference_engine_loads_the_artifacts_once(mock_inference_engine):
+  with patch('worker._inference_engine', None), patch.dict('os.environ', {'INFERENCE_MODE': 'int8'}):
+    assert worker.get_inference_engine() is mock_inference_engine.return_value
+    assert worker.get_inference_engine() is mock_inference_engine.return_value
+  mock_inference_engine.assert_called_once_with(mode='int8')
+
+@patch('worker.get_redis')
+@patch('worker.get_inference_engine')
+def test_execute_transaction_analysis_job_predicts_with_the_inference_engine(mock_get_inference_engine, mock_get_redis):
+  mock_get_inference_engine.return_value.predict.return_value = [0.0, 1.0]
+  assert worker._execute_transaction_analysis_job('job id', {'transactions': [TRANSACTION, TRANSACTION]})
+  mock_get_inference_engine.return_value.predict.assert_called_once_with([extract_transaction_row(TRANSACTION)] * 2)
+  mock_get_redis.assert_called_once_with(RedisDb.JOB_RESULTS_DB)
+  mock_get_redis.return_value.set.assert_called_once_with('job id', b'[0.0,1.0]')
+
+@patch('worker.get_inference_engine')
+def test_execute_transaction_analysis_job_fails_on_invalid_transactions(mock_get_inference_engine):
+  assert not worker._execute_transaction_analysis_job('job id', {'transactions': [{**TRANSACTION, 'amt': '7.44'}]})
+  mock_get_inference_engine.assert_not_called()
+
+@patch('worker.read_aggregate_table')
+@patch('worker.has_aggregates', return_value=True)
+@patch('worker.get_redis')
+def test_load_plotting_table_reads_aggregates(mock_get_redis, mock_has_aggregates, mock_read_aggregate_table):
+  assert worker._load_plotting_table('gender') is mock_read_aggregate_table.return_value
+  mock_get_redis.assert_called_with(RedisDb.AGGREGATE_DB)
+  mock_read_aggregate_table.assert_called_once_with(mock_get_redis.return_value, 'gender')
+
+@patch('worker.is_columnar_store_enabled', return_value=False)
+@patch('worker.scan_dataframes_out_of_redis')
+@patch('worker.has_aggregates', return_value=False)
+@patch('worker.get_redis')
+def test_load_plotting_table_merges_chunks_without_aggregates(mock_get_redis, mock_has_aggregates, mock_scan_dataframes_out_of_redis, mock_is_columnar_store_enabled):
+  mock_scan_dataframes_out_of_redis.return_value = iter([
+    pd.DataFrame({'trans_date_trans_time': ['21/06/2020 12:14', '22/07/2020 00:03'], 'amt': [2.0, 8.0], 'is_fraud': [0, 1]}),
+    pd.DataFrame({'trans_date_trans_time': ['23/07/2020 10:00'], 'amt': [5.0], 'is_fraud': [1]}),
+  ])
+  assert worker._load_plotting_table('trans_month').to_dict('index') == {
+    '2020-06': {'count_0': 1, 'count_1': 0, 'amt_0': 2.0, 'amt_1': 0.0},
+    '2020-07': {'count_0': 0, 'count_1': 2, 'amt_0': 0.0, 'amt_1': 13.0},
+  }
+  mock_scan_dataframes_out_of_redis.assert_called_once_with(
+    mock_get_redis.return_value, cols=['trans_date_trans_time', 'amt', 'is_fraud'], batch_size=worker.PLOTTING_BATCH_SIZE)
+
+@pytest.mark.parametrize('feature', ['trans_month', 'trans_dayOfWeek', 'gender', 'category'])
+@patch('worker._load_plotting_table')
+@patch('worker.get_redis')
+def test_execute_graph_feature_analysis_job_plots_and_caches_aggregates(mock_get_redis, mock_load_plotting_table, feature: str):
+  values = {'trans_month': ['2020-06', '2020-07'], 'trans_dayOfWeek': ['Monday', 'Sunday'], 'gender': ['F', 'M'], 'category': ['travel', 'grocery_pos']}
+  mock_get_redis.return_value.get.side_effect = lambda key: b'3' if key == 'dataset_version' else None
+  mock_load_plotting_table.return_value = pd.DataFrame(
+    {'count_0': [3, 1], 'count_1': [1, 0], 'amt_0': [10.0, 5.0], 'amt_1': [90.0, 0.0]}, index=values[feature])
+  assert worker._execute_graph_feature_analysis_job('a job id', {'graph_feature': feature})
+  mock_get_redis.assert_called_with(RedisDb.JOB_RESULTS_DB)
+  (cache_key, cached_image), cache_kwargs = mock_get_redis.return_value.set.call_args_list[0]
+  job_id, image = mock_get_redis.return_value.set.call_args_list[1].args
+  assert cache_key == plot_cache_key(feature, 3) and cache_kwargs == {'ex': PLOT_CACHE_TTL_SECONDS}
+  assert job_id == 'a job id' and image == cached_image and image.startswith(b'\x89PNG')
+
+@patch('worker._load_plotting_table')
+@patch('worker.get_redis')
+def test_execute_graph_feature_analysis_job_serves_cached_plot(mock_get_redis, mock_load_plotting_table):
+  mock_get_redis.return_value.get.side_effect = lambda key: b'3' if key == 'dataset_version' else {plot_cache_key('gender', 3): b'a png'}.get(key)
+  assert worker._execute_graph_feature_analysis_job('a job id', {'graph_feature': 'gender'})
+  mock_get_redis.return_value.set.assert_called_once_with('a job id', b'a png')
+  mock_load_plotting_table.assert_not_called()
+
+@patch('worker._load_plotting_table')
+@patch('worker.get_redis')
+def test_execute_graph_feature_analysis_job_fails_without_data(mock_get_redis, mock_load_plotting_table):
+  mock_get_redis.return_value.get.return_value = None
+  mock_load_plotting_table.return_value = pd.DataFrame({'count_0': [], 'count_1': [], 'amt_0': [], 'amt_1': []})
+  assert not worker._execute_graph_feature_analysis_job('a job id', {'graph_feature': 'gender'})
 
 # TODO: INSERT _execute_job TESTS HERE
 
@@ -57,6 +133,37 @@ def test_execute_job_works_for_transaction(mock_execute_transaction_analysis_job
 def test_execute_returns_false_for_invalid_job():
   assert not worker._execute_job('ajobid', {'notarealkey': 'uhoh'})
 
+@patch('worker._get_or_render_plot')
+@patch('worker.get_redis')
+def test_warm_plot_renders_into_the_plot_cache(mock_get_redis, mock_get_or_render_plot):
+  mock_get_redis.return_value.get.return_value = b'3'
+  assert worker._warm_plot({'graph_feature': 'gender', 'dataset_version': 3})
+  mock_get_or_render_plot.assert_called_once_with('gender', 3)
+
+@patch('worker._get_or_render_plot')
+@patch('worker.get_redis')
+def test_warm_plot_skips_stale_dataset_versions(mock_get_redis, mock_get_or_render_plot):
+  mock_get_redis.return_value.get.return_value = b'4'
+  assert not worker._warm_plot({'graph_feature': 'gender', 'dataset_version': 3})
+  mock_get_or_render_plot.assert_not_called()
+
+class _StopWorker(Exception):
+  pass
+
+@patch('worker._warm_plot')
+@patch('worker._do_job')
+def test_do_jobs_only_warms_plots_when_no_job_is_queued(mock_do_job, mock_warm_plot):
+  queue = Mock()
+  queue.get.side_effect = ['a job id', None, None, _StopWorker]
+  warmup_queue = Mock()
+  warmup_queue.get.side_effect = [{'graph_feature': 'gender', 'dataset_version': 3}, None]
+  with pytest.raises(_StopWorker):
+    worker.do_jobs(queue, warmup_queue, poll_seconds=5)
+  queue.get.assert_called_with(block=True, timeout=5)
+  mock_do_job.assert_called_once_with('a job id')
+  mock_warm_plot.assert_called_once_with({'graph_feature': 'gender', 'dataset_version': 3})
+  assert warmup_queue.get.call_count == 2
+
 @pytest.mark.parametrize('success,expected_status', [
   (True, 'completed'),
   (False, 'failed'),